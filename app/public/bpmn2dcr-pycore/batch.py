@@ -0,0 +1,302 @@
+"""
+Batch conversion of BPMN files to DCR XML.
+
+Inputs can be files, directories (searched recursively for *.bpmn), glob
+patterns, and/or a manifest listing one path per line. Every input produces
+a `<name>.status.json` record next to its `<name>.dcr.xml` output:
+
+    python batch.py models/ "archive/**/*.bpmn" --out-dir out --workers 8
+
+With --cache-db, results are shared through a sqlite conversion cache so
+unchanged models are not converted again on the next run. --compact-xor
+groups the branches of large XOR splits in nestings. With --verify,
+every converted model is also checked against its BPMN input by the bounded
+verifier and the outcome is added to its status record.
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from main import convert_bpmn_to_dcr
+from dcr_generator import DCRGenerator
+from conversion_cache import ConversionCache
+from verifier import describe, verify_document
+
+
+BPMN_PATTERN = '*.bpmn'
+# State budget of a --verify check, below the verifier's own default: it
+# keeps a check of a small model to a few seconds, at the price of more
+# checks ending incomplete.
+VERIFY_MAX_STATES = 50_000
+
+
+class ConversionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ConversionTimeout()
+
+
+_worker_caches = {}
+
+
+def _get_worker_cache(db_path: str, compact_xor_splits: bool = False) -> ConversionCache:
+    # One cache per worker process; only small, recently used entries are
+    # kept in memory since every file of a batch is normally distinct.
+    key = (db_path, compact_xor_splits)
+    if key not in _worker_caches:
+        _worker_caches[key] = ConversionCache(
+            max_entries=32, db_path=db_path, workers=1,
+            compact_xor_splits=compact_xor_splits)
+    return _worker_caches[key]
+
+
+def collect_inputs(sources: Iterable[str], manifest: Optional[str] = None) -> List[str]:
+    """
+    Expands files, directories and glob patterns (and the entries of an
+    optional manifest, relative to the manifest's folder) to a de-duplicated
+    list of BPMN file paths, in the order they were given.
+    """
+    entries = list(sources)
+    if manifest:
+        base_dir = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    entries.append(os.path.join(base_dir, line))
+
+    paths = {}
+    for entry in entries:
+        if os.path.isdir(entry):
+            matches = sorted(glob.glob(os.path.join(
+                entry, '**', BPMN_PATTERN), recursive=True))
+        elif os.path.isfile(entry):
+            matches = [entry]
+        else:
+            matches = sorted(glob.glob(entry, recursive=True))
+        for match in matches:
+            if os.path.isfile(match):
+                paths.setdefault(os.path.abspath(match), None)
+    return list(paths)
+
+
+def plan_outputs(paths: List[str], out_dir: str) -> List[Tuple[str, str]]:
+    """
+    Maps every input to an output stem under out_dir, mirroring the inputs'
+    layout relative to their common folder so equal file names don't clash.
+    """
+    if not paths:
+        return []
+    base_dir = os.path.commonpath([os.path.dirname(p) for p in paths])
+    plan = []
+    for path in paths:
+        relative = os.path.splitext(os.path.relpath(path, base_dir))[0]
+        plan.append((path, os.path.join(out_dir, relative)))
+    return plan
+
+
+@contextmanager
+def _alarm(timeout: Optional[float]):
+    # Raises ConversionTimeout in the block once `timeout` seconds have
+    # passed, where SIGALRM is available.
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def verify_content(content: bytes, verify_length: int, timeout: Optional[float] = None,
+                   compact_xor_splits: bool = False,
+                   max_states: int = VERIFY_MAX_STATES) -> List[dict]:
+    """
+    Checks every process of a converted document up to verify_length steps,
+    under a timeout of its own. A timeout or error is reported as an entry
+    whose `equivalent` is None rather than raised; a check that ran out of
+    states has `complete` False and says so in its message.
+    """
+    try:
+        with _alarm(timeout):
+            results = verify_document(content, compact_xor_splits, verify_length,
+                                      max_states)
+    except ConversionTimeout:
+        message = f"Verification exceeded the {timeout}s timeout"
+    except Exception as e:
+        message = f"{type(e).__name__}: {e}"
+    else:
+        return [{'process': name, 'equivalent': result.equivalent,
+                 'complete': result.complete, 'trace': result.trace,
+                 'message': result.message if result.complete else describe(result)}
+                for name, result in results]
+    return [{'process': None, 'equivalent': None, 'complete': False,
+             'trace': None, 'message': message}]
+
+
+def convert_file(job: Tuple[str, str, Optional[float], Optional[str],
+                             Optional[int], bool, int]) -> dict:
+    """
+    Converts one file and writes its DCR XML and status record. Runs inside a
+    worker process; the timeout is enforced with SIGALRM where available.
+    When a trace length is given, a converted model is then verified with a
+    timeout of the same length; the verification never changes the status
+    or the output.
+    """
+    (source, output_stem, timeout, cache_db, verify_length, compact_xor_splits,
+     verify_states) = job
+    output_path = output_stem + '.dcr.xml'
+    record = {'source': source, 'output': None,
+              'status': 'converted', 'errors': [], 'duration_s': 0.0}
+    os.makedirs(os.path.dirname(output_stem) or '.', exist_ok=True)
+
+    start = time.perf_counter()
+    content = None
+    try:
+        with _alarm(timeout):
+            with open(source, 'rb') as f:
+                content = f.read()
+            if cache_db:
+                xml, errors = _get_worker_cache(cache_db, compact_xor_splits).convert(content)
+                if xml is not None:
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        f.write(xml)
+            else:
+                # Files are already spread over the batch workers, so the
+                # processes of a collaboration are translated in this one.
+                dcr_graph, errors = convert_bpmn_to_dcr(
+                    content, workers=1, compact_xor_splits=compact_xor_splits)
+                if dcr_graph is not None:
+                    DCRGenerator(dcr_graph).to_xml(output_path)
+        if errors:
+            record['status'] = 'invalid'
+            record['errors'] = errors
+        else:
+            record['output'] = output_path
+    except ConversionTimeout:
+        record['status'] = 'timeout'
+        record['errors'] = [f"Conversion exceeded the {timeout}s timeout"]
+    except Exception as e:
+        record['status'] = 'error'
+        record['errors'] = [f"{type(e).__name__}: {e}"]
+    finally:
+        record['duration_s'] = round(time.perf_counter() - start, 6)
+
+    if record['status'] != 'converted':
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    elif verify_length:
+        verify_start = time.perf_counter()
+        record['verification'] = verify_content(content, verify_length, timeout,
+                                                compact_xor_splits, verify_states)
+        record['verification_duration_s'] = round(time.perf_counter() - verify_start, 6)
+
+    with open(output_stem + '.status.json', 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def run_batch(paths: List[str], out_dir: str, workers: int = None,
+              chunksize: int = 1, timeout: Optional[float] = None,
+              cache_db: Optional[str] = None,
+              verify_length: Optional[int] = None,
+              compact_xor_splits: bool = False,
+              verify_states: int = VERIFY_MAX_STATES) -> List[dict]:
+    jobs = [(source, stem, timeout, cache_db, verify_length, compact_xor_splits,
+             verify_states)
+            for source, stem in plan_outputs(paths, out_dir)]
+    if workers == 1:
+        return [convert_file(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(convert_file, jobs, chunksize=max(1, chunksize)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert many BPMN files to DCR XML in parallel.")
+    parser.add_argument(
+        "inputs", nargs="*", help="BPMN files, directories or glob patterns")
+    parser.add_argument(
+        "--manifest", help="File listing one BPMN path per line")
+    parser.add_argument(
+        "--out-dir", default="dcr-out",
+        help="Directory for the DCR XML and status files (default: dcr-out)")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(),
+        help="Number of worker processes (default: CPU count)")
+    parser.add_argument(
+        "--chunksize", type=int, default=4,
+        help="Files handed to a worker at a time (default: 4)")
+    parser.add_argument(
+        "--timeout", type=float, default=60,
+        help="Per-file timeout in seconds, 0 to disable (default: 60)")
+    parser.add_argument(
+        "--cache-db", help="sqlite file caching conversions across runs")
+    parser.add_argument(
+        "--compact-xor", action="store_true",
+        help="Group the branches of XOR splits with three or more branches in a nesting")
+    parser.add_argument(
+        "--verify", type=int, nargs="?", const=12, default=None, metavar="LENGTH",
+        help="Check every converted model against its BPMN input up to LENGTH steps (default: 12). "
+             "This runs after the conversion, under its own --timeout, and can take "
+             "seconds per model")
+    parser.add_argument(
+        "--verify-states", type=int, default=VERIFY_MAX_STATES, metavar="STATES",
+        help="States a check may explore before it stops incomplete "
+             f"(default: {VERIFY_MAX_STATES}); higher values check more but take longer")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.inputs, args.manifest)
+    if not paths:
+        print("No BPMN files found.")
+        return 2
+
+    print(f"Converting {len(paths)} files with {args.workers} workers...")
+    start = time.perf_counter()
+    records = run_batch(paths, args.out_dir, args.workers,
+                        args.chunksize, args.timeout or None, args.cache_db, args.verify,
+                        args.compact_xor, args.verify_states)
+
+    counts = {}
+    diverging = unverified = incomplete = 0
+    for record in records:
+        counts[record['status']] = counts.get(record['status'], 0) + 1
+        checks = record.get('verification', [])
+        if any(check['equivalent'] is False for check in checks):
+            diverging += 1
+        elif any(check['equivalent'] is None for check in checks):
+            unverified += 1
+        elif any(not check['complete'] for check in checks):
+            incomplete += 1
+    summary = {'total': len(records), 'counts': counts,
+               'duration_s': round(time.perf_counter() - start, 3)}
+    if args.verify:
+        summary['diverging'] = diverging
+        summary['unverified'] = unverified
+        summary['incomplete'] = incomplete
+    with open(os.path.join(args.out_dir, 'batch_summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
+          + f" ({summary['duration_s']}s)")
+    if args.verify:
+        print(f"{diverging} models diverge from their DCR translation, "
+              f"{unverified} could not be verified, "
+              f"{incomplete} ran out of states before {args.verify} steps")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,15 @@
+import io
 import xml.etree.ElementTree as ET
 from collections import defaultdict, deque
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Literal, Set, Tuple
+from typing import List, Dict, Optional, Literal, Set, Tuple, Union
+from compact_graph import CompactGraph
 
+# Steps a simple-path search of loop classification may take per pair
+SIMPLE_PATH_SEARCH_BUDGET = 100_000
 
-@dataclass
+
+@dataclass(slots=True)
 class BPMNObject:
     id: str
     element_type: Literal['Task', 'Event', 'Gateway']
@@ -45,61 +50,165 @@ class BPMNProcess:
 
 class BPMNParser:
 
+    GATEWAY_TAGS = [
+        'exclusiveGateway', 'ExclusiveGateway',
+        'parallelGateway',  'ParallelGateway',
+        'inclusiveGateway', 'InclusiveGateway'
+    ]
+
     def __init__(self, file_path):
-        self.file_path = file_path
-        self.namespaces = {
-            'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
-        self.tree = ET.parse(file_path)
-        self.root = self.tree.getroot()
-        self.process_element = self.root.find('bpmn:process', self.namespaces)
-        if self.process_element is None:
+        self._reset(file_path)
+
+        if not self._load_processes(file_path, first_only=True):
             raise ValueError(
                 "'<bpmn:process>' element not found in the file. Please ensure it is a valid BPMN file.")
 
-        self.elements_xml = {
-            elem.get('id'): elem for elem in self.process_element}
-        self.tasks_xml = {elem.get('id'): elem for elem in self.process_element.findall(
-            'bpmn:task', self.namespaces)}
-        self.start_events_xml = list(self.process_element.findall(
-            'bpmn:startEvent', self.namespaces))
-        self.end_events_xml = list(self.process_element.findall(
-            'bpmn:endEvent', self.namespaces))
-        self.end_event_ids = {e.get('id') for e in self.end_events_xml}
+        self._prepare_graph()
+
+    @classmethod
+    def from_string(cls, content: Union[str, bytes]) -> 'BPMNParser':
+        parser = cls(cls._string_source(content))
+        parser.file_path = None
+        return parser
+
+    @classmethod
+    def parse_processes(cls, file_path) -> List['BPMNParser']:
+        """
+        Parses every <bpmn:process> of the document (e.g. the pools of a
+        collaboration) in a single pass, returning one parser per process.
+        """
+        parser = cls.__new__(cls)
+        parser._reset(file_path)
+        parsers = parser._load_processes(file_path, first_only=False)
+        if not parsers:
+            raise ValueError(
+                "'<bpmn:process>' element not found in the file. Please ensure it is a valid BPMN file.")
+        for parser in parsers:
+            parser._prepare_graph()
+        return parsers
+
+    @classmethod
+    def processes_from_string(cls, content: Union[str, bytes]) -> List['BPMNParser']:
+        parsers = cls.parse_processes(cls._string_source(content))
+        for parser in parsers:
+            parser.file_path = None
+        return parsers
+
+    @staticmethod
+    def _string_source(content: Union[str, bytes]):
+        return io.BytesIO(content) if isinstance(
+            content, bytes) else io.StringIO(content)
+
+    def _reset(self, file_path):
+        self.file_path = file_path
+        self.namespaces = {
+            'bpmn': 'http://www.omg.org/spec/BPMN/20100524/MODEL'}
 
+        self.process_id = None
+        self.participant_name = None
+        self.elements_xml = {}
+        self.tasks_xml = {}
+        self.start_events_xml = []
+        self.end_events_xml = []
         self.gateways_xml = {}
-        gateway_tags = [
-            'bpmn:exclusiveGateway', 'bpmn:ExclusiveGateway',
-            'bpmn:parallelGateway',  'bpmn:ParallelGateway',
-            'bpmn:inclusiveGateway', 'bpmn:InclusiveGateway'
-        ]
-        for tag in gateway_tags:
-            for elem in self.process_element.findall(tag, self.namespaces):
-                self.gateways_xml[elem.get('id')] = elem
-
         self.flows_by_source = defaultdict(list)
         self.flows_by_target = defaultdict(list)
-        for flow in self.process_element.findall('bpmn:sequenceFlow', self.namespaces):
-            source_ref = flow.get('sourceRef')
-            target_ref = flow.get('targetRef')
-            self.flows_by_source[source_ref].append(flow)
-            self.flows_by_target[target_ref].append(flow)
-
-        self.bpmn_process = BPMNProcess(
-            process_id=self.process_element.get('id'))
+
+    def _prepare_graph(self):
+        self.end_event_ids = {e.get('id') for e in self.end_events_xml}
+
+        self.bpmn_process = BPMNProcess(process_id=self.process_id)
         self.element_names = {}
 
-        self.graph = {elem_id: [flow.get('targetRef') for flow in flows]
-                      for elem_id, flows in self.flows_by_source.items()}
+        self.flow_graph: Optional[CompactGraph] = None
+
+    def _build_flow_graph(self) -> CompactGraph:
+        # Rebuilt on every validation, so edits only touch the flow indexes.
+        nodes = [e.get('id') for e in self.start_events_xml]
+        nodes.extend(self.tasks_xml)
+        nodes.extend(self.gateways_xml)
+        nodes.extend(e.get('id') for e in self.end_events_xml)
+        return CompactGraph.from_adjacency(
+            nodes,
+            ((source_id, [flow.get('targetRef') for flow in flows])
+             for source_id, flows in self.flows_by_source.items()),
+            ((target_id, [flow.get('sourceRef') for flow in flows])
+             for target_id, flows in self.flows_by_target.items()))
+
+    def _load_processes(self, source, first_only: bool) -> List['BPMNParser']:
+        # Single iterparse pass over the document. Only the direct children of
+        # <bpmn:process> elements are kept (with their own subtrees dropped);
+        # everything else, notably the bpmndi diagram, is cleared as soon as
+        # it has been read so the tree never materialises. The first process
+        # is loaded into this parser, any further ones into new parsers.
+        ns = '{' + self.namespaces['bpmn'] + '}'
+        process_tag = ns + 'process'
+        collaboration_tag = ns + 'collaboration'
+        participant_tag = ns + 'participant'
+        parsers = []
+        participant_names = {}
+        current = None
+        gateways_by_tag = None
+        process_depth = None
+        stack = []
+
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                if (elem.tag == process_tag and len(stack) == 2
+                        and not (first_only and parsers)):
+                    if parsers:
+                        current = type(self).__new__(type(self))
+                        current._reset(self.file_path)
+                    else:
+                        current = self
+                    current.process_id = elem.get('id')
+                    parsers.append(current)
+                    gateways_by_tag = {ns + tag: [] for tag in self.GATEWAY_TAGS}
+                    process_depth = len(stack)
+                continue
 
-    def parse_and_validate(self) -> Tuple[Optional[BPMNProcess], List[str]]:
-        self._rename_events()
-        pairing_errors = self._pair_and_rename_gateways()
-        validation_errors = []
-        validation_errors.extend(self._check_start_end_events())
-        validation_errors.extend(self._check_task_connectivity())
-        validation_errors.extend(self._check_gateway_structure())
+            stack.pop()
+            if process_depth is not None and len(stack) > process_depth:
+                continue
+            if process_depth is not None and len(stack) == process_depth:
+                current._index_process_child(elem, ns, gateways_by_tag)
+                del elem[:]
+                continue
+            if process_depth is not None:
+                for elements in gateways_by_tag.values():
+                    for gateway in elements:
+                        current.gateways_xml[gateway.get('id')] = gateway
+                process_depth = None
+            elif (elem.tag == participant_tag and len(stack) == 2
+                  and stack[-1].tag == collaboration_tag):
+                participant_names[elem.get('processRef')] = elem.get('name')
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+        for parser in parsers:
+            parser.participant_name = participant_names.get(parser.process_id)
+        return parsers
+
+    def _index_process_child(self, elem, ns, gateways_by_tag):
+        elem_id = elem.get('id')
+        self.elements_xml[elem_id] = elem
+        tag = elem.tag
+        if tag == ns + 'task':
+            self.tasks_xml[elem_id] = elem
+        elif tag == ns + 'startEvent':
+            self.start_events_xml.append(elem)
+        elif tag == ns + 'endEvent':
+            self.end_events_xml.append(elem)
+        elif tag == ns + 'sequenceFlow':
+            self.flows_by_source[elem.get('sourceRef')].append(elem)
+            self.flows_by_target[elem.get('targetRef')].append(elem)
+        elif tag in gateways_by_tag:
+            gateways_by_tag[tag].append(elem)
 
-        all_errors = validation_errors + pairing_errors
+    def parse_and_validate(self) -> Tuple[Optional[BPMNProcess], List[str]]:
+        all_errors = self.validate()
 
         if all_errors:
             return None, all_errors
@@ -108,6 +217,74 @@ class BPMNParser:
 
         return self.bpmn_process, []
 
+    def validate(self) -> List[str]:
+        """
+        Names events, pairs gateways and checks the validation rules against
+        the current model, returning the errors found.
+        """
+        self.flow_graph = self._build_flow_graph()
+        self._rename_events()
+        pairing_errors = self._pair_and_rename_gateways()
+        validation_errors = []
+        validation_errors.extend(self._check_start_end_events())
+        validation_errors.extend(self._check_task_connectivity())
+        validation_errors.extend(self._check_gateway_structure())
+
+        return validation_errors + pairing_errors
+
+    def add_node(self, node_id: str, tag: str, name: Optional[str] = None):
+        """
+        Adds a task, start/end event or gateway, given its BPMN tag (e.g.
+        'task' or 'exclusiveGateway'), to the model.
+        """
+        if node_id in self.elements_xml:
+            raise ValueError(f"Element '{node_id}' already exists")
+        attributes = {'id': node_id}
+        if name is not None:
+            attributes['name'] = name
+        elem = ET.Element('{' + self.namespaces['bpmn'] + '}' + tag, attributes)
+        self.elements_xml[node_id] = elem
+        if tag == 'task':
+            self.tasks_xml[node_id] = elem
+        elif tag == 'startEvent':
+            self.start_events_xml.append(elem)
+        elif tag == 'endEvent':
+            self.end_events_xml.append(elem)
+            self.end_event_ids.add(node_id)
+        elif tag in self.GATEWAY_TAGS:
+            self.gateways_xml[node_id] = elem
+        else:
+            del self.elements_xml[node_id]
+            raise ValueError(f"Unsupported element type '{tag}'")
+
+    def remove_node(self, node_id: str):
+        """Removes a node; its sequence flows must have been removed first."""
+        elem = self.elements_xml.pop(node_id)
+        self.tasks_xml.pop(node_id, None)
+        self.gateways_xml.pop(node_id, None)
+        self.element_names.pop(node_id, None)
+        if elem in self.start_events_xml:
+            self.start_events_xml.remove(elem)
+        if elem in self.end_events_xml:
+            self.end_events_xml.remove(elem)
+            self.end_event_ids.discard(node_id)
+
+    def add_flow(self, flow_id: str, source_id: str, target_id: str):
+        if flow_id in self.elements_xml:
+            raise ValueError(f"Element '{flow_id}' already exists")
+        elem = ET.Element('{' + self.namespaces['bpmn'] + '}sequenceFlow',
+                          {'id': flow_id, 'sourceRef': source_id, 'targetRef': target_id})
+        self.elements_xml[flow_id] = elem
+        self.flows_by_source[source_id].append(elem)
+        self.flows_by_target[target_id].append(elem)
+
+    def remove_flow(self, flow_id: str) -> Tuple[str, str]:
+        elem = self.elements_xml.pop(flow_id)
+        source_id, target_id = elem.get('sourceRef'), elem.get('targetRef')
+        self.flows_by_source[source_id].remove(elem)
+        self.flows_by_target[target_id].remove(elem)
+        return source_id, target_id
+
     def _build_structured_process_object(self):
         for source_id, flows in self.flows_by_source.items():
             for flow in flows:
@@ -120,40 +297,44 @@ class BPMNParser:
         all_xml_elements.update({e.get('id'): e for e in self.end_events_xml})
 
         for elem_id, elem_xml in all_xml_elements.items():
-            name = elem_xml.get('name')
-            system_name = self.element_names.get(elem_id, name or elem_id)
-            incoming = [f.get('id')
-                        for f in self.flows_by_target.get(elem_id, [])]
-            outgoing = [f.get('id')
-                        for f in self.flows_by_source.get(elem_id, [])]
-            tag = elem_xml.tag.split('}')[1]
-
-            element_type = 'Task'
-            if 'Event' in tag:
-                element_type = 'Event'
-            elif 'Gateway' in tag:
-                element_type = 'Gateway'
-
-            node = BPMNObject(id=elem_id, element_type=element_type, name=name,
-                              system_name=system_name, incoming_flows=incoming, outgoing_flows=outgoing)
-
-            if node.element_type == 'Event':
-                node.event_type = tag.replace(
-                    'Event', ' Event').title().replace(' ', '')
-            elif node.element_type == 'Gateway':
-                gw_type_map = {
-                    'exclusiveGateway': 'Exclusive', 'ExclusiveGateway': 'Exclusive',
-                    'parallelGateway': 'Parallel', 'ParallelGateway': 'Parallel',
-                    'inclusiveGateway': 'Inclusive', 'InclusiveGateway': 'Inclusive'
-                }
-                node.gateway_type = gw_type_map.get(tag, 'Unknown')
-                node.gateway_function = 'Split' if len(
-                    incoming) == 1 and len(outgoing) > 1 else 'Join'
-
-            self.bpmn_process.objects[elem_id] = node
+            self.bpmn_process.objects[elem_id] = self.build_object(elem_id)
 
         self.bpmn_process.gateway_pairs = self.gateway_pairs_data
 
+    def build_object(self, elem_id: str) -> BPMNObject:
+        """Builds the BPMNObject for a task, event or gateway of the model."""
+        elem_xml = self.elements_xml[elem_id]
+        name = elem_xml.get('name')
+        system_name = self.element_names.get(elem_id, name or elem_id)
+        incoming = [f.get('id')
+                    for f in self.flows_by_target.get(elem_id, [])]
+        outgoing = [f.get('id')
+                    for f in self.flows_by_source.get(elem_id, [])]
+        tag = elem_xml.tag.split('}')[1]
+
+        element_type = 'Task'
+        if 'Event' in tag:
+            element_type = 'Event'
+        elif 'Gateway' in tag:
+            element_type = 'Gateway'
+
+        node = BPMNObject(id=elem_id, element_type=element_type, name=name,
+                          system_name=system_name, incoming_flows=incoming, outgoing_flows=outgoing)
+
+        if node.element_type == 'Event':
+            node.event_type = tag.replace(
+                'Event', ' Event').title().replace(' ', '')
+        elif node.element_type == 'Gateway':
+            gw_type_map = {
+                'exclusiveGateway': 'Exclusive', 'ExclusiveGateway': 'Exclusive',
+                'parallelGateway': 'Parallel', 'ParallelGateway': 'Parallel',
+                'inclusiveGateway': 'Inclusive', 'InclusiveGateway': 'Inclusive'
+            }
+            node.gateway_type = gw_type_map.get(tag, 'Unknown')
+            node.gateway_function = 'Split' if len(
+                incoming) == 1 and len(outgoing) > 1 else 'Join'
+        return node
+
     def _rename_events(self):
         if self.start_events_xml:
             start_event_id = self.start_events_xml[0].get('id')
@@ -163,72 +344,338 @@ class BPMNParser:
             end_event_id = end_event.get('id')
             self.element_names[end_event_id] = f"End Event {i+1}"
 
-    def _get_all_paths(self, graph, start_node, end_nodes):
-        paths = []
-        stack = [(start_node, [start_node])]
+    def _compute_immediate_dominators(self, root: int, graph: CompactGraph) -> List[int]:
+        # Cooper, Harvey & Kennedy: iterate over the reverse postorder until the
+        # immediate dominators stabilise. Nodes unreachable from root get -1.
+        postorder = []
+        visited = bytearray(len(graph))
+        visited[root] = 1
+        stack = [(root, iter(graph.successors(root)))]
         while stack:
-            (vertex, path) = stack.pop()
-            neighbors = graph.get(vertex, [])
+            node, neighbors = stack[-1]
             for next_node in neighbors:
-                if next_node in path:
+                if not visited[next_node]:
+                    visited[next_node] = 1
+                    stack.append((next_node, iter(graph.successors(next_node))))
+                    break
+            else:
+                stack.pop()
+                postorder.append(node)
+
+        reverse_postorder = postorder[::-1]
+        order_index = [0] * len(graph)
+        for i, node in enumerate(reverse_postorder):
+            order_index[node] = i
+        idom = [-1] * len(graph)
+        idom[root] = root
+
+        def intersect(a, b):
+            while a != b:
+                while order_index[a] > order_index[b]:
+                    a = idom[a]
+                while order_index[b] > order_index[a]:
+                    b = idom[b]
+            return a
+
+        preds_in_order = [(node, graph.predecessors(node))
+                          for node in reverse_postorder[1:]]
+        changed = True
+        while changed:
+            changed = False
+            for node, preds in preds_in_order:
+                new_idom = -1
+                for pred in preds:
+                    if idom[pred] != -1:
+                        new_idom = pred if new_idom == -1 else intersect(
+                            pred, new_idom)
+                if idom[node] != new_idom:
+                    idom[node] = new_idom
+                    changed = True
+        return idom
+
+    def _compute_dominance_intervals(self, idom: List[int]):
+        # Pre/post numbering of the dominator tree, so that "a dominates b"
+        # becomes an O(1) interval containment check.
+        children = [[] for _ in idom]
+        root = -1
+        for node, parent in enumerate(idom):
+            if node == parent:
+                root = node
+            elif parent != -1:
+                children[parent].append(node)
+        pre = [-1] * len(idom)
+        post = [-1] * len(idom)
+        if root == -1:
+            return pre, post
+        counter = 0
+        stack = [(root, False)]
+        while stack:
+            node, finished = stack.pop()
+            if finished:
+                post[node] = counter
+                continue
+            pre[node] = counter
+            counter += 1
+            stack.append((node, True))
+            stack.extend((child, False) for child in children[node])
+        return pre, post
+
+    def _dominates(self, intervals, a: int, b: int) -> bool:
+        pre, post = intervals
+        if pre[a] == -1 or pre[b] == -1:
+            return False
+        return pre[a] <= pre[b] and post[b] <= post[a]
+
+    def _nodes_reaching_end(self) -> bytearray:
+        graph = self.flow_graph
+        return self._nodes_reaching(graph.index[end_id] for end_id in self.end_event_ids
+                                    if end_id in graph.index)
+
+    def _nodes_reaching(self, targets, blocked: Set[int] = frozenset()) -> bytearray:
+        # Nodes with a path to one of `targets` that doesn't pass `blocked`.
+        graph = self.flow_graph
+        pred_offsets, pred_targets = graph.pred_offsets, graph.pred_targets
+        reaching = bytearray(len(graph))
+        queue = deque(targets)
+        for node in queue:
+            reaching[node] = 1
+        while queue:
+            current_node = queue.popleft()
+            for pred in pred_targets[pred_offsets[current_node]:pred_offsets[current_node + 1]]:
+                if not reaching[pred] and pred not in blocked:
+                    reaching[pred] = 1
+                    queue.append(pred)
+        return reaching
+
+    def _component_order(self) -> List[int]:
+        """
+        Strongly connected component of every node, numbered in the order
+        Tarjan's algorithm completes them: when a node reaches another, its
+        component's number is not smaller.
+        """
+        graph = self.flow_graph
+        offsets, targets = graph.succ_offsets, graph.succ_targets
+        n = len(graph)
+        component = [-1] * n
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        scc_stack = []
+        counter = 0
+        components = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack[root] = 1
+            stack = [(root, offsets[root])]
+            while stack:
+                node, i = stack[-1]
+                if i < offsets[node + 1]:
+                    stack[-1] = (node, i + 1)
+                    next_node = targets[i]
+                    if index[next_node] == -1:
+                        index[next_node] = low[next_node] = counter
+                        counter += 1
+                        scc_stack.append(next_node)
+                        on_stack[next_node] = 1
+                        stack.append((next_node, offsets[next_node]))
+                    elif on_stack[next_node]:
+                        low[node] = min(low[node], index[next_node])
                     continue
-
-                new_path = list(path)
-                new_path.append(next_node)
-
-                if next_node in end_nodes:
-                    paths.append(new_path)
-                else:
-                    stack.append((next_node, new_path))
-        return paths
-
-    def _trace_inclusive_branches(self, split_id: str, join_id: str) -> List[InclusiveTrace]:
-        traces = []
-        trace_counter = 1
-
-        start_nodes = self.graph.get(split_id, [])
-        end_nodes = {flow.get('sourceRef')
-                     for flow in self.flows_by_target.get(join_id, [])}
+                stack.pop()
+                if stack:
+                    parent = stack[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack[member] = 0
+                        component[member] = components
+                        if member == node:
+                            break
+                    components += 1
+        return component
+
+    def _exclusive_pair_is_loop(self, start: int, split: int, join: int, idom: List[int],
+                                dominance, reaching_end: bytearray,
+                                component: List[int]) -> bool:
+        """
+        An exclusive pair is a loop when some simple start-to-end path passes
+        the join before the split and none passes the split first. When the
+        join dominates the split, no path can pass the split first, and the
+        answer only needs a path start -> join -> split -> end. Should a
+        search hit its budget, the dominator test decides on its own.
+        """
+        # Without a way from the join to the split, no path passes the join
+        # first.
+        if not reaching_end[split] or component[join] < component[split]:
+            return False
+        dominated = self._dominates(dominance, join, split)
+        join_first = self._has_simple_path(start, join, split, idom)
+        if join_first is None:
+            return dominated
+        if not join_first or dominated:
+            return join_first
+        split_first = self._has_simple_path(start, split, join, idom)
+        if split_first is None:
+            return dominated
+        return not split_first
+
+    def _has_simple_path(self, start: int, first: int, second: int,
+                         idom: List[int]) -> Optional[bool]:
+        """
+        Whether a simple path from `start` visits `first`, then `second`,
+        then stops at the first end event it meets. A depth-first search,
+        pruned to nodes that can still reach the next node to visit; gives
+        None after SIMPLE_PATH_SEARCH_BUDGET steps.
+        """
+        if idom[first] == -1:
+            return False
+        # The strict dominators of `first` are on every way to it, so the
+        # rest of the path must avoid them.
+        prefix = set()
+        node = first
+        while idom[node] != node:
+            node = idom[node]
+            prefix.add(node)
+        if second in prefix:
+            return False
+
+        graph = self.flow_graph
+        offsets, targets = graph.succ_offsets, graph.succ_targets
+        end_nodes = {graph.index[end_id] for end_id in self.end_event_ids
+                     if end_id in graph.index}
+        # Nodes from which the next node to visit is reachable, per stage
+        reachable = (self._nodes_reaching([first]),
+                     self._nodes_reaching([second], prefix),
+                     self._nodes_reaching(end_nodes, prefix))
+        if not reachable[1][first] or not reachable[2][second]:
+            return False
+
+        def enter(node, stage):
+            if stage == 0 and node == second:
+                return None
+            if stage == 0 and node == first:
+                stage = 1
+            elif stage == 1 and node == second:
+                stage = 2
+            return stage if reachable[stage][node] else None
+
+        stage = enter(start, 0)
+        if stage is None:
+            return False
+        on_path = bytearray(len(graph))
+        on_path[start] = 1
+        stack = [(start, stage, offsets[start])]
+        steps = 0
+        while stack:
+            node, stage, i = stack[-1]
+            if i == offsets[node + 1]:
+                stack.pop()
+                on_path[node] = 0
+                continue
+            stack[-1] = (node, stage, i + 1)
+            next_node = targets[i]
+            if on_path[next_node]:
+                continue
+            next_stage = enter(next_node, stage)
+            if next_stage is None:
+                continue
+            if next_node in end_nodes:
+                if next_stage == 2:
+                    return True
+                continue
+            steps += 1
+            if steps > SIMPLE_PATH_SEARCH_BUDGET:
+                return None
+            on_path[next_node] = 1
+            stack.append((next_node, next_stage, offsets[next_node]))
+        return False
+
+    def _trace_inclusive_branches(self, split: int, join: int) -> List[InclusiveTrace]:
+        # One trace per (branch start, join predecessor) pair where the
+        # predecessor is reachable from the branch without passing through
+        # the split or the join. Branches are ordered as they leave the split,
+        # predecessors as they enter the join.
+        graph = self.flow_graph
+        start_nodes = graph.successors(split)
+        end_nodes = list(dict.fromkeys(graph.predecessors(join)))
 
         if not start_nodes or not end_nodes:
             return []
 
-        for start_node in start_nodes:
-            queue = deque([start_node])
-            visited = {start_node, split_id, join_id}
-
-            reachable_end_nodes = set()
-
-            while queue:
-                current_node = queue.popleft()
+        blocked = {split, join}
+        end_bits = {node: 1 << i for i, node in enumerate(end_nodes)}
+        masks = self._reachable_end_masks(end_bits, blocked)
 
-                if current_node in end_nodes:
-                    reachable_end_nodes.add(current_node)
+        traces = []
+        for start_node in start_nodes:
+            if start_node in blocked:
+                # Traced from the split or join itself: the node counts, its
+                # own successors are followed.
+                mask = end_bits.get(start_node, 0)
+                for successor in graph.successors(start_node):
+                    mask |= masks.get(successor, 0)
+            else:
+                mask = masks.get(start_node, 0)
+
+            while mask:
+                lowest = mask & -mask
+                mask ^= lowest
+                traces.append(InclusiveTrace(
+                    trace_id=len(traces) + 1,
+                    start_object_id=graph.ids[start_node],
+                    end_object_id=graph.ids[end_nodes[lowest.bit_length() - 1]]
+                ))
 
-                for neighbor in self.graph.get(current_node, []):
-                    if neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append(neighbor)
+        return traces
 
-            for end_node in reachable_end_nodes:
-                trace = InclusiveTrace(
-                    trace_id=trace_counter,
-                    start_object_id=start_node,
-                    end_object_id=end_node
-                )
-                traces.append(trace)
-                trace_counter += 1
+    def _reachable_end_masks(self, end_bits: Dict[int, int], blocked: Set[int]) -> Dict[int, int]:
+        """
+        Maps every node that can reach one of the `end_bits` nodes without
+        passing through `blocked` to the union of the bits it reaches, in a
+        single backwards pass from the end nodes. A node is revisited only
+        when its mask gains bits, so when branches don't share nodes every
+        node is visited once, however many branches there are.
+        """
+        graph = self.flow_graph
+        pred_offsets, pred_targets = graph.pred_offsets, graph.pred_targets
+        masks = {}
+        queue = deque()
+        for node, bit in end_bits.items():
+            if node not in blocked:
+                masks[node] = masks.get(node, 0) | bit
+                queue.append(node)
 
-        return traces
+        while queue:
+            current_node = queue.popleft()
+            mask = masks[current_node]
+            for pred in pred_targets[pred_offsets[current_node]:pred_offsets[current_node + 1]]:
+                if pred in blocked:
+                    continue
+                pred_mask = masks.get(pred)
+                if pred_mask is None:
+                    masks[pred] = mask
+                    queue.append(pred)
+                elif pred_mask | mask != pred_mask:
+                    masks[pred] = pred_mask | mask
+                    queue.append(pred)
+        return masks
 
     def _pair_and_rename_gateways(self):
         errors = []
-        splits_by_type = defaultdict(list)
-        joins_by_type = defaultdict(list)
+        graph = self.flow_graph
+        split_ids = set()
+        join_ids = set()
+        gateway_types = {}
 
         for gw_id, gw in self.gateways_xml.items():
-            incoming = len(self.flows_by_target.get(gw_id, []))
-            outgoing = len(self.flows_by_source.get(gw_id, []))
+            node = graph.index[gw_id]
+            incoming = graph.in_degree(node)
+            outgoing = graph.out_degree(node)
             tag_name = gw.tag.split('}')[1].lower()
             gw_type = ''
             if tag_name.endswith('exclusivegateway'):
@@ -239,13 +686,11 @@ class BPMNParser:
                 gw_type = 'inclusive'
 
             if gw_type:
+                gateway_types[node] = gw_type
                 if incoming == 1 and outgoing > 1:
-                    splits_by_type[gw_type].append(gw_id)
+                    split_ids.add(node)
                 elif incoming > 1 and outgoing == 1:
-                    joins_by_type[gw_type].append(gw_id)
-
-        all_split_ids = {sid for s_list in splits_by_type.values()
-                         for sid in s_list}
+                    join_ids.add(node)
 
         paired_gateways = set()
 
@@ -263,53 +708,37 @@ class BPMNParser:
             errors.append(
                 "Validation Failed: No start event found to begin path traversal.")
             return errors
-        all_paths = self._get_all_paths(
-            self.graph, start_node_id, self.end_event_ids)
-
-        queue = deque([start_node_id])
-        visited_for_pairing = {start_node_id}
+        start_node = graph.index[start_node_id]
+        idom = self._compute_immediate_dominators(start_node, graph)
+        dominance = self._compute_dominance_intervals(idom)
+        reaching_end = self._nodes_reaching_end()
+        component = self._component_order()
+        join_for_split = self._compute_sese_pairs(
+            idom, dominance, split_ids, join_ids, gateway_types)
+
+        queue = deque([start_node])
+        visited_for_pairing = bytearray(len(graph))
+        visited_for_pairing[start_node] = 1
 
         while queue:
-            current_id = queue.popleft()
-
-            if current_id in all_split_ids and current_id not in paired_gateways:
-                split_id = current_id
-                gw_element = self.gateways_xml[split_id]
-
-                tag_name = gw_element.tag.split('}')[1].lower()
-                gw_type_str = ''
-                if tag_name.endswith('exclusivegateway'):
-                    gw_type_str = 'exclusive'
-                elif tag_name.endswith('parallelgateway'):
-                    gw_type_str = 'parallel'
-                elif tag_name.endswith('inclusivegateway'):
-                    gw_type_str = 'inclusive'
-
-                potential_joins = [j for j in joins_by_type.get(
-                    gw_type_str, []) if j not in paired_gateways]
-                match = self._find_join_for_split(
-                    split_id, self.graph, potential_joins)
-
-                if match:
+            current = queue.popleft()
+
+            if current in split_ids and current not in paired_gateways:
+                split = current
+                gw_type_str = gateway_types[split]
+
+                match = join_for_split.get(split)
+
+                if match is not None and match not in paired_gateways:
                     is_loop = False
                     if gw_type_str == 'exclusive':
-                        join_always_first = True
-                        found_pair_in_path = False
-                        for path in all_paths:
-                            try:
-                                idx_split, idx_join = path.index(
-                                    split_id), path.index(match)
-                                found_pair_in_path = True
-                                if idx_split < idx_join:
-                                    join_always_first = False
-                                    break
-                            except ValueError:
-                                continue
-                        if found_pair_in_path and join_always_first:
-                            is_loop = True
-
-                    paired_gateways.add(split_id)
+                        is_loop = self._exclusive_pair_is_loop(
+                            start_node, split, match, idom, dominance, reaching_end,
+                            component)
+
+                    paired_gateways.add(split)
                     paired_gateways.add(match)
+                    split_id, join_id = graph.ids[split], graph.ids[match]
 
                     type_name_map = {'exclusive': 'Exclusive',
                                      'parallel': 'Parallel', 'inclusive': 'Inclusive'}
@@ -318,25 +747,22 @@ class BPMNParser:
                     name_count = naming_counters[base_name]
 
                     if is_loop:
-                        self.element_names[
-                            match] = f"{base_name} {name_count} -- Join (Loop {loop_counter} In)"
-                        self.element_names[
-                            split_id] = f"{base_name} {name_count} -- Split (Loop {loop_counter} Out)"
+                        self.name_gateway_pair(
+                            split_id, join_id, base_name, name_count, loop_counter)
                         loop_counter += 1
                     else:
-                        self.element_names[match] = f"{base_name} {name_count} -- Join"
-                        self.element_names[split_id] = f"{base_name} {name_count} -- Split"
+                        self.name_gateway_pair(
+                            split_id, join_id, base_name, name_count)
 
                     traces = []
                     if base_name == 'Inclusive':
-                        traces = self._trace_inclusive_branches(
-                            split_id, match)
+                        traces = self._trace_inclusive_branches(split, match)
 
                     self.gateway_pairs_data[pair_id_counter] = BPMNGatewayPair(
                         pair_id=pair_id_counter,
                         gateway_type=base_name,
                         split_gateway_id=split_id,
-                        join_gateway_id=match,
+                        join_gateway_id=join_id,
                         is_loop=is_loop,
                         inclusive_traces=traces
                     )
@@ -344,54 +770,137 @@ class BPMNParser:
                     naming_counters[base_name] += 1
                     pair_id_counter += 1
 
-            for neighbor in self.graph.get(current_id, []):
-                if neighbor not in visited_for_pairing:
-                    visited_for_pairing.add(neighbor)
+            for neighbor in graph.successors(current):
+                if not visited_for_pairing[neighbor]:
+                    visited_for_pairing[neighbor] = 1
                     queue.append(neighbor)
 
-        unpaired = set(self.gateways_xml.keys()) - paired_gateways
-        for gw_id in unpaired:
-            errors.append(
-                f"Validation Failed [Rule 4]: Gateway '{self.gateways_xml[gw_id].get('name', gw_id)}' ({gw_id}) could not be paired. This violates the SESE (Single Entry, Single Exit) principle.")
+        for gw_id, gw in self.gateways_xml.items():
+            if graph.index[gw_id] not in paired_gateways:
+                errors.append(
+                    f"Validation Failed [Rule 4]: Gateway '{gw.get('name', gw_id)}' ({gw_id}) could not be paired. This violates the SESE (Single Entry, Single Exit) principle.")
         return errors
 
-    def _find_join_for_split(self, split_id, graph, potential_joins):
-        children = graph.get(split_id, [])
-        if len(children) < 2:
-            return None
-        visited_from_child = defaultdict(set)
-        queue = deque([(child, child) for child in children])
-        terminated_branches = set()
-        for child in children:
-            visited_from_child[child].add(child)
-        max_depth = len(self.elements_xml)
-        depth = 0
-        nodes_at_current_depth = len(queue)
-        while queue and depth < max_depth:
-            current_node, origin_child = queue.popleft()
-            nodes_at_current_depth -= 1
-            if current_node in self.end_event_ids:
-                terminated_branches.add(origin_child)
-                for join_candidate in potential_joins:
-                    if visited_from_child[join_candidate] | terminated_branches == set(children):
-                        return join_candidate
-                if nodes_at_current_depth == 0:
-                    depth += 1
-                    nodes_at_current_depth = len(queue)
+    def name_gateway_pair(self, split_id: str, join_id: str, base_name: str,
+                          name_count: int, loop_number: Optional[int] = None):
+        if loop_number is not None:
+            self.element_names[
+                join_id] = f"{base_name} {name_count} -- Join (Loop {loop_number} In)"
+            self.element_names[
+                split_id] = f"{base_name} {name_count} -- Split (Loop {loop_number} Out)"
+        else:
+            self.element_names[join_id] = f"{base_name} {name_count} -- Join"
+            self.element_names[split_id] = f"{base_name} {name_count} -- Split"
+
+    def _compute_sese_pairs(self, idom, dominance, split_ids, join_ids, gateway_types):
+        # Single decomposition of the flow graph into SESE regions:
+        #  1. Back edges (target dominates source) identify loops. The loop
+        #     split is the first split of the header's type on the dominator
+        #     chain of the back edge source that has an exit out of the loop.
+        #  2. With back edges redirected to the loop exits the graph is
+        #     acyclic; every other split is paired with the nearest join of its
+        #     type that post-dominates all of its branches. Branches that only
+        #     end in an end event do not need to reach the join.
+        graph = self.flow_graph
+        back_edges = [(source, target) for source, target in graph.edges()
+                      if self._dominates(dominance, target, source)]
+
+        # A header may have several back edges (rework paths rejoining the
+        # loop); the loop body covers all of them, and all of them are
+        # redirected to the exits of the one loop split.
+        sources_of = {}
+        for source, header in back_edges:
+            if header in join_ids:
+                sources_of.setdefault(header, []).append(source)
+
+        join_for_split = {}
+        loop_exits = {}
+        for header, sources in sources_of.items():
+            body = set()
+            for source in sources:
+                body |= self._collect_loop_body(source, header)
+            for source in sources:
+                node = source
+                while node != header and header not in loop_exits:
+                    if (node in split_ids and node not in join_for_split
+                            and gateway_types[node] == gateway_types[header]):
+                        exits = [target for target in graph.successors(node)
+                                 if target not in body]
+                        if exits:
+                            join_for_split[node] = header
+                            loop_exits[header] = exits
+                    node = idom[node]
+        loop_headers = set(loop_exits)
+
+        # The acyclic graph gets a virtual sink after the end events.
+        sink = len(graph)
+        back_edge_set = set(back_edges)
+        forward = [[] for _ in range(sink + 1)]
+        for source, target in graph.edges():
+            if (source, target) in back_edge_set:
+                forward[source].extend(loop_exits.get(target, []))
+            else:
+                forward[source].append(target)
+        for end_id in self.end_event_ids:
+            forward[graph.index[end_id]].append(sink)
+        acyclic = CompactGraph(graph.ids + ['#sink'], forward)
+
+        ipdom = self._compute_immediate_dominators(sink, acyclic.reversed())
+
+        children = [[] for _ in ipdom]
+        for node, parent in enumerate(ipdom):
+            if node != parent and parent != -1:
+                children[parent].append(node)
+        depth = [0] * len(ipdom)
+        nearest_join = {gw_type: [-1] * len(ipdom)
+                        for gw_type in set(gateway_types.values())}
+        queue = deque([sink])
+        while queue:
+            parent = queue.popleft()
+            for node in children[parent]:
+                depth[node] = depth[parent] + 1
+                for gw_type, nearest in nearest_join.items():
+                    is_candidate = (node in join_ids and node not in loop_headers
+                                    and gateway_types[node] == gw_type)
+                    nearest[node] = node if is_candidate else nearest[parent]
+                queue.append(node)
+
+        def common_post_dominator(a, b):
+            while depth[a] > depth[b]:
+                a = ipdom[a]
+            while depth[b] > depth[a]:
+                b = ipdom[b]
+            while a != b:
+                a, b = ipdom[a], ipdom[b]
+            return a
+
+        for split in split_ids:
+            if split in join_for_split:
                 continue
-            if current_node in potential_joins:
-                if visited_from_child[current_node] | terminated_branches == set(children):
-                    return current_node
-            for neighbor in graph.get(current_node, []):
-                if origin_child not in visited_from_child[neighbor]:
-                    visited_from_child[neighbor].add(origin_child)
-                    queue.append((neighbor, origin_child))
-            if nodes_at_current_depth == 0:
-                depth += 1
-                nodes_at_current_depth = len(queue)
-        if terminated_branches == set(children):
-            return None
-        return None
+            nearest = nearest_join[gateway_types[split]]
+            branches = [child for child in acyclic.successors(split)
+                        if nearest[child] != -1]
+            if not branches:
+                continue
+            common = branches[0]
+            for child in branches[1:]:
+                common = common_post_dominator(common, child)
+            if nearest[common] != -1:
+                join_for_split[split] = nearest[common]
+        return join_for_split
+
+    def _collect_loop_body(self, back_edge_source: int, header: int) -> Set[int]:
+        graph = self.flow_graph
+        pred_offsets, pred_targets = graph.pred_offsets, graph.pred_targets
+        body = {header, back_edge_source}
+        queue = deque([back_edge_source])
+        while queue:
+            current_node = queue.popleft()
+            for pred in pred_targets[pred_offsets[current_node]:pred_offsets[current_node + 1]]:
+                if pred not in body:
+                    body.add(pred)
+                    queue.append(pred)
+        return body
 
     def _check_start_end_events(self):
         errors = []
@@ -406,10 +915,12 @@ class BPMNParser:
     def _check_task_connectivity(self):
 
         errors = []
+        graph = self.flow_graph
         for task_id, task in self.tasks_xml.items():
             task_name = task.get('name', task_id) or task_id
-            incoming_count, outgoing_count = len(self.flows_by_target.get(
-                task_id, [])), len(self.flows_by_source.get(task_id, []))
+            node = graph.index[task_id]
+            incoming_count, outgoing_count = graph.in_degree(
+                node), graph.out_degree(node)
             if incoming_count != 1:
                 errors.append(
                     f"Validation Failed [Rule 2]: Task '{task_name}' ({task_id}) must have one incoming flow, but {incoming_count} were found.")
@@ -420,10 +931,12 @@ class BPMNParser:
 
     def _check_gateway_structure(self):
         errors = []
+        graph = self.flow_graph
         for gw_id, gw in self.gateways_xml.items():
             gw_name = gw.get('name', gw_id)
-            incoming_count, outgoing_count = len(self.flows_by_target.get(
-                gw_id, [])), len(self.flows_by_source.get(gw_id, []))
+            node = graph.index[gw_id]
+            incoming_count, outgoing_count = graph.in_degree(
+                node), graph.out_degree(node)
             is_split, is_join = (incoming_count == 1 and outgoing_count >
                                  1), (incoming_count > 1 and outgoing_count == 1)
             if not is_split and not is_join:
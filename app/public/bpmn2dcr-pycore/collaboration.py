@@ -0,0 +1,122 @@
+"""
+Translation of BPMN documents with several processes (e.g. the pools of a
+collaboration).
+
+Every <bpmn:process> is validated and translated on its own. Processes are
+independent, so large documents are translated in a process pool, one
+process per task. The per-process graphs can then be combined into a single
+DCR graph in which every process is a nesting labelled with its pool name.
+"""
+import os
+import sys
+from dataclasses import dataclass, field
+from functools import partial
+from typing import List, Optional
+
+from bpmn_parser import BPMNParser
+from translation_engine import DCREvent, DCRGraph, DCRNesting, DCRRelation, TranslationEngine
+
+
+# Below this many BPMN elements in total, pickling the parsers to worker
+# processes costs more than translating them in this process.
+PARALLEL_MIN_ELEMENTS = 5000
+
+
+@dataclass
+class ProcessTranslation:
+    process_id: str
+    name: str
+    dcr_graph: Optional[DCRGraph]
+    errors: List[str] = field(default_factory=list)
+
+
+def translate_process(parser: BPMNParser, compact_xor_splits: bool = False) -> ProcessTranslation:
+    """
+    Validates and translates the process of a single parser. The name is the
+    participant (pool) name if the process has one, otherwise its id.
+    """
+    name = parser.participant_name or parser.process_id
+    bpmn_process, errors = parser.parse_and_validate()
+
+    if errors:
+        return ProcessTranslation(parser.process_id, name, None, errors)
+
+    if bpmn_process is None:
+        return ProcessTranslation(parser.process_id, name, None, ["Failed to parse BPMN process"])
+
+    translator = TranslationEngine(bpmn_process, compact_xor_splits=compact_xor_splits)
+    return ProcessTranslation(parser.process_id, name, translator.translate())
+
+
+def translate_processes(parsers: List[BPMNParser], workers: Optional[int] = None,
+                        compact_xor_splits: bool = False) -> List[ProcessTranslation]:
+    """
+    Translates every parser's process, in the order given. With workers=None
+    a process pool is used only when the document is large enough to benefit;
+    workers=1 always translates in this process.
+    """
+    translate = partial(translate_process, compact_xor_splits=compact_xor_splits)
+    if not _use_pool(parsers, workers):
+        return [translate(parser) for parser in parsers]
+
+    # Imported here: Pyodide has no subprocess support.
+    from concurrent.futures import ProcessPoolExecutor
+    max_workers = min(len(parsers), workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(translate, parsers))
+
+
+def _use_pool(parsers: List[BPMNParser], workers: Optional[int]) -> bool:
+    if len(parsers) < 2 or workers == 1 or sys.platform == 'emscripten':
+        return False
+    if workers is None:
+        total_elements = sum(len(parser.elements_xml) for parser in parsers)
+        return total_elements >= PARALLEL_MIN_ELEMENTS and (os.cpu_count() or 1) > 1
+    return True
+
+
+def merge_process_graphs(translations: List[ProcessTranslation]) -> DCRGraph:
+    """
+    Combines the graphs of several processes into one, wrapping every process
+    in a nesting whose id is the process id and whose label is its name.
+
+    BPMN ids are unique across the document, but the auxiliary events and
+    groups generated by the translation are only unique per process; ids
+    already used by an earlier process are prefixed with the process id.
+    """
+    merged = DCRGraph()
+    for translation in translations:
+        graph = translation.dcr_graph
+        if graph is None:
+            continue
+
+        taken = merged.events.keys() | merged.nestings.keys()
+        renamed = {item_id: f"{translation.process_id}_{item_id}"
+                   for item_id in graph.events.keys() | graph.nestings.keys()
+                   if item_id in taken}
+
+        def rename(item_id):
+            return renamed.get(item_id, item_id)
+
+        for event_id, event in graph.events.items():
+            new_id = rename(event_id)
+            merged.events[new_id] = DCREvent(new_id, event.label)
+            merged.labelling_function[new_id] = graph.labelling_function.get(event_id, event.label)
+            if event_id in graph.initial_marking:
+                merged.initial_marking[new_id] = graph.initial_marking[event_id]
+
+        for relation in graph.relations:
+            merged.relations.append(DCRRelation(
+                rename(relation.source_id), rename(relation.target_id), relation.relation_type))
+
+        nested = set()
+        for nesting in graph.nestings.values():
+            nested.update(nesting.member_ids)
+            merged.nestings[rename(nesting.id)] = DCRNesting(
+                rename(nesting.id), nesting.label, [rename(m) for m in nesting.member_ids])
+
+        top_level = [item_id for item_id in list(graph.events) + list(graph.nestings)
+                     if item_id not in nested]
+        merged.nestings[translation.process_id] = DCRNesting(
+            translation.process_id, translation.name, [rename(m) for m in top_level])
+    return merged
@@ -0,0 +1,99 @@
+"""
+Compact, read-only representation of a sequence flow graph.
+
+Node ids are interned to consecutive ints and the successor and predecessor
+lists of all nodes are stored CSR-style in flat `array('i')` buffers, so a
+10k-node model costs a few hundred kilobytes instead of a dict of lists of
+strings per direction, and traversals index lists by int instead of hashing
+string ids.
+"""
+from array import array
+from itertools import accumulate, chain
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+def _to_csr(adjacency: Sequence[Sequence[int]]):
+    offsets = array('i', accumulate(map(len, adjacency), initial=0))
+    targets = array('i', chain.from_iterable(adjacency))
+    return offsets, targets
+
+
+class CompactGraph:
+    """
+    Node `i` is `ids[i]`. Its successors are
+    `succ_targets[succ_offsets[i]:succ_offsets[i + 1]]`, in flow order, and
+    likewise for predecessors. Parallel flows give repeated neighbours.
+    """
+
+    __slots__ = ('ids', 'index', 'succ_offsets', 'succ_targets',
+                 'pred_offsets', 'pred_targets')
+
+    def __init__(self, ids: List[str], successors: Sequence[Sequence[int]],
+                 predecessors: Optional[Sequence[Sequence[int]]] = None):
+        self.ids = ids
+        self.index: Dict[str, int] = {node_id: i for i, node_id in enumerate(ids)}
+        if predecessors is None:
+            predecessors = [[] for _ in ids]
+            for source, targets in enumerate(successors):
+                for target in targets:
+                    predecessors[target].append(source)
+        self.succ_offsets, self.succ_targets = _to_csr(successors)
+        self.pred_offsets, self.pred_targets = _to_csr(predecessors)
+
+    @classmethod
+    def from_adjacency(cls, nodes: Iterable[str],
+                       successors: Iterable[Tuple[str, Iterable[str]]],
+                       predecessors: Iterable[Tuple[str, Iterable[str]]]) -> 'CompactGraph':
+        """
+        Builds the graph from (node, neighbours) pairs in both directions,
+        keeping the neighbour order. `nodes` are interned first, in order,
+        followed by any other node a flow refers to.
+        """
+        index: Dict[str, int] = {}
+        intern = index.setdefault
+        for node_id in nodes:
+            intern(node_id, len(index))
+        succ = [(intern(node_id, len(index)), [intern(n, len(index)) for n in neighbours])
+                for node_id, neighbours in successors]
+        pred = [(intern(node_id, len(index)), [intern(n, len(index)) for n in neighbours])
+                for node_id, neighbours in predecessors]
+
+        ids = list(index)
+        succ_lists: List[Sequence[int]] = [()] * len(ids)
+        pred_lists: List[Sequence[int]] = [()] * len(ids)
+        for node, neighbours in succ:
+            succ_lists[node] = neighbours
+        for node, neighbours in pred:
+            pred_lists[node] = neighbours
+        return cls(ids, succ_lists, pred_lists)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def successors(self, node: int) -> array:
+        return self.succ_targets[self.succ_offsets[node]:self.succ_offsets[node + 1]]
+
+    def predecessors(self, node: int) -> array:
+        return self.pred_targets[self.pred_offsets[node]:self.pred_offsets[node + 1]]
+
+    def out_degree(self, node: int) -> int:
+        return self.succ_offsets[node + 1] - self.succ_offsets[node]
+
+    def in_degree(self, node: int) -> int:
+        return self.pred_offsets[node + 1] - self.pred_offsets[node]
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """All (source, target) pairs, grouped by source in flow order."""
+        offsets, targets = self.succ_offsets, self.succ_targets
+        for source in range(len(self.ids)):
+            for target in targets[offsets[source]:offsets[source + 1]]:
+                yield source, target
+
+    def reversed(self) -> 'CompactGraph':
+        """The same graph with every flow turned around; shares the buffers."""
+        graph = CompactGraph.__new__(CompactGraph)
+        graph.ids = self.ids
+        graph.index = self.index
+        graph.succ_offsets, graph.succ_targets = self.pred_offsets, self.pred_targets
+        graph.pred_offsets, graph.pred_targets = self.succ_offsets, self.succ_targets
+        return graph
@@ -0,0 +1,186 @@
+"""
+Content-addressed cache in front of the BPMN to DCR conversion.
+
+Entries are keyed by a hash of the normalized BPMN document plus the converter
+version (and the compact XOR mode when it is on), and hold either the DCR XML
+or the validation errors of the document, so repeated uploads of the same
+model skip parsing and translation entirely. An in-memory LRU tier can be
+backed by an optional sqlite database shared between runs (and between the
+worker processes of batch.py).
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+from main import CONVERTER_VERSION, convert_bpmn_to_dcr
+from dcr_generator import DCRGenerator
+
+
+_UTF8_BOM = b'\xef\xbb\xbf'
+_INTER_TAG_WHITESPACE = re.compile(rb'>\s+<')
+
+CacheEntry = Tuple[Optional[str], Tuple[str, ...]]
+
+
+def content_key(bpmn_xml_content: Union[str, bytes], compact_xor_splits: bool = False) -> str:
+    """
+    Hashes a BPMN document after normalizing the differences that cannot
+    change the conversion: encoding (str vs UTF-8 bytes), byte order mark,
+    line endings and indentation between tags. Compact XOR conversions get
+    keys of their own; the default keys do not depend on the mode.
+    """
+    if isinstance(bpmn_xml_content, str):
+        bpmn_xml_content = bpmn_xml_content.encode('utf-8')
+    if bpmn_xml_content.startswith(_UTF8_BOM):
+        bpmn_xml_content = bpmn_xml_content[len(_UTF8_BOM):]
+    normalized = _INTER_TAG_WHITESPACE.sub(b'><', bpmn_xml_content.strip())
+
+    digest = hashlib.sha256(normalized)
+    digest.update(b'\0' + CONVERTER_VERSION.encode('ascii'))
+    if compact_xor_splits:
+        digest.update(b'\0compact-xor')
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    LRU cache of conversion results, bounded by entry count and by the total
+    size of the cached XML. If `db_path` is given, results are also stored in
+    a sqlite database, which is consulted on in-memory misses. `workers` is
+    passed on to the conversion of multi-process documents, and
+    `compact_xor_splits` to the translation.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 db_path: Optional[str] = None, workers: Optional[int] = None,
+                 compact_xor_splits: bool = False):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.workers = workers
+        self.compact_xor_splits = compact_xor_splits
+        self.entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._db = self._open_db(db_path) if db_path else None
+
+    def convert(self, bpmn_xml_content: Union[str, bytes]) -> Tuple[Optional[str], List[str]]:
+        """
+        Returns the DCR XML for a document, or None with its validation errors.
+        Documents that fail to parse raise as usual and are not cached.
+        """
+        key = content_key(bpmn_xml_content, self.compact_xor_splits)
+        entry = self._lookup(key)
+        if entry is None:
+            dcr_graph, errors = convert_bpmn_to_dcr(bpmn_xml_content, self.workers,
+                                                    self.compact_xor_splits)
+            xml = DCRGenerator(dcr_graph).to_xml_string() if dcr_graph is not None else None
+            entry = (xml, tuple(errors))
+            self._store(key, entry)
+        xml, errors = entry
+        return xml, list(errors)
+
+    def convert_bpmn_to_dcr_xml(self, bpmn_xml_content: Union[str, bytes]) -> str:
+        """
+        Cached equivalent of main.convert_bpmn_to_dcr_xml, raising the same
+        exception for documents that fail validation.
+        """
+        xml, errors = self.convert(bpmn_xml_content)
+        if xml is None:
+            error_message = "\n".join(errors)
+            raise Exception(f"BPMN validation failed:\n{error_message}")
+        return xml
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM conversions")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT xml, errors FROM conversions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], tuple(json.loads(row[1])))
+                    self._remember(key, entry)
+                    self.stats['disk_hits'] += 1
+                    return entry
+
+            self.stats['misses'] += 1
+            return None
+
+    def _store(self, key: str, entry: CacheEntry):
+        with self._lock:
+            self._remember(key, entry)
+            if self._db is not None:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO conversions (key, xml, errors) VALUES (?, ?, ?)",
+                        (key, entry[0], json.dumps(entry[1])))
+
+    def _remember(self, key: str, entry: CacheEntry):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= self._entry_size(previous)
+        self.entries[key] = entry
+        self.total_bytes += size
+
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= self._entry_size(evicted)
+            self.stats['evictions'] += 1
+
+    @staticmethod
+    def _entry_size(entry: CacheEntry) -> int:
+        xml, errors = entry
+        return (len(xml) if xml else 0) + sum(len(error) for error in errors)
+
+    @staticmethod
+    def _open_db(db_path: str):
+        # Imported here: sqlite3 is optional in some runtimes (e.g. Pyodide).
+        import sqlite3
+        db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS conversions ("
+                   "key TEXT PRIMARY KEY, xml TEXT, errors TEXT NOT NULL)")
+        db.commit()
+        return db
+
+
+_default_cache: Optional[ConversionCache] = None
+
+
+def cached_convert_bpmn_to_dcr_xml(bpmn_xml_content: Union[str, bytes]) -> str:
+    """
+    Drop-in replacement for main.convert_bpmn_to_dcr_xml backed by a shared,
+    in-memory ConversionCache.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ConversionCache()
+    return _default_cache.convert_bpmn_to_dcr_xml(bpmn_xml_content)
@@ -0,0 +1,165 @@
+"""
+Execution semantics for the DCR graphs produced by the translation.
+
+The graph is compiled once: events are numbered and every relation becomes
+a bit in a per-event integer mask, with relations to or from a nesting
+applying to every event inside it (nestings may be nested). A marking is a
+tuple of three ints (executed, included, pending), so executing an event
+is a handful of bitwise operations and markings can be hashed and cached.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from translation_engine import DCRGraph
+
+
+Marking = Tuple[int, int, int]
+
+def mask_bits(mask: int) -> List[int]:
+    """Indices of the set bits of a non-negative mask, in increasing order."""
+    # Scanning the binary string avoids one big-int operation per bit.
+    digits = bin(mask)[:1:-1]
+    bits = []
+    i = digits.find('1')
+    while i >= 0:
+        bits.append(i)
+        i = digits.find('1', i + 1)
+    return bits
+
+
+class DCRExecutor:
+
+    def __init__(self, dcr_graph: DCRGraph):
+        self.event_ids: List[str] = list(dcr_graph.events)
+        self.index: Dict[str, int] = {event_id: i for i, event_id in enumerate(self.event_ids)}
+        self.labels: List[str] = [dcr_graph.labelling_function.get(event_id, event.label)
+                                  for event_id, event in dcr_graph.events.items()]
+
+        n = len(self.event_ids)
+        # conditions_for[e]: events that must be executed (or excluded)
+        # before e; conditions_of[e] is the converse, the other masks are the
+        # events e affects.
+        self.conditions_for = [0] * n
+        self.conditions_of = [0] * n
+        self.responses = [0] * n
+        self.includes = [0] * n
+        self.excludes = [0] * n
+
+        atoms = self._atom_masks(dcr_graph)
+        for relation in dcr_graph.relations:
+            source_mask = atoms.get(relation.source_id, 0)
+            target_mask = atoms.get(relation.target_id, 0)
+            if relation.relation_type == 'condition':
+                for target in mask_bits(target_mask):
+                    self.conditions_for[target] |= source_mask
+                for source in mask_bits(source_mask):
+                    self.conditions_of[source] |= target_mask
+                continue
+            effects = {'response': self.responses, 'include': self.includes,
+                       'exclude': self.excludes}[relation.relation_type]
+            for source in mask_bits(source_mask):
+                effects[source] |= target_mask
+        self.conditioning = 0
+        for event, targets in enumerate(self.conditions_of):
+            if targets:
+                self.conditioning |= 1 << event
+
+        executed = included = pending = 0
+        for event_id, state in dcr_graph.initial_marking.items():
+            i = self.index.get(event_id)
+            if i is None:
+                continue
+            executed |= state[0] << i
+            included |= state[1] << i
+            pending |= state[2] << i
+        self.initial_marking: Marking = (executed, included, pending)
+
+    def _atom_masks(self, dcr_graph: DCRGraph) -> Dict[str, int]:
+        # Mask of the events inside every event or nesting id.
+        masks = {event_id: 1 << i for event_id, i in self.index.items()}
+
+        def nesting_mask(nesting_id: str, visiting: Set[str]) -> int:
+            if nesting_id in masks:
+                return masks[nesting_id]
+            if nesting_id in visiting:
+                return 0
+            visiting.add(nesting_id)
+            mask = 0
+            for member_id in dcr_graph.nestings[nesting_id].member_ids:
+                if member_id in dcr_graph.nestings:
+                    mask |= nesting_mask(member_id, visiting)
+                else:
+                    mask |= masks.get(member_id, 0)
+            masks[nesting_id] = mask
+            return mask
+
+        for nesting_id in dcr_graph.nestings:
+            nesting_mask(nesting_id, set())
+        return masks
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def is_enabled(self, marking: Marking, event: int) -> bool:
+        executed, included, _ = marking
+        return bool(included >> event & 1) and not (
+            self.conditions_for[event] & included & ~executed)
+
+    def enabled_mask(self, marking: Marking) -> int:
+        # Only included, unexecuted events with a condition relation can
+        # block anything. They are few, so the blocked events are collected
+        # from them rather than by checking every included event.
+        executed, included, _ = marking
+        blocked = 0
+        conditions_of = self.conditions_of
+        for event in mask_bits(included & ~executed & self.conditioning):
+            blocked |= conditions_of[event]
+        return included & ~blocked
+
+    def enabled_events(self, marking: Marking) -> List[int]:
+        return list(mask_bits(self.enabled_mask(marking)))
+
+    def execute(self, marking: Marking, event: int) -> Marking:
+        """
+        Returns the marking after executing `event`, which is assumed to be
+        enabled. Includes win over excludes from the same event.
+        """
+        executed, included, pending = marking
+        bit = 1 << event
+        return (executed | bit,
+                (included & ~self.excludes[event]) | self.includes[event],
+                (pending & ~bit) | self.responses[event])
+
+    def successors(self, marking: Marking) -> List[Tuple[int, Marking]]:
+        return [(event, self.execute(marking, event))
+                for event in self.enabled_events(marking)]
+
+    @staticmethod
+    def is_accepting(marking: Marking) -> bool:
+        """No included event is pending."""
+        return not (marking[1] & marking[2])
+
+    def run(self, event_ids: Iterable[str], marking: Optional[Marking] = None) -> Optional[Marking]:
+        """
+        Executes a sequence of event ids from `marking` (the initial marking
+        by default). Returns the resulting marking, or None as soon as an
+        event is unknown or not enabled.
+        """
+        if marking is None:
+            marking = self.initial_marking
+        for event_id in event_ids:
+            event = self.index.get(event_id)
+            if event is None or not self.is_enabled(marking, event):
+                return None
+            marking = self.execute(marking, event)
+        return marking
+
+    def accepts(self, event_ids: Iterable[str]) -> bool:
+        marking = self.run(event_ids)
+        return marking is not None and self.is_accepting(marking)
+
+    def describe(self, marking: Marking) -> Dict[str, List[str]]:
+        """The marking as lists of event ids, for debugging and reports."""
+        executed, included, pending = marking
+        return {name: [self.event_ids[i] for i in mask_bits(mask)]
+                for name, mask in (('executed', executed), ('included', included),
+                                   ('pending', pending))}
@@ -1,116 +1,239 @@
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from typing import Iterable, Iterator, TextIO
+from xml.sax.saxutils import escape
 from translation_engine import DCRGraph
 
+EVENT_WIDTH, EVENT_HEIGHT = 130, 150
+# Space between a nesting's border and the members it encloses.
+NESTING_PADDING = 30
 
-class DCRGenerator:
+# Same escaping as ElementTree applies to attribute values.
+_ATTRIBUTE_ENTITIES = {'"': '&quot;', '\r': '&#13;',
+                       '\n': '&#10;', '\t': '&#09;'}
 
-    def __init__(self, dcr_graph: DCRGraph):
-        self.dcr_graph = dcr_graph
 
-    def to_xml(self, output_file_path: str):
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            f.write(self.to_xml_string())
+def _attrs(attributes: dict) -> str:
+    return ''.join(f' {name}="{escape(value, _ATTRIBUTE_ENTITIES)}"'
+                   for name, value in attributes.items())
 
-    def to_xml_string(self) -> str:
-        dcrgraph_root = ET.Element('dcrgraph')
 
-        specification = self._create_specification()
-        dcrgraph_root.append(specification)
+def _empty(tag: str, attributes: dict = None) -> str:
+    return f"<{tag}{_attrs(attributes or {})} />"
 
-        runtime = self._create_runtime()
-        dcrgraph_root.append(runtime)
 
-        return ET.tostring(dcrgraph_root, encoding='unicode')
+def _container(tag: str, children: Iterable[str]) -> Iterator[str]:
+    opened = False
+    for chunk in children:
+        if not opened:
+            yield f"<{tag}>"
+            opened = True
+        yield chunk
+    yield f"</{tag}>" if opened else _empty(tag)
 
-    def _create_specification(self):
-        specification = ET.Element('specification')
 
-        resources = ET.SubElement(specification, 'resources')
-        events_xml = ET.SubElement(resources, 'events')
-        labels_xml = ET.SubElement(resources, 'labels')
-        label_mappings_xml = ET.SubElement(resources, 'labelMappings')
+class DCRGenerator:
 
-        ET.SubElement(resources, 'subProcesses')
-        ET.SubElement(resources, 'variables')
-        ET.SubElement(resources, 'expressions')
-        variable_accesses = ET.SubElement(resources, 'variableAccesses')
-        ET.SubElement(variable_accesses, 'readAccessess')
-        ET.SubElement(variable_accesses, 'writeAccessess')
+    def __init__(self, dcr_graph: DCRGraph):
+        self.dcr_graph = dcr_graph
 
-        unique_labels = set(self.dcr_graph.labelling_function.values())
-        for label_text in sorted(list(unique_labels)):
-            ET.SubElement(labels_xml, 'label', {'id': label_text})
+    def to_xml(self, output_file_path: str):
+        with open(output_file_path, 'w', encoding='utf-8') as f:
+            self.write_xml(f)
 
-        x_pos, y_pos, x_step, y_step, max_x = 100, 100, 180, 200, 900
-        for event in self.dcr_graph.events.values():
-            event_el = ET.SubElement(events_xml, 'event', {'id': event.id})
-
-            custom = ET.SubElement(event_el, 'custom')
-            ET.SubElement(custom, 'eventData')
-            visualization = ET.SubElement(custom, 'visualization')
-            ET.SubElement(visualization, 'location', {
-                          'xLoc': str(x_pos), 'yLoc': str(y_pos)})
-            ET.SubElement(visualization, 'size', {
-                          'width': "130", 'height': "150"})
-            x_pos += x_step
-            if x_pos > max_x:
-                x_pos = 100
-                y_pos += y_step
-
-            ET.SubElement(label_mappings_xml, 'labelMapping', {
-                          'eventId': event.id, 'labelId': event.label})
-
-        constraints = ET.SubElement(specification, 'constraints')
-        conditions = ET.SubElement(constraints, 'conditions')
-        responses = ET.SubElement(constraints, 'responses')
-        includes = ET.SubElement(constraints, 'includes')
-        excludes = ET.SubElement(constraints, 'excludes')
-
-        ET.SubElement(constraints, 'coresponces')
-        ET.SubElement(constraints, 'milestones')
-        ET.SubElement(constraints, 'updates')
-        ET.SubElement(constraints, 'spawns')
+    def to_xml_string(self) -> str:
+        return ''.join(self.iter_xml_chunks())
+
+    def write_xml(self, stream: TextIO):
+        for chunk in self.iter_xml_chunks():
+            stream.write(chunk)
+
+    def iter_xml_chunks(self) -> Iterator[str]:
+        # Serialises straight from the graph, one element at a time, without
+        # building an intermediate tree. The output matches what
+        # ElementTree.tostring(..., encoding='unicode') gives for the same document.
+        yield "<dcrgraph>"
+        yield from _container('specification', self._iter_specification())
+        yield from _container('runtime', self._iter_runtime())
+        yield "</dcrgraph>"
+
+    def _iter_specification(self):
+        yield from _container('resources', self._iter_resources())
+        yield from _container('constraints', self._iter_constraints())
+
+    def _iter_resources(self):
+        parent_of = {member_id: nesting for nesting in self.dcr_graph.nestings.values()
+                     for member_id in nesting.member_ids}
+        order = self._compute_order()
+        positions, nesting_bounds = self._compute_layout(parent_of, order)
+
+        yield from _container('events', self._iter_events(
+            positions, parent_of, order, nesting_bounds))
 
+        unique_labels = set(self.dcr_graph.labelling_function.values())
+        unique_labels.update(
+            nesting.label for nesting in self.dcr_graph.nestings.values())
+        yield from _container('labels', (_empty('label', {'id': label_text})
+                                         for label_text in sorted(list(unique_labels))))
+
+        yield from _container('labelMappings', self._iter_label_mappings(parent_of))
+
+        yield _empty('subProcesses')
+        yield _empty('variables')
+        yield _empty('expressions')
+        yield from _container('variableAccesses', iter([
+            _empty('readAccessess'), _empty('writeAccessess')]))
+
+    def _compute_order(self):
+        # Nestings may contain other nestings. Every nesting with an event
+        # somewhere inside it is ordered by its first event, so members are
+        # written in event order; empty nestings are left out.
+        nestings = self.dcr_graph.nestings
+        order = {event_id: i for i, event_id in enumerate(self.dcr_graph.events)}
+
+        def first_event(nesting_id, visiting):
+            if nesting_id in order or nesting_id in visiting:
+                return
+            visiting.add(nesting_id)
+            for member_id in nestings[nesting_id].member_ids:
+                if member_id in nestings:
+                    first_event(member_id, visiting)
+            firsts = [order[m] for m in nestings[nesting_id].member_ids if m in order]
+            if firsts:
+                order[nesting_id] = min(firsts)
+
+        for nesting_id in nestings:
+            first_event(nesting_id, set())
+        return order
+
+    def _members(self, nesting, order):
+        return sorted((m for m in nesting.member_ids if m in order), key=order.get)
+
+    def _compute_layout(self, parent_of, order):
+        # Events flow left to right in rows of at most five, in the order
+        # they are written. A nesting starts on a row of its own, lays out
+        # its members the same way NESTING_PADDING inside its border, and
+        # the next item continues below it. Returns the event positions and
+        # the nesting bounds as (x0, y0, x1, y1).
+        positions, bounds = {}, {}
+        x_step, y_gap, max_x = 180, 50, 900
+
+        def place(items, left, top):
+            x_pos, y_pos, row_bottom, right = left, top, top, left
+            for item_id in items:
+                if item_id in self.dcr_graph.nestings:
+                    if x_pos > left:
+                        x_pos, y_pos = left, row_bottom + y_gap
+                    inner_right, inner_bottom = place(
+                        self._members(self.dcr_graph.nestings[item_id], order),
+                        left + NESTING_PADDING, y_pos + NESTING_PADDING)
+                    bounds[item_id] = (left, y_pos, inner_right + NESTING_PADDING,
+                                       inner_bottom + NESTING_PADDING)
+                    right, row_bottom = max(right, bounds[item_id][2]), bounds[item_id][3]
+                    x_pos, y_pos = left, row_bottom + y_gap
+                    continue
+                positions[item_id] = (x_pos, y_pos)
+                right = max(right, x_pos + EVENT_WIDTH)
+                row_bottom = max(row_bottom, y_pos + EVENT_HEIGHT)
+                x_pos += x_step
+                if x_pos > max_x:
+                    x_pos, y_pos = left, row_bottom + y_gap
+            return right, row_bottom
+
+        top_level = {}
+        for event_id in self.dcr_graph.events:
+            ancestors = self._ancestors(event_id, parent_of)
+            top_level.setdefault(ancestors[0].id if ancestors else event_id, None)
+        place(top_level, 100, 100)
+        return positions, bounds
+
+    @staticmethod
+    def _ancestors(member_id, parent_of):
+        """Nestings containing a member, outermost first."""
+        ancestors = []
+        nesting = parent_of.get(member_id)
+        while nesting is not None and nesting not in ancestors:
+            ancestors.append(nesting)
+            nesting = parent_of.get(nesting.id)
+        ancestors.reverse()
+        return ancestors
+
+    def _iter_events(self, positions, parent_of, order, nesting_bounds):
+        written_nestings = set()
+        for event in self.dcr_graph.events.values():
+            ancestors = self._ancestors(event.id, parent_of)
+            if not ancestors:
+                yield self._event_xml(event.id, positions)
+                continue
+            outermost = ancestors[0]
+            if outermost.id in written_nestings:
+                continue
+            written_nestings.add(outermost.id)
+            yield from self._nesting_xml(outermost, positions, order, nesting_bounds)
+
+    def _nesting_xml(self, nesting, positions, order, nesting_bounds):
+        members = self._members(nesting, order)
+        x0, y0, x1, y1 = nesting_bounds[nesting.id]
+        yield f"<event{_attrs({'id': nesting.id, 'type': 'nesting'})}>"
+        yield "<custom><visualization>"
+        yield _empty('location', {'xLoc': str(x0), 'yLoc': str(y0)})
+        yield _empty('size', {'width': str(x1 - x0), 'height': str(y1 - y0)})
+        yield "</visualization></custom>"
+        for member_id in members:
+            if member_id in nesting_bounds:
+                yield from self._nesting_xml(self.dcr_graph.nestings[member_id],
+                                             positions, order, nesting_bounds)
+            else:
+                yield self._event_xml(member_id, positions)
+        yield "</event>"
+
+    def _event_xml(self, event_id, positions):
+        x_pos, y_pos = positions[event_id]
+        return (f"<event{_attrs({'id': event_id})}><custom>{_empty('eventData')}<visualization>"
+                f"{_empty('location', {'xLoc': str(x_pos), 'yLoc': str(y_pos)})}"
+                f"{_empty('size', {'width': str(EVENT_WIDTH), 'height': str(EVENT_HEIGHT)})}"
+                "</visualization></custom></event>")
+
+    def _iter_label_mappings(self, parent_of):
+        written_nestings = set()
+        for event in self.dcr_graph.events.values():
+            for nesting in self._ancestors(event.id, parent_of):
+                if nesting.id not in written_nestings:
+                    written_nestings.add(nesting.id)
+                    yield _empty('labelMapping', {'eventId': nesting.id, 'labelId': nesting.label})
+            yield _empty('labelMapping', {'eventId': event.id, 'labelId': event.label})
+
+    def _iter_constraints(self):
+        containers = [('conditions', 'condition'), ('responses', 'response'),
+                      ('includes', 'include'), ('excludes', 'exclude')]
+        for container_tag, relation_type in containers:
+            yield from _container(container_tag, self._iter_relations(relation_type))
+
+        yield _empty('coresponces')
+        yield _empty('milestones')
+        yield _empty('updates')
+        yield _empty('spawns')
+
+    def _iter_relations(self, relation_type):
+        # Relation ids number all exported relations in graph order, so one
+        # pass per type keeps the ids without holding the relations per type.
+        known_types = {'condition', 'response', 'include', 'exclude'}
         relation_counter = 1
         for rel in self.dcr_graph.relations:
-            rel_attrs = {'sourceId': rel.source_id, 'targetId': rel.target_id}
-
-            relation_map = {
-                'condition': conditions,
-                'response': responses,
-                'exclude': excludes,
-                'include': includes
-            }
-
-            if rel.relation_type in relation_map:
-                parent_xml_element = relation_map[rel.relation_type]
-                rel_el = ET.SubElement(
-                    parent_xml_element, rel.relation_type, rel_attrs)
-
-                custom = ET.SubElement(rel_el, 'custom')
-                ET.SubElement(custom, 'waypoints')
-                ET.SubElement(
-                    custom, 'id', {'id': f'Relation_{relation_counter}'})
-                relation_counter += 1
-
-        return specification
-
-    def _create_runtime(self):
-        runtime = ET.Element('runtime')
-        marking = ET.SubElement(runtime, 'marking')
-
-        executed = ET.SubElement(marking, 'executed')
-        included = ET.SubElement(marking, 'included')
-        pending_responses = ET.SubElement(marking, 'pendingResponses')
-        ET.SubElement(marking, 'globalStore')
-
-        for event_id, (is_executed, is_included, is_pending) in self.dcr_graph.initial_marking.items():
-            if is_executed: 
-                ET.SubElement(executed, 'event', {'id': event_id})
-            if is_included:
-                ET.SubElement(included, 'event', {'id': event_id})
-            if is_pending:
-                ET.SubElement(pending_responses, 'event', {'id': event_id})
-
-        return runtime
+            if rel.relation_type not in known_types:
+                continue
+            if rel.relation_type == relation_type:
+                rel_attrs = {'sourceId': rel.source_id,
+                             'targetId': rel.target_id}
+                yield (f"<{relation_type}{_attrs(rel_attrs)}><custom>{_empty('waypoints')}"
+                       f"{_empty('id', {'id': f'Relation_{relation_counter}'})}"
+                       f"</custom></{relation_type}>")
+            relation_counter += 1
+
+    def _iter_runtime(self):
+        yield from _container('marking', self._iter_marking())
+
+    def _iter_marking(self):
+        marking = self.dcr_graph.initial_marking
+        for tag, index in (('executed', 0), ('included', 1), ('pendingResponses', 2)):
+            yield from _container(tag, (_empty('event', {'id': event_id})
+                                        for event_id, state in marking.items() if state[index]))
+        yield _empty('globalStore')
@@ -0,0 +1,521 @@
+"""
+Incremental re-translation of an edited BPMN model.
+
+IncrementalTranslator keeps the parsed model, the translation state and, for
+every translated unit (a BPMN element, a sequence flow or the OR states of an
+inclusive pair), the DCR events and relations that unit produced. Applying a
+BPMNDiff re-validates and re-pairs the in-memory graph, then retracts and
+re-emits only the units affected by the edit and returns the net change as a
+DCRDelta.
+
+Gateway pairs that survive an edit keep their number and names, and new pairs
+and auxiliary events continue the numbering, so the ids of untouched events
+stay stable while editing. A fresh conversion of the edited model may number
+gateways and auxiliary events differently, but is otherwise the same graph.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from bpmn_parser import BPMNGatewayPair, BPMNObject, BPMNParser, BPMNProcess
+from translation_engine import DCREvent, DCRGraph, DCRNesting, DCRRelation, TranslationEngine
+
+
+Marking = Tuple[bool, bool, bool]
+
+GATEWAY_TAGS = {'Exclusive': 'exclusiveGateway',
+                'Parallel': 'parallelGateway', 'Inclusive': 'inclusiveGateway'}
+EVENT_TAGS = {'StartEvent': 'startEvent', 'EndEvent': 'endEvent'}
+
+
+@dataclass
+class BPMNDiff:
+    """
+    An edit of a BPMN model. Removing a node also removes its sequence flows.
+    New nodes are described by their element type, name and event/gateway type.
+    """
+    added_nodes: List[BPMNObject] = field(default_factory=list)
+    removed_node_ids: List[str] = field(default_factory=list)
+    added_flows: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    removed_flow_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DCRDelta:
+    """
+    Net change of a DCR graph. Consumers apply the removals before the
+    additions; `markings` holds the initial marking of added and updated events.
+    """
+    added_events: List[DCREvent] = field(default_factory=list)
+    updated_events: List[DCREvent] = field(default_factory=list)
+    removed_event_ids: List[str] = field(default_factory=list)
+    markings: Dict[str, Marking] = field(default_factory=dict)
+    added_relations: List[DCRRelation] = field(default_factory=list)
+    removed_relations: List[DCRRelation] = field(default_factory=list)
+    added_nestings: List[DCRNesting] = field(default_factory=list)
+    removed_nesting_ids: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added_events or self.updated_events or self.removed_event_ids
+                    or self.added_relations or self.removed_relations
+                    or self.added_nestings or self.removed_nesting_ids)
+
+    def apply_to(self, dcr_graph: DCRGraph):
+        for event_id in self.removed_event_ids:
+            del dcr_graph.events[event_id]
+            del dcr_graph.initial_marking[event_id]
+            del dcr_graph.labelling_function[event_id]
+        for relation in self.removed_relations:
+            dcr_graph.relations.discard(relation)
+        for nesting_id in self.removed_nesting_ids:
+            del dcr_graph.nestings[nesting_id]
+
+        for event in self.added_events + self.updated_events:
+            dcr_graph.events[event.id] = event
+            dcr_graph.initial_marking[event.id] = self.markings[event.id]
+            dcr_graph.labelling_function[event.id] = event.label
+        dcr_graph.relations.extend(self.added_relations)
+        for nesting in self.added_nestings:
+            dcr_graph.nestings[nesting.id] = nesting
+
+
+@dataclass
+class _UnitOutput:
+    event_ids: List[str]
+    relations: List[DCRRelation]
+    nesting_ids: List[str]
+
+
+class IncrementalTranslator:
+    """
+    Translates a BPMN model once and then keeps the DCR graph up to date as
+    the model is edited. An edit that leaves the model invalid returns the
+    validation errors and keeps the last valid graph; the next valid edit
+    catches up on everything changed since.
+    """
+
+    def __init__(self, parser: BPMNParser, compact_xor_splits: bool = False):
+        self.parser = parser
+        self.dcr_graph = DCRGraph()
+        self.engine = TranslationEngine(
+            BPMNProcess(process_id=parser.process_id), compact_xor_splits)
+        self.engine.dcr_graph = self.dcr_graph
+        self.errors: List[str] = []
+
+        self.units: Dict[Tuple[str, str], _UnitOutput] = {}
+        self.relation_refs: Dict[DCRRelation, int] = {}
+
+        self.pairs: Dict[str, BPMNGatewayPair] = {}
+        self.pair_signatures: Dict[str, tuple] = {}
+        self.pair_names: Dict[str, Tuple[str, str]] = {}
+        self.pair_triggers: Dict[str, List[str]] = {}
+        self.inclusive_anchors: Dict[str, Set[str]] = defaultdict(set)
+        self.next_pair_id = 1
+        self.name_counters: Dict[str, int] = defaultdict(lambda: 1)
+        self.next_loop_number = 1
+
+        # Everything is pending initially, in the order a full translation
+        # visits the elements, so the first graph matches TranslationEngine.
+        self.pending_nodes: Dict[str, None] = dict.fromkeys(
+            [*parser.tasks_xml, *parser.gateways_xml,
+             *(e.get('id') for e in parser.start_events_xml),
+             *(e.get('id') for e in parser.end_events_xml)])
+        self.pending_flows: Dict[str, None] = dict.fromkeys(
+            flow.get('id') for flows in parser.flows_by_source.values() for flow in flows)
+
+        self._event_snapshot: Dict[str, Optional[Tuple[str, Marking]]] = {}
+        self._relation_snapshot: Dict[DCRRelation, bool] = {}
+        self._nesting_snapshot: Dict[str, Optional[Tuple[str, Tuple[str, ...]]]] = {}
+
+        self.errors = self.parser.validate()
+        if not self.errors:
+            self._retranslate()
+
+    @classmethod
+    def from_string(cls, content: Union[str, bytes], compact_xor_splits: bool = False) -> 'IncrementalTranslator':
+        return cls(BPMNParser.from_string(content), compact_xor_splits)
+
+    @property
+    def bpmn_process(self) -> BPMNProcess:
+        return self.engine.bpmn_process
+
+    def apply(self, diff: BPMNDiff) -> DCRDelta:
+        self._apply_to_model(diff)
+        self.errors = self.parser.validate()
+        if self.errors:
+            return DCRDelta(errors=list(self.errors))
+        return self._retranslate()
+
+    # --- Model edits ---
+
+    def _apply_to_model(self, diff: BPMNDiff):
+        parser = self.parser
+        removed_flows = set(diff.removed_flow_ids)
+        removed_nodes = set(diff.removed_node_ids)
+        for flow_id in removed_flows:
+            if not self._is_flow(flow_id):
+                raise ValueError(f"Unknown sequence flow '{flow_id}'")
+        for node_id in removed_nodes:
+            if node_id not in parser.elements_xml or self._is_flow(node_id):
+                raise ValueError(f"Unknown node '{node_id}'")
+        added_ids = set()
+        for element_id in [node.id for node in diff.added_nodes] + list(diff.added_flows):
+            if ((element_id in parser.elements_xml and element_id not in removed_nodes
+                 and element_id not in removed_flows) or element_id in added_ids):
+                raise ValueError(f"Element '{element_id}' already exists")
+            added_ids.add(element_id)
+        added_nodes = {node.id for node in diff.added_nodes}
+        for flow_id, (source_id, target_id) in diff.added_flows.items():
+            for endpoint in (source_id, target_id):
+                exists = endpoint in parser.elements_xml and endpoint not in removed_nodes
+                if endpoint not in added_nodes and (not exists or self._is_flow(endpoint)):
+                    raise ValueError(
+                        f"Sequence flow '{flow_id}' refers to unknown node '{endpoint}'")
+
+        for flow_id in diff.removed_flow_ids:
+            self._remove_flow(flow_id)
+        for node_id in diff.removed_node_ids:
+            attached = parser.flows_by_source.get(node_id, []) + \
+                parser.flows_by_target.get(node_id, [])
+            for flow in attached:
+                self._remove_flow(flow.get('id'))
+            parser.remove_node(node_id)
+            self.pending_nodes[node_id] = None
+        for node in diff.added_nodes:
+            parser.add_node(node.id, self._node_tag(node), node.name)
+            self.pending_nodes[node.id] = None
+        for flow_id, (source_id, target_id) in diff.added_flows.items():
+            parser.add_flow(flow_id, source_id, target_id)
+            self.pending_flows[flow_id] = None
+            self.pending_nodes[source_id] = None
+            self.pending_nodes[target_id] = None
+
+    def _remove_flow(self, flow_id: str):
+        if flow_id not in self.parser.elements_xml:
+            return
+        source_id, target_id = self.parser.remove_flow(flow_id)
+        self.pending_flows[flow_id] = None
+        self.pending_nodes[source_id] = None
+        self.pending_nodes[target_id] = None
+
+    def _is_flow(self, element_id: str) -> bool:
+        elem = self.parser.elements_xml.get(element_id)
+        return elem is not None and elem.tag.endswith('}sequenceFlow')
+
+    def _is_translated_node(self, node_id: str) -> bool:
+        parser = self.parser
+        if node_id in parser.tasks_xml or node_id in parser.gateways_xml:
+            return True
+        elem = parser.elements_xml.get(node_id)
+        return elem is not None and (elem in parser.start_events_xml or elem in parser.end_events_xml)
+
+    def _node_tag(self, node: BPMNObject) -> str:
+        if node.element_type == 'Gateway' and node.gateway_type in GATEWAY_TAGS:
+            return GATEWAY_TAGS[node.gateway_type]
+        if node.element_type == 'Event' and node.event_type in EVENT_TAGS:
+            return EVENT_TAGS[node.event_type]
+        if node.element_type == 'Task':
+            return 'task'
+        raise ValueError(f"Unsupported node '{node.id}' of type {node.element_type}")
+
+    # --- Re-translation ---
+
+    def _retranslate(self) -> DCRDelta:
+        engine = self.engine
+        process = engine.bpmn_process
+        pending_nodes, pending_flows = self.pending_nodes, self.pending_flows
+        self.pending_nodes, self.pending_flows = {}, {}
+
+        new_pairs = self._number_pairs(self.parser.gateway_pairs_data.values())
+        new_signatures = {split_id: self._pair_signature(pair)
+                          for split_id, pair in new_pairs.items()}
+
+        affected_pairs = {split_id for split_id in self.pair_signatures.keys() | new_signatures.keys()
+                          if self.pair_signatures.get(split_id) != new_signatures.get(split_id)}
+        for node_id in pending_nodes:
+            affected_pairs.update(self.inclusive_anchors.get(node_id, ()))
+        affected_pairs = sorted(affected_pairs, key=lambda split_id: (
+            new_pairs[split_id].pair_id if split_id in new_pairs else 0))
+
+        # Elements whose events or relations may change. All flows of the
+        # rewired nodes are re-emitted.
+        rewired = dict(pending_nodes)
+        for split_id in affected_pairs:
+            for pair in (self.pairs.get(split_id), new_pairs.get(split_id)):
+                if pair is not None:
+                    rewired[pair.split_gateway_id] = None
+                    rewired[pair.join_gateway_id] = None
+        objects = dict(rewired)
+        flows = dict(pending_flows)
+        old_triggers = []
+        for node_id in rewired:
+            self._add_adjacent_flows(flows, node_id)
+        for split_id in affected_pairs:
+            for trigger_id in self.pair_triggers.get(split_id, ()):
+                old_triggers.append(trigger_id)
+                self._add_adjacent_flows(flows, trigger_id)
+            for node_id in self._anchors_of(split_id):
+                objects[node_id] = None
+        for event_elem in self.parser.start_events_xml + self.parser.end_events_xml:
+            event_id = event_elem.get('id')
+            current = process.objects.get(event_id)
+            if current and current.system_name != self.parser.element_names.get(event_id):
+                objects[event_id] = None
+
+        # Retract the affected units.
+        for split_id in affected_pairs:
+            self._retract(('pair', split_id))
+        for flow_id in flows:
+            self._retract(('flow', flow_id))
+        for node_id in list(objects) + old_triggers:
+            self._retract(('object', node_id))
+        for node_id in rewired:
+            engine.xor_split_groups.pop(node_id, None)
+
+        # Bring the translated process in line with the edited model.
+        for split_id in affected_pairs:
+            old_pair = self.pairs.pop(split_id, None)
+            if old_pair is not None:
+                self._remove_pair(old_pair)
+        for flow_id in flows:
+            if self._is_flow(flow_id):
+                elem = self.parser.elements_xml[flow_id]
+                engine._set_flow(flow_id, elem.get('sourceRef'), elem.get('targetRef'))
+            elif flow_id in process.sequence_flows:
+                engine._remove_flow(flow_id)
+        for node_id in objects:
+            if self._is_translated_node(node_id):
+                process.objects[node_id] = self.parser.build_object(node_id)
+            else:
+                process.objects.pop(node_id, None)
+
+        new_triggers = []
+        for split_id in affected_pairs:
+            pair = new_pairs.get(split_id)
+            if pair is None:
+                continue
+            self._add_pair(pair, new_signatures[split_id])
+            if pair.gateway_type == 'Inclusive':
+                branch_starts = [trace.start_object_id for trace in pair.inclusive_traces]
+                engine._insert_or_triggers(pair)
+                triggers = [trace.start_object_id for trace, start_id
+                            in zip(pair.inclusive_traces, branch_starts)
+                            if trace.start_object_id != start_id]
+                self.pair_triggers[split_id] = triggers
+                new_triggers.extend(triggers)
+
+        # Emit in the order a full translation would.
+        for node_id in list(objects) + new_triggers:
+            bpmn_obj = process.objects.get(node_id)
+            if bpmn_obj is not None:
+                self._emit(('object', node_id), lambda: engine._map_object(bpmn_obj))
+        for split_id in affected_pairs:
+            pair = self.pairs.get(split_id)
+            if pair is not None and pair.gateway_type == 'Inclusive':
+                self._emit(('pair', split_id),
+                           lambda: engine._prepare_or_join_mappings(pair))
+        for trigger_id in new_triggers:
+            flows.update(dict.fromkeys(process.objects[trigger_id].outgoing_flows))
+        for flow_id in flows:
+            endpoints = process.sequence_flows.get(flow_id)
+            if endpoints is not None:
+                self._emit(('flow', flow_id),
+                           lambda: engine._map_flow(flow_id, *endpoints))
+
+        return self._collect_delta()
+
+    def _add_adjacent_flows(self, flows: Dict[str, None], node_id: str):
+        # Flows of the node both in the translated process and in the model.
+        bpmn_obj = self.engine.bpmn_process.objects.get(node_id)
+        if bpmn_obj is not None:
+            flows.update(dict.fromkeys(bpmn_obj.incoming_flows))
+            flows.update(dict.fromkeys(bpmn_obj.outgoing_flows))
+        for flow in self.parser.flows_by_target.get(node_id, ()):
+            flows[flow.get('id')] = None
+        for flow in self.parser.flows_by_source.get(node_id, ()):
+            flows[flow.get('id')] = None
+
+    def _number_pairs(self, parsed_pairs: Iterable[BPMNGatewayPair]) -> Dict[str, BPMNGatewayPair]:
+        # Pairs with the same split, join, type and loop flag as before keep
+        # their number and names; others are numbered after the existing ones.
+        pairs = {}
+        for pair in sorted(parsed_pairs, key=lambda p: p.pair_id):
+            split_id, join_id = pair.split_gateway_id, pair.join_gateway_id
+            old_pair = self.pairs.get(split_id)
+            if old_pair is not None and self._pair_identity(old_pair) == self._pair_identity(pair):
+                pair.pair_id = old_pair.pair_id
+                split_name, join_name = self.pair_names[split_id]
+                self.parser.element_names[split_id] = split_name
+                self.parser.element_names[join_id] = join_name
+            else:
+                pair.pair_id = self.next_pair_id
+                self.next_pair_id += 1
+                loop_number = None
+                if pair.is_loop:
+                    loop_number = self.next_loop_number
+                    self.next_loop_number += 1
+                self.parser.name_gateway_pair(
+                    split_id, join_id, pair.gateway_type,
+                    self.name_counters[pair.gateway_type], loop_number)
+                self.name_counters[pair.gateway_type] += 1
+            pairs[split_id] = pair
+        return pairs
+
+    def _pair_identity(self, pair: BPMNGatewayPair) -> tuple:
+        return (pair.gateway_type, pair.join_gateway_id, pair.is_loop)
+
+    def _pair_signature(self, pair: BPMNGatewayPair) -> tuple:
+        traces = tuple((trace.trace_id, trace.start_object_id, trace.end_object_id)
+                       for trace in pair.inclusive_traces)
+        return self._pair_identity(pair) + (pair.pair_id, traces)
+
+    def _anchors_of(self, split_id: str) -> List[str]:
+        signature = self.pair_signatures.get(split_id)
+        if not signature or signature[0] != 'Inclusive':
+            return []
+        anchors = [split_id, signature[1]]
+        for _, start_id, end_id in signature[4]:
+            anchors += [start_id, end_id]
+        return anchors
+
+    def _add_pair(self, pair: BPMNGatewayPair, signature: tuple):
+        split_id = pair.split_gateway_id
+        self.pairs[split_id] = pair
+        self.pair_signatures[split_id] = signature
+        self.pair_names[split_id] = (self.parser.element_names[split_id],
+                                     self.parser.element_names[pair.join_gateway_id])
+        for node_id in self._anchors_of(split_id):
+            self.inclusive_anchors[node_id].add(split_id)
+        self.engine.bpmn_process.gateway_pairs[pair.pair_id] = pair
+        self.engine.pairs_by_split[split_id] = pair
+        self.engine.pairs_by_join[pair.join_gateway_id] = pair
+
+    def _remove_pair(self, pair: BPMNGatewayPair):
+        engine, process = self.engine, self.engine.bpmn_process
+        split_id, join_id = pair.split_gateway_id, pair.join_gateway_id
+        for node_id in self._anchors_of(split_id):
+            self.inclusive_anchors[node_id].discard(split_id)
+        del self.pair_signatures[split_id]
+        del self.pair_names[split_id]
+        del process.gateway_pairs[pair.pair_id]
+        del engine.pairs_by_split[split_id]
+        if engine.pairs_by_join.get(join_id) is pair:
+            del engine.pairs_by_join[join_id]
+        engine.xor_split_groups.pop(split_id, None)
+
+        join_obj = process.objects.get(join_id)
+        for flow_id in (join_obj.incoming_flows if join_obj else ()):
+            engine.or_join_flow_map.pop(flow_id, None)
+        for trigger_id in self.pair_triggers.pop(split_id, ()):
+            trigger_obj = process.objects.pop(trigger_id)
+            for flow_id in trigger_obj.outgoing_flows:
+                engine._remove_flow(flow_id)
+
+    # --- Provenance ---
+
+    def _emit(self, key: Tuple[str, str], action: Callable[[], None]):
+        scratch = DCRGraph()
+        self.engine.dcr_graph = scratch
+        try:
+            action()
+        finally:
+            self.engine.dcr_graph = self.dcr_graph
+
+        graph = self.dcr_graph
+        for event_id, event in scratch.events.items():
+            self._snapshot_event(event_id)
+            graph.events[event_id] = event
+            graph.initial_marking[event_id] = scratch.initial_marking[event_id]
+            graph.labelling_function[event_id] = scratch.labelling_function[event_id]
+        for relation in scratch.relations:
+            self._snapshot_relation(relation)
+            self.relation_refs[relation] = self.relation_refs.get(relation, 0) + 1
+            graph.relations.append(relation)
+        for nesting_id, nesting in scratch.nestings.items():
+            self._snapshot_nesting(nesting_id)
+            graph.nestings[nesting_id] = nesting
+
+        self.units[key] = _UnitOutput(list(scratch.events), list(scratch.relations),
+                                      list(scratch.nestings))
+
+    def _retract(self, key: Tuple[str, str]):
+        output = self.units.pop(key, None)
+        if output is None:
+            return
+        graph = self.dcr_graph
+        for event_id in output.event_ids:
+            self._snapshot_event(event_id)
+            del graph.events[event_id]
+            del graph.initial_marking[event_id]
+            del graph.labelling_function[event_id]
+        for relation in output.relations:
+            self._snapshot_relation(relation)
+            self.relation_refs[relation] -= 1
+            if not self.relation_refs[relation]:
+                del self.relation_refs[relation]
+                graph.relations.discard(relation)
+        if output.nesting_ids:
+            # Only flow units create nestings (XOR split choice groups); the
+            # split's next flow rebuilds the group from its current branches.
+            split_id = self.engine.bpmn_process.sequence_flows[key[1]][0]
+            self.engine.xor_split_groups.pop(split_id, None)
+        for nesting_id in output.nesting_ids:
+            self._snapshot_nesting(nesting_id)
+            nesting = graph.nestings.pop(nesting_id)
+            for member_id in nesting.member_ids:
+                self.engine.nesting_of.pop(member_id, None)
+
+    def _snapshot_event(self, event_id: str):
+        if event_id not in self._event_snapshot:
+            event = self.dcr_graph.events.get(event_id)
+            self._event_snapshot[event_id] = None if event is None else (
+                event.label, self.dcr_graph.initial_marking[event_id])
+
+    def _snapshot_relation(self, relation: DCRRelation):
+        if relation not in self._relation_snapshot:
+            self._relation_snapshot[relation] = relation in self.dcr_graph.relations
+
+    def _snapshot_nesting(self, nesting_id: str):
+        if nesting_id not in self._nesting_snapshot:
+            nesting = self.dcr_graph.nestings.get(nesting_id)
+            self._nesting_snapshot[nesting_id] = None if nesting is None else (
+                nesting.label, tuple(nesting.member_ids))
+
+    def _collect_delta(self) -> DCRDelta:
+        graph = self.dcr_graph
+        delta = DCRDelta()
+        for event_id, old in self._event_snapshot.items():
+            event = graph.events.get(event_id)
+            if event is None:
+                if old is not None:
+                    delta.removed_event_ids.append(event_id)
+                continue
+            marking = graph.initial_marking[event_id]
+            if old is None:
+                delta.added_events.append(event)
+            elif old != (event.label, marking):
+                delta.updated_events.append(event)
+            else:
+                continue
+            delta.markings[event_id] = marking
+        for relation, existed in self._relation_snapshot.items():
+            exists = relation in graph.relations
+            if exists and not existed:
+                delta.added_relations.append(relation)
+            elif existed and not exists:
+                delta.removed_relations.append(relation)
+        for nesting_id, old in self._nesting_snapshot.items():
+            nesting = graph.nestings.get(nesting_id)
+            new = None if nesting is None else (nesting.label, tuple(nesting.member_ids))
+            if old == new:
+                continue
+            if old is not None:
+                delta.removed_nesting_ids.append(nesting_id)
+            if nesting is not None:
+                delta.added_nestings.append(nesting)
+
+        self._event_snapshot = {}
+        self._relation_snapshot = {}
+        self._nesting_snapshot = {}
+        return delta
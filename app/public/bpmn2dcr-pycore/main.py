@@ -1,49 +1,61 @@
-import tempfile
-import os
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from collections import defaultdict, deque
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Literal, Set, Tuple
+from typing import List, Optional, TextIO, Tuple
+from bpmn_parser import BPMNParser
+from translation_engine import DCRGraph
+from dcr_generator import DCRGenerator
+from collaboration import merge_process_graphs, translate_processes
 
+# Bump whenever a change alters the DCR produced for the same BPMN input;
+# cached conversions are keyed on it.
+CONVERTER_VERSION = "1.1.2"
 
-def convert_bpmn_to_dcr_xml(bpmn_xml_content: str) -> str:
-    
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.bpmn', delete=False, encoding='utf-8') as temp_bpmn:
-        temp_bpmn.write(bpmn_xml_content)
-        temp_bpmn_path = temp_bpmn.name
-    
-    try:
-        parser = BPMNParser(temp_bpmn_path)
-        bpmn_process, errors = parser.parse_and_validate()
-        
-        if errors:
-            error_message = "\n".join(errors)
-            raise Exception(f"BPMN validation failed:\n{error_message}")
-        
-        if bpmn_process is None:
-            raise Exception("Failed to parse BPMN process")
-        
-        translator = TranslationEngine(bpmn_process)
-        dcr_graph = translator.translate()
-        
-        generator = DCRGenerator(dcr_graph)
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False, encoding='utf-8') as temp_dcr:
-            temp_dcr_path = temp_dcr.name
-        
-        generator.to_xml(temp_dcr_path)
 
-        with open(temp_dcr_path, 'r', encoding='utf-8') as f:
-            dcr_xml_content = f.read()
+def convert_bpmn_to_dcr(bpmn_xml_content, workers: Optional[int] = None,
+                        compact_xor_splits: bool = False) -> Tuple[Optional[DCRGraph], List[str]]:
+    """
+    Parses, validates and translates a BPMN document (str or bytes).
+    Returns the DCR graph, or None together with the validation errors.
+
+    Documents with several processes (collaboration pools) are translated
+    process by process, see collaboration.translate_processes for `workers`,
+    and merged into one graph with a nesting per process.
+
+    With `compact_xor_splits`, XOR splits with three or more branches put
+    the branches in a nesting that each branch excludes, instead of
+    excluding one another pairwise.
+    """
+    parsers = BPMNParser.processes_from_string(bpmn_xml_content)
+    translations = translate_processes(parsers, workers, compact_xor_splits)
+
+    if len(translations) == 1:
+        translation = translations[0]
+        return translation.dcr_graph, translation.errors
+
+    errors = [f"{translation.name}: {error}"
+              for translation in translations for error in translation.errors]
+    if errors:
+        return None, errors
+    return merge_process_graphs(translations), []
+
+
+def convert_bpmn_to_dcr_xml(bpmn_xml_content: str, output: Optional[TextIO] = None,
+                            compact_xor_splits: bool = False) -> Optional[str]:
+    """
+    Converts a BPMN document (str or bytes) to DCR XML entirely in memory.
+    The result is returned as a string, or streamed to `output` if given.
+    """
+    dcr_graph, errors = convert_bpmn_to_dcr(bpmn_xml_content,
+                                            compact_xor_splits=compact_xor_splits)
+
+    if dcr_graph is None:
+        error_message = "\n".join(errors)
+        raise Exception(f"BPMN validation failed:\n{error_message}")
+
+    generator = DCRGenerator(dcr_graph)
 
-        os.unlink(temp_dcr_path)
-        
-        return dcr_xml_content
-        
-    finally:
-        if os.path.exists(temp_bpmn_path):
-            os.unlink(temp_bpmn_path)
+    if output is not None:
+        generator.write_xml(output)
+        return None
+    return generator.to_xml_string()
 
 def get_conversion_info():
     """
@@ -51,7 +63,7 @@ def get_conversion_info():
     """
     return {
         "name": "BPMN2DCR Python Core",
-        "version": "1.0.0",
+        "version": CONVERTER_VERSION,
         "description": "Converts BPMN 2.0 XML to DCR Solution XML format",
         "supported_bpmn_elements": [
             "StartEvent", 
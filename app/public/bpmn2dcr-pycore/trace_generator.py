@@ -0,0 +1,359 @@
+"""
+Synthetic event logs from translated DCR graphs.
+
+Traces are accepting runs of the graph, labelled with the labelling function.
+They are either sampled by random walks that favour events bringing the
+marking closer to acceptance, or enumerated exhaustively up to a length.
+Logs are written to XES in batches of traces, rendered in worker processes
+and streamed to the output in order, so a log never has to fit in memory:
+
+    python trace_generator.py model.bpmn --traces 1000000 --out log.xes --workers 8
+
+With --variants N the log only holds N distinct variants, drawn with Zipf
+frequencies; --noise P perturbs that fraction of the traces.
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+from xml.sax.saxutils import escape
+
+from dcr_executor import DCRExecutor, Marking, mask_bits
+from dcr_generator import _ATTRIBUTE_ENTITIES
+from main import convert_bpmn_to_dcr
+from translation_engine import DCRGraph
+
+
+# Labels of the auxiliary events the translation adds to hold the state of
+# AND and OR joins; they are never executed in a run of the BPMN process.
+AUXILIARY_LABEL = re.compile(r'(AND|OR) State \d+')
+
+DEFAULT_BATCH_SIZE = 1000
+LOG_START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+Trace = Tuple[int, ...]
+
+
+def auxiliary_event_ids(dcr_graph: DCRGraph) -> Set[str]:
+    return {event_id for event_id, event in dcr_graph.events.items()
+            if AUXILIARY_LABEL.fullmatch(dcr_graph.labelling_function.get(event_id, event.label))}
+
+
+@dataclass
+class GeneratorOptions:
+    max_length: int = 100
+    # Probability of ending a walk whenever its marking is accepting.
+    stop_probability: float = 0.3
+    # Weight of an event that lowers the number of pending included events,
+    # relative to 1 for any other enabled event.
+    acceptance_bias: float = 4.0
+    max_attempts: int = 100
+    noise: float = 0.0
+    zipf_exponent: float = 1.0
+    seed: int = 0
+
+
+class TraceSampler:
+    """
+    Samples accepting traces (tuples of event indices of the executor) from
+    the events in `allowed`, by default every event.
+    """
+
+    def __init__(self, executor: DCRExecutor, options: GeneratorOptions,
+                 allowed: Optional[int] = None):
+        self.executor = executor
+        self.options = options
+        self.allowed = (1 << len(executor)) - 1 if allowed is None else allowed
+
+    def walk(self, rng: random.Random) -> Optional[Trace]:
+        """One random walk; None if it deadlocks or runs out of length."""
+        executor, options = self.executor, self.options
+        marking = executor.initial_marking
+        trace = []
+        for _ in range(options.max_length + 1):
+            enabled = mask_bits(executor.enabled_mask(marking) & self.allowed)
+            if executor.is_accepting(marking) and (
+                    not enabled or rng.random() < options.stop_probability):
+                return tuple(trace)
+            if not enabled or len(trace) == options.max_length:
+                return None
+            event, marking = self._choose(marking, enabled, rng)
+            trace.append(event)
+        return None
+
+    def _choose(self, marking: Marking, enabled: List[int],
+                rng: random.Random) -> Tuple[int, Marking]:
+        executor = self.executor
+        open_count = (marking[1] & marking[2]).bit_count()
+        successors = [executor.execute(marking, event) for event in enabled]
+        weights = [self.options.acceptance_bias
+                   if (successor[1] & successor[2]).bit_count() < open_count else 1.0
+                   for successor in successors]
+        choice = rng.choices(range(len(enabled)), weights)[0]
+        return enabled[choice], successors[choice]
+
+    def sample(self, rng: random.Random) -> Trace:
+        for _ in range(self.options.max_attempts):
+            trace = self.walk(rng)
+            if trace is not None:
+                return trace
+        raise ValueError(
+            f"No accepting trace found in {self.options.max_attempts} walks of at most "
+            f"{self.options.max_length} events")
+
+    def distinct(self, count: int, rng: random.Random) -> List[Trace]:
+        """
+        Up to `count` distinct traces, in the order first sampled. Stops early
+        once `max_attempts` samples in a row bring nothing new.
+        """
+        variants = {}
+        misses = 0
+        while len(variants) < count and misses < self.options.max_attempts:
+            trace = self.sample(rng)
+            if trace in variants:
+                misses += 1
+            else:
+                variants[trace] = None
+                misses = 0
+        return list(variants)
+
+    def exhaustive(self) -> Iterator[Trace]:
+        """Every accepting trace of at most `max_length` events, depth first."""
+        executor = self.executor
+        stack = [(executor.initial_marking, ())]
+        while stack:
+            marking, trace = stack.pop()
+            if executor.is_accepting(marking):
+                yield trace
+            if len(trace) == self.options.max_length:
+                continue
+            for event in reversed(mask_bits(executor.enabled_mask(marking) & self.allowed)):
+                stack.append((executor.execute(marking, event), trace + (event,)))
+
+
+class XESWriter:
+    """Writes traces of activity labels as an XES log."""
+
+    def __init__(self, stream: TextIO, name: str = "Synthetic log"):
+        self.stream = stream
+        self.name = name
+
+    def write_header(self):
+        self.stream.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<log xes.version="1.0" xes.features="nested-attributes" xmlns="http://www.xes-standard.org/">\n'
+            '<extension name="Concept" prefix="concept" uri="http://www.xes-standard.org/concept.xesext"/>\n'
+            '<extension name="Time" prefix="time" uri="http://www.xes-standard.org/time.xesext"/>\n'
+            '<global scope="trace"><string key="concept:name" value="__INVALID__"/></global>\n'
+            '<global scope="event"><string key="concept:name" value="__INVALID__"/>'
+            '<date key="time:timestamp" value="1970-01-01T00:00:00.000+00:00"/></global>\n'
+            f'<string key="concept:name" value="{escape(self.name, _ATTRIBUTE_ENTITIES)}"/>\n')
+
+    def write_footer(self):
+        self.stream.write('</log>\n')
+
+
+def render_traces(traces: Sequence[Sequence[str]], first_index: int) -> str:
+    """
+    XES <trace> elements for the given label sequences, named by their index
+    in the log. Trace i starts i minutes after LOG_START, one second per event.
+    """
+    event_openers: Dict[str, str] = {}
+    parts = []
+    for offset, labels in enumerate(traces):
+        index = first_index + offset
+        parts.append(f'<trace><string key="concept:name" value="{index}"/>')
+        start = LOG_START + datetime.timedelta(minutes=index)
+        for position, label in enumerate(labels):
+            opener = event_openers.get(label)
+            if opener is None:
+                opener = event_openers[label] = (
+                    f'<event><string key="concept:name" value="{escape(label, _ATTRIBUTE_ENTITIES)}"/>')
+            timestamp = (start + datetime.timedelta(seconds=position)).strftime('%Y-%m-%dT%H:%M:%S')
+            parts.append(f'{opener}<date key="time:timestamp" value="{timestamp}.000+00:00"/></event>')
+        parts.append('</trace>\n')
+    return ''.join(parts)
+
+
+def add_noise(labels: List[str], alphabet: Sequence[str], rng: random.Random) -> List[str]:
+    """Drops, swaps (with its successor) or inserts one event at random."""
+    labels = list(labels)
+    operation = rng.randrange(3)
+    if operation == 0 and labels:
+        del labels[rng.randrange(len(labels))]
+    elif operation == 1 and len(labels) > 1:
+        i = rng.randrange(len(labels) - 1)
+        labels[i], labels[i + 1] = labels[i + 1], labels[i]
+    else:
+        labels.insert(rng.randrange(len(labels) + 1), rng.choice(alphabet))
+    return labels
+
+
+class _Batch:
+    # Per-process state of the workers rendering batches of a log.
+
+    def __init__(self, dcr_graph: DCRGraph, options: GeneratorOptions,
+                 variants: Optional[List[Trace]]):
+        self.executor = DCRExecutor(dcr_graph)
+        self.options = options
+        hidden = auxiliary_event_ids(dcr_graph)
+        allowed = 0
+        for event_id, event in self.executor.index.items():
+            if event_id not in hidden:
+                allowed |= 1 << event
+        self.sampler = TraceSampler(self.executor, options, allowed)
+        self.alphabet = sorted({self.executor.labels[event] for event in mask_bits(allowed)})
+        self.variants = variants
+        if variants:
+            self.cumulative_weights = []
+            total = 0.0
+            for rank in range(1, len(variants) + 1):
+                total += rank ** -options.zipf_exponent
+                self.cumulative_weights.append(total)
+
+    def render(self, first_index: int, count: int) -> str:
+        # Seeded by the batch, so a log does not depend on the worker count.
+        rng = random.Random(f"{self.options.seed}:{first_index}")
+        labels = self.executor.labels
+        traces = []
+        for _ in range(count):
+            if self.variants:
+                trace = rng.choices(self.variants, cum_weights=self.cumulative_weights)[0]
+            else:
+                trace = self.sampler.sample(rng)
+            trace_labels = [labels[event] for event in trace]
+            if self.options.noise and rng.random() < self.options.noise:
+                trace_labels = add_noise(trace_labels, self.alphabet, rng)
+            traces.append(trace_labels)
+        return render_traces(traces, first_index)
+
+
+_worker_batch: Optional[_Batch] = None
+
+
+def _init_worker(dcr_graph: DCRGraph, options: GeneratorOptions,
+                 variants: Optional[List[Trace]]):
+    global _worker_batch
+    _worker_batch = _Batch(dcr_graph, options, variants)
+
+
+def _render_batch(job: Tuple[int, int]) -> str:
+    return _worker_batch.render(*job)
+
+
+def write_log(dcr_graph: DCRGraph, stream: TextIO, traces: int,
+              options: Optional[GeneratorOptions] = None, variants: Optional[int] = None,
+              workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+              name: str = "Synthetic log") -> int:
+    """
+    Writes `traces` sampled traces of the graph as XES. With `variants`, a
+    pool of that many distinct traces is sampled first and the log is drawn
+    from it. Batches are rendered in `workers` processes (in this one when
+    workers=1), at most two per worker in flight. Returns the number of
+    distinct variants in the pool, or 0 without one.
+    """
+    options = options or GeneratorOptions()
+    pool = None
+    if variants:
+        setup = _Batch(dcr_graph, options, None)
+        pool = setup.sampler.distinct(variants, random.Random(options.seed))
+
+    writer = XESWriter(stream, name)
+    writer.write_header()
+    jobs = [(start, min(batch_size, traces - start)) for start in range(0, traces, batch_size)]
+    if workers == 1:
+        batch = _Batch(dcr_graph, options, pool)
+        for job in jobs:
+            stream.write(batch.render(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(dcr_graph, options, pool)) as executor:
+            window = 2 * (workers or os.cpu_count() or 1)
+            pending = [executor.submit(_render_batch, job) for job in jobs[:window]]
+            next_job = len(pending)
+            while pending:
+                stream.write(pending.pop(0).result())
+                if next_job < len(jobs):
+                    pending.append(executor.submit(_render_batch, jobs[next_job]))
+                    next_job += 1
+    writer.write_footer()
+    return len(pool) if pool is not None else 0
+
+
+def write_exhaustive_log(dcr_graph: DCRGraph, stream: TextIO,
+                         options: Optional[GeneratorOptions] = None,
+                         batch_size: int = DEFAULT_BATCH_SIZE,
+                         name: str = "Synthetic log") -> int:
+    """
+    Writes every accepting trace of at most `options.max_length` events, once
+    each. Returns the number of traces written.
+    """
+    options = options or GeneratorOptions()
+    batch = _Batch(dcr_graph, options, None)
+    labels = batch.executor.labels
+    writer = XESWriter(stream, name)
+    writer.write_header()
+    written = 0
+    pending: List[List[str]] = []
+    for trace in batch.sampler.exhaustive():
+        pending.append([labels[event] for event in trace])
+        if len(pending) == batch_size:
+            stream.write(render_traces(pending, written))
+            written += len(pending)
+            pending = []
+    stream.write(render_traces(pending, written))
+    written += len(pending)
+    writer.write_footer()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic XES log from the DCR translation of a BPMN model.")
+    parser.add_argument("model", help="BPMN file to translate")
+    parser.add_argument("--out", required=True, help="XES file to write")
+    parser.add_argument(
+        "--traces", type=int, default=1000, help="Number of traces to sample (default: 1000)")
+    parser.add_argument(
+        "--exhaustive", action="store_true",
+        help="Write every accepting trace up to --max-length instead of sampling")
+    parser.add_argument(
+        "--variants", type=int, help="Draw the log from this many distinct variants")
+    parser.add_argument(
+        "--noise", type=float, default=0.0,
+        help="Fraction of traces with one event dropped, swapped or inserted (default: 0)")
+    parser.add_argument(
+        "--max-length", type=int, default=100, help="Maximum trace length (default: 100)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Traces rendered per batch (default: {DEFAULT_BATCH_SIZE})")
+    args = parser.parse_args(argv)
+
+    with open(args.model, 'rb') as f:
+        dcr_graph, errors = convert_bpmn_to_dcr(f.read())
+    if dcr_graph is None:
+        print("\n".join(errors))
+        return 1
+
+    options = GeneratorOptions(max_length=args.max_length, noise=args.noise, seed=args.seed)
+    with open(args.out, 'w', encoding='utf-8') as out:
+        if args.exhaustive:
+            written = write_exhaustive_log(dcr_graph, out, options, args.batch_size)
+            print(f"Wrote {written} traces")
+        else:
+            pool = write_log(dcr_graph, out, args.traces, options, args.variants,
+                             args.workers, args.batch_size)
+            print(f"Wrote {args.traces} traces" + (f" from {pool} variants" if args.variants else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,110 +1,225 @@
 
 
+from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import List, Dict, Literal, Tuple
-from bpmn_parser import BPMNProcess, BPMNObject
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from bpmn_parser import BPMNGatewayPair, BPMNProcess, BPMNObject
 
 
-@dataclass
+@dataclass(slots=True)
 class DCREvent:
     id: str
     label: str
 
 
-@dataclass(frozen=True)
+@dataclass
+class DCRNesting:
+    id: str
+    label: str
+    member_ids: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True, slots=True)
 class DCRRelation:
     source_id: str
     target_id: str
     relation_type: Literal['condition', 'response', 'include', 'exclude']
 
 
+class DCRRelationStore:
+    """Insertion-ordered set of relations, indexed by type, source and target.
+
+    Appending a relation that is already present is a no-op, so iteration
+    order (and therefore the generated XML) is stable across runs.
+    """
+
+    def __init__(self, relations: Iterable[DCRRelation] = ()):
+        self._relations: Dict[DCRRelation, None] = {}
+        self._by_type: Dict[str, Dict[DCRRelation, None]] = defaultdict(dict)
+        self._by_source: Dict[str, Dict[DCRRelation, None]] = defaultdict(dict)
+        self._by_target: Dict[str, Dict[DCRRelation, None]] = defaultdict(dict)
+        self.extend(relations)
+
+    def append(self, relation: DCRRelation) -> bool:
+        if relation in self._relations:
+            return False
+        self._relations[relation] = None
+        self._by_type[relation.relation_type][relation] = None
+        self._by_source[relation.source_id][relation] = None
+        self._by_target[relation.target_id][relation] = None
+        return True
+
+    def extend(self, relations: Iterable[DCRRelation]):
+        for relation in relations:
+            self.append(relation)
+
+    def discard(self, relation: DCRRelation) -> bool:
+        if relation not in self._relations:
+            return False
+        del self._relations[relation]
+        del self._by_type[relation.relation_type][relation]
+        del self._by_source[relation.source_id][relation]
+        del self._by_target[relation.target_id][relation]
+        return True
+
+    def has(self, source_id: str, target_id: str, relation_type: str) -> bool:
+        return DCRRelation(source_id, target_id, relation_type) in self._relations
+
+    def of_type(self, relation_type: str) -> List[DCRRelation]:
+        return list(self._by_type.get(relation_type, ()))
+
+    def from_source(self, source_id: str) -> List[DCRRelation]:
+        return list(self._by_source.get(source_id, ()))
+
+    def to_target(self, target_id: str) -> List[DCRRelation]:
+        return list(self._by_target.get(target_id, ()))
+
+    def __contains__(self, relation) -> bool:
+        return relation in self._relations
+
+    def __iter__(self) -> Iterator[DCRRelation]:
+        return iter(self._relations)
+
+    def __len__(self) -> int:
+        return len(self._relations)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, DCRRelationStore):
+            return list(self._relations) == list(other._relations)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"DCRRelationStore({list(self._relations)!r})"
+
+
 @dataclass
 class DCRGraph:
     events: Dict[str, DCREvent] = field(default_factory=dict)
-    relations: List[DCRRelation] = field(default_factory=list)
+    relations: DCRRelationStore = field(default_factory=DCRRelationStore)
     initial_marking: Dict[str, Tuple[bool, bool, bool]
                           ] = field(default_factory=dict)
     labelling_function: Dict[str, str] = field(default_factory=dict)
+    nestings: Dict[str, DCRNesting] = field(default_factory=dict)
 
 
 class TranslationEngine:
 
-    def __init__(self, bpmn_process: BPMNProcess):
+    # Below this many branches the pairwise exclusions are no larger than a
+    # shared exclusion group, so compact mode leaves such splits alone.
+    COMPACT_XOR_MIN_BRANCHES = 3
+
+    def __init__(self, bpmn_process: BPMNProcess, compact_xor_splits: bool = False):
         self.bpmn_process = bpmn_process
         self.dcr_graph = DCRGraph()
         self.auxiliary_event_counters = {"AND": 0, "OR": 0}
         self.or_join_flow_map: Dict[str, Tuple[str, str]] = {}
+        self.compact_xor_splits = compact_xor_splits
+        self.xor_split_groups: Dict[str, Optional[str]] = {}
+        self.nesting_of: Dict[str, str] = {}
+        self.trigger_counter = 1
+
+        self.pairs_by_split = {}
+        self.pairs_by_join = {}
+        for pair in self.bpmn_process.gateway_pairs.values():
+            self.pairs_by_split.setdefault(pair.split_gateway_id, pair)
+            self.pairs_by_join.setdefault(pair.join_gateway_id, pair)
+        self.flows_by_endpoints: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        for flow_id, endpoints in self.bpmn_process.sequence_flows.items():
+            self.flows_by_endpoints[endpoints].append(flow_id)
 
     def translate(self) -> DCRGraph:
         self._preprocess_bpmn_model()
         self._perform_object_mapping()
         self._prepare_dcr_mappings()
         self._perform_relation_mapping()
-        self.dcr_graph.relations = list(set(self.dcr_graph.relations))
         return self.dcr_graph
 
     def _preprocess_bpmn_model(self):
         inclusive_pairs = [p for p in self.bpmn_process.gateway_pairs.values(
         ) if p.gateway_type == 'Inclusive']
-        trigger_counter = 1
 
         for pair in inclusive_pairs:
-            for trace in pair.inclusive_traces:
-                start_obj = self.bpmn_process.objects.get(
-                    trace.start_object_id)
-                if start_obj and trace.start_object_id == trace.end_object_id and start_obj.element_type == 'Task':
-                    task_obj = start_obj
-
-                    trigger_id = f"or_{pair.pair_id}_trigger_{trigger_counter}"
-                    trigger_name = f"OR {pair.pair_id} Trigger {trigger_counter}"
-                    trigger_obj = BPMNObject(
-                        id=trigger_id, element_type='Task', name=trigger_name, system_name=trigger_name)
-                    self.bpmn_process.objects[trigger_id] = trigger_obj
-                    trigger_counter += 1
-
-                    flow_to_task_id = next((fid for fid, (s, t) in self.bpmn_process.sequence_flows.items(
-                    ) if s == pair.split_gateway_id and t == task_obj.id), None)
-                    if flow_to_task_id:
-                        self.bpmn_process.sequence_flows[flow_to_task_id] = (
-                            pair.split_gateway_id, trigger_id)
-                        trigger_obj.incoming_flows.append(flow_to_task_id)
-
-                    new_flow_id = f"flow_{trigger_id}_{task_obj.id}"
-                    self.bpmn_process.sequence_flows[new_flow_id] = (
-                        trigger_id, task_obj.id)
-
-                    if flow_to_task_id in task_obj.incoming_flows:
-                        task_obj.incoming_flows.remove(flow_to_task_id)
-                    task_obj.incoming_flows.append(new_flow_id)
-                    trigger_obj.outgoing_flows.append(new_flow_id)
-
-                    trace.start_object_id = trigger_id
+            self._insert_or_triggers(pair)
+
+    def _insert_or_triggers(self, pair: BPMNGatewayPair):
+        # Single-task branches get a trigger task in front, so the branch's
+        # OR state can be included by something other than the task itself.
+        for trace in pair.inclusive_traces:
+            start_obj = self.bpmn_process.objects.get(
+                trace.start_object_id)
+            if start_obj and trace.start_object_id == trace.end_object_id and start_obj.element_type == 'Task':
+                task_obj = start_obj
+
+                trigger_id = f"or_{pair.pair_id}_trigger_{self.trigger_counter}"
+                trigger_name = f"OR {pair.pair_id} Trigger {self.trigger_counter}"
+                trigger_obj = BPMNObject(
+                    id=trigger_id, element_type='Task', name=trigger_name, system_name=trigger_name)
+                self.bpmn_process.objects[trigger_id] = trigger_obj
+                self.trigger_counter += 1
+
+                flow_to_task_id = self._find_flow(
+                    pair.split_gateway_id, task_obj.id)
+                if flow_to_task_id:
+                    self._set_flow(flow_to_task_id,
+                                   pair.split_gateway_id, trigger_id)
+                    trigger_obj.incoming_flows.append(flow_to_task_id)
+
+                new_flow_id = f"flow_{trigger_id}_{task_obj.id}"
+                self._set_flow(new_flow_id, trigger_id, task_obj.id)
+
+                if flow_to_task_id in task_obj.incoming_flows:
+                    task_obj.incoming_flows.remove(flow_to_task_id)
+                task_obj.incoming_flows.append(new_flow_id)
+                trigger_obj.outgoing_flows.append(new_flow_id)
+
+                trace.start_object_id = trigger_id
+
+    def _find_flow(self, source_id: str, target_id: str):
+        flow_ids = self.flows_by_endpoints.get((source_id, target_id))
+        return flow_ids[0] if flow_ids else None
+
+    def _set_flow(self, flow_id: str, source_id: str, target_id: str):
+        previous = self.bpmn_process.sequence_flows.get(flow_id)
+        if previous is not None:
+            self.flows_by_endpoints[previous].remove(flow_id)
+        self.bpmn_process.sequence_flows[flow_id] = (source_id, target_id)
+        self.flows_by_endpoints[(source_id, target_id)].append(flow_id)
+
+    def _remove_flow(self, flow_id: str):
+        endpoints = self.bpmn_process.sequence_flows.pop(flow_id)
+        self.flows_by_endpoints[endpoints].remove(flow_id)
 
     def _perform_object_mapping(self):
         for bpmn_obj in self.bpmn_process.objects.values():
-            event_id, label = bpmn_obj.id, bpmn_obj.system_name
-            initial_marking = (False, True, True) if bpmn_obj.event_type == 'StartEvent' else (
-                False, False, False)
+            self._map_object(bpmn_obj)
 
-            self.dcr_graph.events[event_id] = DCREvent(
-                id=event_id, label=label)
-            self.dcr_graph.initial_marking[event_id] = initial_marking
-            self.dcr_graph.labelling_function[event_id] = label
-            self.dcr_graph.relations.append(
-                DCRRelation(event_id, event_id, 'exclude'))
+    def _map_object(self, bpmn_obj: BPMNObject):
+        event_id, label = bpmn_obj.id, bpmn_obj.system_name
+        initial_marking = (False, True, True) if bpmn_obj.event_type == 'StartEvent' else (
+            False, False, False)
+
+        self.dcr_graph.events[event_id] = DCREvent(
+            id=event_id, label=label)
+        self.dcr_graph.initial_marking[event_id] = initial_marking
+        self.dcr_graph.labelling_function[event_id] = label
+        self.dcr_graph.relations.append(
+            DCRRelation(event_id, event_id, 'exclude'))
 
     def _prepare_dcr_mappings(self):
         inclusive_pairs = [p for p in self.bpmn_process.gateway_pairs.values(
         ) if p.gateway_type == 'Inclusive']
         for pair in inclusive_pairs:
-            for trace in pair.inclusive_traces:
-                flow_into_join_id = next((fid for fid, (s, t) in self.bpmn_process.sequence_flows.items()
-                                          if s == trace.end_object_id and t == pair.join_gateway_id), None)
-                if flow_into_join_id:
-                    aux_event_id = self._create_auxiliary_event(
-                        "OR", trace.trace_id)
-                    self.or_join_flow_map[flow_into_join_id] = (
-                        aux_event_id, trace.start_object_id)
+            self._prepare_or_join_mappings(pair)
+
+    def _prepare_or_join_mappings(self, pair: BPMNGatewayPair):
+        for trace in pair.inclusive_traces:
+            flow_into_join_id = self._find_flow(
+                trace.end_object_id, pair.join_gateway_id)
+            if flow_into_join_id:
+                aux_event_id = self._create_auxiliary_event(
+                    "OR", trace.trace_id)
+                self.or_join_flow_map[flow_into_join_id] = (
+                    aux_event_id, trace.start_object_id)
 
     def _create_auxiliary_event(self, event_type: Literal["AND", "OR"], unique_ref) -> str:
         self.auxiliary_event_counters[event_type] += 1
@@ -125,39 +240,37 @@ class TranslationEngine:
         return event_id
 
     def _perform_relation_mapping(self):
-        split_ids = {
-            p.split_gateway_id for p in self.bpmn_process.gateway_pairs.values()}
-        join_ids = {
-            p.join_gateway_id for p in self.bpmn_process.gateway_pairs.values()}
-
         for flow_id, (source_id, target_id) in self.bpmn_process.sequence_flows.items():
-            source_obj = self.bpmn_process.objects.get(source_id)
-            target_obj = self.bpmn_process.objects.get(target_id)
-            if not source_obj or not target_obj:
-                continue
-
-            handled = False
-
-            if source_id in split_ids:
-                handled = True
-                if source_obj.gateway_type == 'Exclusive':
-                    self._map_xor_split_relation(source_id, target_id)
-                elif source_obj.gateway_type == 'Parallel':
-                    self._map_and_split_relation(source_id, target_id)
-                elif source_obj.gateway_type == 'Inclusive':
-                    self._map_or_split_relation(source_id, target_id)
-
-            if target_id in join_ids:
-                handled = True
-                if target_obj.gateway_type == 'Exclusive':
-                    self._map_xor_join_relation(source_id, target_id)
-                elif target_obj.gateway_type == 'Parallel':
-                    self._map_and_join_relation(source_id, target_id)
-                elif target_obj.gateway_type == 'Inclusive':
-                    self._map_or_join_relation(source_id, target_id, flow_id)
-
-            if not handled:
-                self._map_basic_relation(source_id, target_id)
+            self._map_flow(flow_id, source_id, target_id)
+
+    def _map_flow(self, flow_id: str, source_id: str, target_id: str):
+        source_obj = self.bpmn_process.objects.get(source_id)
+        target_obj = self.bpmn_process.objects.get(target_id)
+        if not source_obj or not target_obj:
+            return
+
+        handled = False
+
+        if source_id in self.pairs_by_split:
+            handled = True
+            if source_obj.gateway_type == 'Exclusive':
+                self._map_xor_split_relation(source_id, target_id)
+            elif source_obj.gateway_type == 'Parallel':
+                self._map_and_split_relation(source_id, target_id)
+            elif source_obj.gateway_type == 'Inclusive':
+                self._map_or_split_relation(source_id, target_id)
+
+        if target_id in self.pairs_by_join:
+            handled = True
+            if target_obj.gateway_type == 'Exclusive':
+                self._map_xor_join_relation(source_id, target_id)
+            elif target_obj.gateway_type == 'Parallel':
+                self._map_and_join_relation(source_id, target_id)
+            elif target_obj.gateway_type == 'Inclusive':
+                self._map_or_join_relation(source_id, target_id, flow_id)
+
+        if not handled:
+            self._map_basic_relation(source_id, target_id)
 
     def _map_basic_relation(self, source_id: str, target_id: str):
         self.dcr_graph.relations.append(
@@ -170,6 +283,13 @@ class TranslationEngine:
         self._map_basic_relation(source_id, target_id)
         all_targets = [self.bpmn_process.sequence_flows[fid][1]
                        for fid in source_obj.outgoing_flows]
+        group_id = self._get_xor_split_group(source_id, all_targets)
+        if group_id:
+            # Excluding the group excludes every branch, including the one just
+            # taken, which already excludes itself.
+            self.dcr_graph.relations.append(
+                DCRRelation(target_id, group_id, 'exclude'))
+            return
         for sibling_id in all_targets:
             if target_id != sibling_id:
                 self.dcr_graph.relations.append(
@@ -177,13 +297,31 @@ class TranslationEngine:
                 self.dcr_graph.relations.append(
                     DCRRelation(sibling_id, target_id, 'exclude'))
 
+    def _get_xor_split_group(self, split_id: str, targets: List[str]) -> Optional[str]:
+        if not self.compact_xor_splits:
+            return None
+        if split_id in self.xor_split_groups:
+            return self.xor_split_groups[split_id]
+
+        members = list(dict.fromkeys(targets))
+        group_id = None
+        if (len(members) >= self.COMPACT_XOR_MIN_BRANCHES
+                and not any(m in self.nesting_of for m in members)):
+            pair = self.pairs_by_split[split_id]
+            group_id = f"xor_{pair.pair_id}_choice"
+            self.dcr_graph.nestings[group_id] = DCRNesting(
+                id=group_id, label=f"XOR {pair.pair_id} Choice", member_ids=members)
+            for member_id in members:
+                self.nesting_of[member_id] = group_id
+        self.xor_split_groups[split_id] = group_id
+        return group_id
+
     def _map_xor_join_relation(self, source_id: str, target_id: str):
         self._map_basic_relation(source_id, target_id)
 
     def _map_and_split_relation(self, source_id: str, target_id: str):
         self._map_basic_relation(source_id, target_id)
-        pair = next(p for p in self.bpmn_process.gateway_pairs.values(
-        ) if p.split_gateway_id == source_id)
+        pair = self.pairs_by_split[source_id]
         self.dcr_graph.relations.append(DCRRelation(
             source_id, pair.join_gateway_id, 'response'))
 
@@ -195,15 +333,13 @@ class TranslationEngine:
             DCRRelation(aux_id, target_id, 'condition'))
         self.dcr_graph.relations.append(
             DCRRelation(source_id, target_id, 'include'))
-        pair = next((p for p in self.bpmn_process.gateway_pairs.values()
-                     if p.join_gateway_id == target_id), None)
+        pair = self.pairs_by_join.get(target_id)
         if pair:
             self.dcr_graph.relations.append(
                 DCRRelation(pair.split_gateway_id, aux_id, 'include'))
 
     def _map_or_split_relation(self, source_id: str, target_id: str):
-        pair = next(p for p in self.bpmn_process.gateway_pairs.values(
-        ) if p.split_gateway_id == source_id)
+        pair = self.pairs_by_split[source_id]
         self._map_basic_relation(source_id, target_id)
         self.dcr_graph.relations.append(DCRRelation(
             source_id, pair.join_gateway_id, 'response'))
@@ -0,0 +1,564 @@
+"""
+Bounded check that a translated DCR graph behaves like its BPMN process.
+
+Tasks, start and end events are the observable steps of both models (a DCR
+event is observable when its id is the id of such a BPMN element). Gateways
+and the OR triggers added by the translation are silent; the auxiliary
+"State" events only hold the conditions of joins and are never executed.
+The two models are equivalent up to length k when they accept the same
+sequences of observable steps of length at most k, and every such sequence
+can be completed in one exactly when it can in the other (all tokens
+consumed, resp. an accepting DCR marking).
+
+Both models are explored side by side in breadth-first order. A node of the
+search is the pair of sets of states each model can be in after the same
+observable prefix, so the first difference found is a shortest diverging
+trace. Pairs are hashed and explored once: the interleavings of parallel
+branches meet again in the same pair, which keeps the search polynomial in
+the trace length for a fixed number of branches.
+
+Silent BPMN steps are partially ordered: a gateway is the only consumer of
+the tokens on its incoming flows, so firing it early never disables another
+step and the order in which enabled gateways fire does not matter. The token
+game therefore fires gateways eagerly, one fixed interleaving, and only
+branches on the choices of exclusive and inclusive splits. Inclusive joins
+use the gateway pairs of the process: a join fires once no token is left
+inside the region between it and its split.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from bpmn_parser import BPMNParser, BPMNProcess
+from dcr_executor import DCRExecutor, Marking, mask_bits
+from translation_engine import TranslationEngine
+
+
+DEFAULT_MAX_LENGTH = 12
+DEFAULT_MAX_STATES = 200_000
+
+Tokens = Tuple[int, ...]
+
+_STEP, _XOR_SPLIT, _XOR_JOIN, _AND, _OR_SPLIT, _OR_JOIN = range(6)
+
+
+@dataclass
+class VerificationResult:
+    equivalent: bool
+    # False when the state budget ran out before every trace up to
+    # max_length was checked; `equivalent` then only covers shorter traces.
+    complete: bool
+    max_length: int
+    states: int = 0
+    # The diverging trace as BPMN element ids, and what went wrong after it.
+    trace: List[str] = field(default_factory=list)
+    message: str = ""
+
+
+class TokenGame:
+    """
+    Token-game semantics of a BPMN process. A state is a tuple with the
+    number of tokens on every sequence flow, plus one extra flow into the
+    start event that holds the initial token.
+
+    Build it before translating the process: the translation adds its OR
+    trigger tasks to the same BPMNProcess.
+    """
+
+    def __init__(self, bpmn_process: BPMNProcess):
+        objects = bpmn_process.objects
+        flow_ids = list(bpmn_process.sequence_flows)
+        flow_index = {flow_id: i for i, flow_id in enumerate(flow_ids)}
+        start_flow = len(flow_ids)
+
+        self.node_ids: List[str] = list(objects)
+        self.names: Dict[str, str] = {node_id: obj.system_name or obj.name or node_id
+                                      for node_id, obj in objects.items()}
+        node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.kinds: List[int] = []
+        self.inputs: List[Tuple[int, ...]] = []
+        self.outputs: List[Tuple[int, ...]] = []
+        for node_id, obj in objects.items():
+            inputs = [flow_index[f] for f in obj.incoming_flows if f in flow_index]
+            if obj.event_type == 'StartEvent':
+                inputs.append(start_flow)
+            self.inputs.append(tuple(inputs))
+            self.outputs.append(tuple(flow_index[f] for f in obj.outgoing_flows
+                                      if f in flow_index))
+            self.kinds.append(self._kind(obj))
+
+        self.target_of: List[int] = [node_index[target] for _, target in
+                                     bpmn_process.sequence_flows.values()]
+        self.target_of.append(node_index.get(self._start_event_id(bpmn_process), -1))
+        self.observable: List[bool] = [kind == _STEP for kind in self.kinds]
+
+        # Flows inside each inclusive pair that are not inputs of its join.
+        self.join_region: Dict[int, Tuple[int, ...]] = {}
+        for pair in bpmn_process.gateway_pairs.values():
+            if pair.gateway_type == 'Inclusive':
+                join = node_index[pair.join_gateway_id]
+                self.join_region[join] = self._region_flows(
+                    node_index[pair.split_gateway_id], join)
+
+        tokens = [0] * (len(flow_ids) + 1)
+        tokens[start_flow] = 1
+        self.initial_state: Tokens = tuple(tokens)
+        self._stable: Dict[Tokens, FrozenSet[Tokens]] = {}
+
+    @property
+    def state_count(self) -> int:
+        """Number of states whose gateway closure is memoized."""
+        return len(self._stable)
+
+    @staticmethod
+    def _kind(obj) -> int:
+        if obj.element_type != 'Gateway':
+            return _STEP
+        split = obj.gateway_function == 'Split'
+        if obj.gateway_type == 'Parallel':
+            return _AND
+        if obj.gateway_type == 'Inclusive':
+            return _OR_SPLIT if split else _OR_JOIN
+        return _XOR_SPLIT if split else _XOR_JOIN
+
+    @staticmethod
+    def _start_event_id(bpmn_process: BPMNProcess) -> Optional[str]:
+        for node_id, obj in bpmn_process.objects.items():
+            if obj.event_type == 'StartEvent':
+                return node_id
+        return None
+
+    def _region_flows(self, split: int, join: int) -> Tuple[int, ...]:
+        flows = []
+        seen = {split}
+        queue = deque([split])
+        while queue:
+            node = queue.popleft()
+            for flow in self.outputs[node]:
+                target = self.target_of[flow]
+                if target == join:
+                    continue
+                flows.append(flow)
+                if target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return tuple(flows)
+
+    def is_complete(self, state: Tokens) -> bool:
+        return not any(state)
+
+    def enabled_steps(self, state: Tokens) -> List[int]:
+        """Observable nodes with a token on one of their incoming flows."""
+        target_of, observable = self.target_of, self.observable
+        return sorted({target_of[flow] for flow, count in enumerate(state)
+                       if count and observable[target_of[flow]]})
+
+    def fire_step(self, state: Tokens, node: int) -> List[Tokens]:
+        """
+        States after an observable node consumes one token from one of its
+        incoming flows and puts one on every outgoing flow, gateways settled.
+        """
+        successors = set()
+        for flow in self.inputs[node]:
+            if state[flow]:
+                tokens = list(state)
+                tokens[flow] -= 1
+                for out in self.outputs[node]:
+                    tokens[out] += 1
+                successors.update(self.settle(tuple(tokens)))
+        return list(successors)
+
+    def settle(self, state: Tokens) -> FrozenSet[Tokens]:
+        """The states reached by firing gateways until none is enabled."""
+        cached = self._stable.get(state)
+        if cached is not None:
+            return cached
+        stable = set()
+        seen = {state}
+        stack = [state]
+        while stack:
+            current = stack.pop()
+            successors = self._fire_gateway(current)
+            if successors is None:
+                stable.add(current)
+                continue
+            for successor in successors:
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        result = frozenset(stable)
+        self._stable[state] = result
+        return result
+
+    def _fire_gateway(self, state: Tokens) -> Optional[List[Tokens]]:
+        # Fires the first enabled gateway, preferring joins and parallel
+        # gateways (one outcome) over splits that choose; None when no
+        # gateway is enabled.
+        choice = -1
+        for flow, count in enumerate(state):
+            if not count:
+                continue
+            node = self.target_of[flow]
+            kind = self.kinds[node]
+            if kind == _STEP:
+                continue
+            if kind in (_XOR_SPLIT, _OR_SPLIT):
+                if choice == -1:
+                    choice = node
+                continue
+            if kind == _XOR_JOIN:
+                return [self._move(state, (flow,), self.outputs[node])]
+            inputs = self.inputs[node]
+            if kind == _AND:
+                if all(state[i] for i in inputs):
+                    return [self._move(state, inputs, self.outputs[node])]
+            elif not any(state[i] for i in self.join_region.get(node, inputs)
+                         if i not in inputs):
+                return [self._move(state, [i for i in inputs if state[i]],
+                                   self.outputs[node])]
+        if choice == -1:
+            return None
+        inputs, outputs = self.inputs[choice], self.outputs[choice]
+        consumed = next(i for i in inputs if state[i])
+        if self.kinds[choice] == _XOR_SPLIT:
+            return [self._move(state, (consumed,), (out,)) for out in outputs]
+        return [self._move(state, (consumed,), [out for bit, out in enumerate(outputs)
+                                                if subset >> bit & 1])
+                for subset in range(1, 1 << len(outputs))]
+
+    @staticmethod
+    def _move(state: Tokens, consumed: Iterable[int], produced: Iterable[int]) -> Tokens:
+        tokens = list(state)
+        for flow in consumed:
+            tokens[flow] -= 1
+        for flow in produced:
+            tokens[flow] += 1
+        return tuple(tokens)
+
+
+class _StateBudgetExceeded(Exception):
+    pass
+
+
+class _DCRSide:
+    # The DCR graph seen through its observable events: markings are closed
+    # under the silent events, memoized per marking.
+    #
+    # Closures are reduced with stubborn sets, the DCR counterpart of the
+    # eager gateways of the token game. From a marking only the enabled
+    # events of a set S of silent events are fired, chosen so that every
+    # path skipped this way can be reordered into one that is explored:
+    # - S holds a key event that is enabled and pending;
+    # - every event dependent on an enabled event of S (one may disable the
+    #   other, or they do not commute) is in S if it can still occur
+    #   without the key event;
+    # - a disabled event of S has one set of events in S that is necessary
+    #   to enable it (its includers, or what executes or excludes one of
+    #   its blocking conditions).
+    # So no event of S is enabled or disabled by the events outside it, and
+    # the key event stays included and pending until it fires: a skipped
+    # path observes nothing that its reordering does not, and cannot accept
+    # earlier. S holds no observable event. All its enabled events must be
+    # unexecuted, which makes every reduced step grow the executed set, so
+    # each cycle passes a fully expanded marking and no event is postponed
+    # for ever. Markings without such a set are expanded fully.
+    #
+    # The reduced successors are memoized per marking and shared by all
+    # closures; every marking visited is kept in the closure.
+
+    def __init__(self, executor: DCRExecutor, observable_ids: Iterable[str],
+                 silent_ids: Iterable[str], max_states: Optional[int] = None):
+        self.executor = executor
+        self.observable = self._mask(observable_ids)
+        self.silent = self._mask(silent_ids) & ~self.observable
+        self.max_states = max_states
+        self._closures: Dict[Marking, FrozenSet[Marking]] = {}
+        self._successors: Dict[Marking, Tuple[Marking, ...]] = {}
+        self._index_relations()
+
+    @property
+    def state_count(self) -> int:
+        """Number of markings whose silent successors have been computed."""
+        return len(self._successors)
+
+    def _mask(self, event_ids: Iterable[str]) -> int:
+        mask = 0
+        for event_id in event_ids:
+            event = self.executor.index.get(event_id)
+            if event is not None:
+                mask |= 1 << event
+        return mask
+
+    def _index_relations(self):
+        # For every silent event, the events it is dependent on while it is
+        # enabled: they may disable it, be disabled by it or not commute
+        # with it.
+        executor = self.executor
+        n = len(executor)
+        excluded_by, included_by, responded_by = [0] * n, [0] * n, [0] * n
+        for source in range(n):
+            bit = 1 << source
+            for target in mask_bits(executor.excludes[source]):
+                excluded_by[target] |= bit
+            for target in mask_bits(executor.includes[source]):
+                included_by[target] |= bit
+            for target in mask_bits(executor.responses[source]):
+                responded_by[target] |= bit
+        self._excluded_by, self._included_by = excluded_by, included_by
+        self._active = self.silent | self.observable
+        # Everything included, directly or through other active events,
+        # once an active event occurs: the event itself and what it includes.
+        self._reach: List[int] = [0] * n
+        for event in mask_bits(self._active):
+            reached = 1 << event
+            stack = [event]
+            while stack:
+                for target in mask_bits(executor.includes[stack.pop()] & ~reached):
+                    reached |= 1 << target
+                    if self._active >> target & 1:
+                        stack.append(target)
+            self._reach[event] = reached
+        # For every silent event, the events only it can bring in: each of
+        # their includers is the event or one of them.
+        self._owned: Dict[int, int] = {}
+        for event in mask_bits(self.silent):
+            owned, changed = 0, True
+            while changed:
+                changed = False
+                for target in mask_bits(self._reach[event] & ~owned & ~(1 << event)):
+                    if included_by[target] and not included_by[target] & ~owned & ~(1 << event):
+                        owned |= 1 << target
+                        changed = True
+            self._owned[event] = owned
+
+        self._dependent: Dict[int, int] = {}
+        for event in mask_bits(self.silent):
+            includes = executor.includes[event]
+            excludes = executor.excludes[event] & ~includes
+            mask = excluded_by[event] | responded_by[event] | executor.responses[event] | excludes
+            for target in mask_bits(includes):
+                mask |= (excluded_by[target] & ~included_by[target]) | executor.conditions_of[target]
+            for target in mask_bits(excludes):
+                mask |= included_by[target]
+            for condition in mask_bits(executor.conditions_for[event]):
+                mask |= included_by[condition]
+            self._dependent[event] = mask & ~(1 << event)
+
+    def _may_occur(self, marking: Marking, key: int) -> int:
+        # Over-approximates the active events that can still occur from
+        # `marking` without `key` occurring: an event has to be included by
+        # then, and what only `key` includes cannot be unless part of it
+        # already is.
+        included = marking[1] & self._active & ~(1 << key)
+        owned = self._owned[key]
+        if included & owned:
+            owned = 0
+        reachable = 0
+        for event in mask_bits(included):
+            reachable |= self._reach[event]
+        return reachable & self._active & ~owned
+
+    def _necessary_enabling(self, marking: Marking, event: int, may_occur: int) -> int:
+        executed, included, _ = marking
+        if not included >> event & 1:
+            return self._included_by[event] & may_occur
+        best = None
+        blocking = self.executor.conditions_for[event] & included & ~executed
+        for condition in mask_bits(blocking):
+            enabling = ((1 << condition) | self._excluded_by[condition]) & may_occur
+            if best is None or bin(enabling).count('1') < bin(best).count('1'):
+                best = enabling
+        return best or 0
+
+    def _stubborn_set(self, marking: Marking, enabled: int) -> int:
+        # The enabled events of the smallest stubborn set found, trying every
+        # enabled, pending and unexecuted event as the key; all enabled
+        # events if there is none.
+        best = enabled
+        keys = enabled & marking[2] & ~marking[0]
+        if not keys or not enabled & (enabled - 1):
+            return enabled
+        for key in mask_bits(keys):
+            may_occur = self._may_occur(marking, key)
+            stubborn = frontier = 1 << key
+            while frontier:
+                needed = 0
+                for event in mask_bits(frontier):
+                    if enabled >> event & 1:
+                        needed |= self._dependent[event] & may_occur
+                    else:
+                        needed |= self._necessary_enabling(marking, event, may_occur)
+                frontier = needed & ~stubborn
+                stubborn |= frontier
+                if frontier & ~self.silent or frontier & enabled & marking[0]:
+                    break
+            if frontier:
+                continue
+            if bin(stubborn & enabled).count('1') < bin(best).count('1'):
+                best = stubborn & enabled
+                if not best & (best - 1):
+                    break
+        return best
+
+    def successors(self, marking: Marking) -> Tuple[Marking, ...]:
+        """
+        The markings after one silent event from the reduced set. Raises
+        _StateBudgetExceeded once more than max_states markings have been
+        expanded.
+        """
+        cached = self._successors.get(marking)
+        if cached is not None:
+            return cached
+        if self.max_states is not None and len(self._successors) >= self.max_states:
+            raise _StateBudgetExceeded()
+        executor = self.executor
+        enabled = executor.enabled_mask(marking) & self.silent
+        if enabled:
+            fired = self._stubborn_set(marking, enabled)
+            result = tuple(executor.execute(marking, event) for event in mask_bits(fired))
+        else:
+            result = ()
+        self._successors[marking] = result
+        return result
+
+    def closure(self, marking: Marking) -> FrozenSet[Marking]:
+        cached = self._closures.get(marking)
+        if cached is not None:
+            return cached
+        seen = {marking}
+        stack = [marking]
+        while stack:
+            for successor in self.successors(stack.pop()):
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        result = frozenset(seen)
+        self._closures[marking] = result
+        return result
+
+    def observable_mask(self, markings: Iterable[Marking]) -> int:
+        mask = 0
+        for marking in markings:
+            mask |= self.executor.enabled_mask(marking)
+        return mask & self.observable
+
+    def fire(self, markings: Iterable[Marking], event: int) -> FrozenSet[Marking]:
+        executor = self.executor
+        result = set()
+        for marking in markings:
+            if executor.is_enabled(marking, event):
+                result.update(self.closure(executor.execute(marking, event)))
+        return frozenset(result)
+
+
+def compare(game: TokenGame, executor: DCRExecutor, silent_ids: Iterable[str],
+            max_length: int = DEFAULT_MAX_LENGTH,
+            max_states: int = DEFAULT_MAX_STATES) -> VerificationResult:
+    """
+    Compares the observable traces of both models up to `max_length` steps.
+    `silent_ids` are the DCR events executed freely between observable ones
+    (the ids of the translated process's objects will do: observable ones
+    are skipped). The search stops early, with complete=False, once the
+    memoized BPMN states and DCR markings together exceed `max_states`;
+    the DCR markings are also counted while a silent closure is computed,
+    so a single closure cannot run past the budget.
+    """
+    observable_ids = [node_id for node_id, visible in zip(game.node_ids, game.observable)
+                      if visible]
+    dcr = _DCRSide(executor, observable_ids, silent_ids, max_states)
+    dcr_event = {node_id: executor.index.get(node_id) for node_id in observable_ids}
+    node_of_event = {event: node_id for node_id, event in dcr_event.items() if event is not None}
+
+    seen = set()
+    try:
+        start = (game.settle(game.initial_state), dcr.closure(executor.initial_marking))
+        seen.add(start)
+        level = [(start, ())]
+        for depth in range(max_length + 1):
+            next_level = []
+            for (bpmn_states, dcr_markings), trace in level:
+                divergence = _divergence(game, dcr, bpmn_states, dcr_markings, node_of_event)
+                if divergence:
+                    names = ", ".join(game.names[node_id] for node_id in trace)
+                    return VerificationResult(False, True, max_length, len(seen), list(trace),
+                                              f"After [{names}]: {divergence}")
+                if depth == max_length:
+                    continue
+                steps = set()
+                for state in bpmn_states:
+                    steps.update(game.enabled_steps(state))
+                for node in sorted(steps):
+                    node_id = game.node_ids[node]
+                    bpmn_next = frozenset(successor for state in bpmn_states
+                                          for successor in game.fire_step(state, node))
+                    pair = (bpmn_next, dcr.fire(dcr_markings, dcr_event[node_id]))
+                    if pair not in seen:
+                        seen.add(pair)
+                        next_level.append((pair, trace + (node_id,)))
+                if game.state_count + dcr.state_count > max_states:
+                    return VerificationResult(True, False, max_length, len(seen))
+            level = next_level
+            if not level:
+                break
+    except _StateBudgetExceeded:
+        return VerificationResult(True, False, max_length, len(seen))
+    return VerificationResult(True, True, max_length, len(seen))
+
+
+def _divergence(game: TokenGame, dcr: _DCRSide, bpmn_states: FrozenSet[Tokens],
+                dcr_markings: FrozenSet[Marking], node_of_event: Dict[int, str]) -> str:
+    bpmn_complete = any(game.is_complete(state) for state in bpmn_states)
+    dcr_accepting = any(dcr.executor.is_accepting(marking) for marking in dcr_markings)
+    if bpmn_complete != dcr_accepting:
+        if bpmn_complete:
+            return "the BPMN process can complete but the DCR graph cannot accept"
+        return "the DCR graph can accept but the BPMN process cannot complete"
+
+    bpmn_steps = {game.node_ids[node] for state in bpmn_states
+                  for node in game.enabled_steps(state)}
+    dcr_steps = {node_of_event[event] for event in mask_bits(dcr.observable_mask(dcr_markings))}
+    only_bpmn = [node_id for node_id in game.node_ids if node_id in bpmn_steps - dcr_steps]
+    if only_bpmn:
+        return f"'{game.names[only_bpmn[0]]}' can occur in the BPMN process but not in the DCR graph"
+    only_dcr = [node_id for node_id in game.node_ids if node_id in dcr_steps - bpmn_steps]
+    if only_dcr:
+        return f"'{game.names[only_dcr[0]]}' can occur in the DCR graph but not in the BPMN process"
+    return ""
+
+
+def verify_process(bpmn_process: BPMNProcess, compact_xor_splits: bool = False,
+                   max_length: int = DEFAULT_MAX_LENGTH,
+                   max_states: int = DEFAULT_MAX_STATES) -> VerificationResult:
+    """Translates a validated process and compares the result with it."""
+    game = TokenGame(bpmn_process)
+    dcr_graph = TranslationEngine(bpmn_process, compact_xor_splits=compact_xor_splits).translate()
+    return compare(game, DCRExecutor(dcr_graph), bpmn_process.objects,
+                   max_length, max_states)
+
+
+def verify_document(content: Union[str, bytes], compact_xor_splits: bool = False,
+                    max_length: int = DEFAULT_MAX_LENGTH,
+                    max_states: int = DEFAULT_MAX_STATES) -> List[Tuple[str, VerificationResult]]:
+    """
+    Verifies every valid process of a BPMN document. Returns (name, result)
+    pairs, where the name is the pool name or process id; processes that do
+    not validate are skipped.
+    """
+    results = []
+    for parser in BPMNParser.processes_from_string(content):
+        bpmn_process, errors = parser.parse_and_validate()
+        if errors or bpmn_process is None:
+            continue
+        name = parser.participant_name or parser.process_id
+        results.append((name, verify_process(bpmn_process, compact_xor_splits,
+                                             max_length, max_states)))
+    return results
+
+
+def describe(result: VerificationResult) -> str:
+    """One-line summary of a result."""
+    if not result.equivalent:
+        return result.message
+    if not result.complete:
+        return f"No divergence found before the state budget ran out (up to {result.max_length} steps)"
+    return f"Equivalent up to {result.max_length} steps"
@@ -1,10 +1,12 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { toast } from 'react-toastify';
 import DCRModeler from 'modeler';
 declare global {
   function loadPyodide(): Promise<any>;
 }
 
+const PYCORE_DIR = '/home/pyodide/bpmn2dcr-pycore';
+
 export const useBPMN = (
   modeler: DCRModeler | null,
   setGraphName: (name: string) => void,
@@ -13,53 +15,72 @@ export const useBPMN = (
 ) => {
 
   const [pyodideState, setPyodideState] = useState<{
-    pyodide: any | null;
     loading: boolean;
     error: string | null;
-  }>({ pyodide: null, loading: false, error: null });
-
-  const initializePyodide = async () => {
-    if (pyodideState.pyodide) {
-      return pyodideState.pyodide;
-    }
-
-    if (pyodideState.loading) {
-      return new Promise((resolve) => {
-        const checkInit = () => {
-          if (pyodideState.pyodide) {
-            resolve(pyodideState.pyodide);
-          } else if (!pyodideState.loading && pyodideState.error) {
-            throw new Error(pyodideState.error);
-          } else {
-            setTimeout(checkInit, 100);
-          }
-        };
-        checkInit();
+  }>({ loading: false, error: null });
+  const convertRef = useRef<Promise<any> | null>(null);
+
+  // Loads Pyodide and installs the pycore bundle into its filesystem once;
+  // resolves to the (cached) Python conversion function.
+  const initializeConverter = (): Promise<any> => {
+    if (!convertRef.current) {
+      convertRef.current = loadConverter().catch((err) => {
+        convertRef.current = null;
+        throw err;
       });
     }
+    return convertRef.current;
+  };
 
-    setPyodideState({ pyodide: null, loading: true, error: null });
+  const loadConverter = async () => {
+    setPyodideState({ loading: true, error: null });
 
     try {
       if (typeof loadPyodide === 'undefined') {
         throw new Error('Pyodide CDN script not loaded');
       }
 
-      const pyodideInstance = await loadPyodide();
+      const [pyodideInstance, bundle] = await Promise.all([
+        loadPyodide(),
+        fetch(`${import.meta.env.BASE_URL}bpmn2dcr-pycore.json`).then(r => {
+          if (!r.ok) throw new Error(`Failed to fetch converter bundle (${r.status})`);
+          return r.json() as Promise<{ files: Record<string, string> }>;
+        }),
+      ]);
+
+      pyodideInstance.FS.mkdirTree(PYCORE_DIR);
+      for (const [name, source] of Object.entries(bundle.files)) {
+        pyodideInstance.FS.writeFile(`${PYCORE_DIR}/${name}`, source);
+      }
+
+      const convert = pyodideInstance.runPython(`
+import sys
+sys.path.insert(0, "${PYCORE_DIR}")
+from conversion_cache import ConversionCache
 
-      await pyodideInstance.loadPackagesFromImports(`
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from collections import defaultdict, deque
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Literal, Set, Tuple
+def _make_converter():
+    cache = ConversionCache()
+
+    def convert(bpmn_xml_content):
+        try:
+            dcr_xml, errors = cache.convert(bpmn_xml_content)
+        except Exception as e:
+            return {'success': False, 'dcr_xml': '', 'error': str(e)}
+        if dcr_xml is None:
+            error_message = "\\n".join(errors)
+            return {'success': False, 'dcr_xml': '', 'error': f"BPMN validation failed:\\n{error_message}"}
+        return {'success': True, 'dcr_xml': dcr_xml, 'error': ''}
+
+    return convert
+
+_make_converter()
       `);
 
-      setPyodideState({ pyodide: pyodideInstance, loading: false, error: null });
-      return pyodideInstance;
+      setPyodideState({ loading: false, error: null });
+      return convert;
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : 'Unknown error';
-      setPyodideState({ pyodide: null, loading: false, error: errorMessage });
+      setPyodideState({ loading: false, error: errorMessage });
       throw new Error(`Failed to initialize Pyodide: ${errorMessage}`);
     }
   };
@@ -68,66 +89,11 @@ const convertBpmnToDcr = async (bpmnXmlContent: string, fileName?: string) => {
     try {
       setLoading(true);
 
-      const pyodide = await initializePyodide();
-
-      await pyodide.loadPackagesFromImports(`
-import tempfile
-import os
-from xml.dom import minidom
-      `);
-
-      const bpmnParserCode = await fetch(`${import.meta.env.BASE_URL}bpmn2dcr-pycore/bpmn_parser.py`).then(r => r.text());
-      const translationEngineCode = await fetch(`${import.meta.env.BASE_URL}bpmn2dcr-pycore/translation_engine.py`).then(r => r.text());
-      const dcrGeneratorCode = await fetch(`${import.meta.env.BASE_URL}bpmn2dcr-pycore/dcr_generator.py`).then(r => r.text());
-
-      const cleanBpmnParserCode = bpmnParserCode;
-      const cleanTranslationEngineCode = translationEngineCode.replace('from bpmn_parser import BPMNProcess, BPMNObject', '');
-      const cleanDcrGeneratorCode = dcrGeneratorCode.replace('from translation_engine import DCRGraph', '');
+      const convert = await initializeConverter();
 
-      const combinedPythonCode = `
-${cleanBpmnParserCode}
-
-${cleanTranslationEngineCode}
-
-${cleanDcrGeneratorCode}
-
-def convert_bpmn_to_dcr_xml(bpmn_xml_content):
-    from io import BytesIO
-
-    bpmn_file = BytesIO(bpmn_xml_content.encode('utf-8'))
-    parser = BPMNParser(bpmn_file)
-    bpmn_process, errors = parser.parse_and_validate()
-
-    if errors:
-        error_message = "\\n".join(errors)
-        raise Exception(f"BPMN validation failed:\\n{error_message}")
-
-    if bpmn_process is None:
-        raise Exception("Failed to parse BPMN process")
-
-    translator = TranslationEngine(bpmn_process)
-    dcr_graph = translator.translate()
-
-    generator = DCRGenerator(dcr_graph)
-    return generator.to_xml_string()
-      `;
-
-      await pyodide.runPython(combinedPythonCode);
-
-      pyodide.globals.set('bpmn_xml_content', bpmnXmlContent);
-
-      const result = await pyodide.runPython(`
-try:
-    dcr_xml_result = convert_bpmn_to_dcr_xml(bpmn_xml_content)
-    conversion_success = True
-    error_message = ""
-except Exception as e:
-    dcr_xml_result = ""
-    conversion_success = False
-    error_message = str(e)
-
-{'success': conversion_success, 'dcr_xml': dcr_xml_result, 'error': error_message}
-      `);
+      const resultProxy = convert(bpmnXmlContent);
+      const result = resultProxy.toJs({ dict_converter: Object.fromEntries });
+      resultProxy.destroy();
 
       if (result.success) {
         const dcrXmlContent = String(result.dcr_xml);
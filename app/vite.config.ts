@@ -1,10 +1,60 @@
-import { defineConfig } from "vite";
+import { defineConfig, type Plugin } from "vite";
 import react from "@vitejs/plugin-react";
+import { existsSync, readFileSync } from "node:fs";
+import { resolve } from "node:path";
 
 const base = process.env.VITE_BASE ?? "/dcr-js";
 
+const PYCORE_DIR = resolve(__dirname, "public/bpmn2dcr-pycore");
+const PYCORE_BUNDLE = "bpmn2dcr-pycore.json";
+// Module the browser imports (see useBPMN.ts); the bundle holds it and the
+// pycore modules it imports, transitively, but none of the CLI tools.
+const PYCORE_ENTRY = "conversion_cache";
+const PYTHON_IMPORT = /^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))/gm;
+
+// Bundles the bpmn2dcr Python modules into a single JSON file ({ files: { name: source } })
+// so the browser fetches one artifact and installs it into the Pyodide filesystem once.
+const pycoreBundle = (): Plugin => {
+  const buildBundle = () => {
+    const files: Record<string, string> = {};
+    const pending = [PYCORE_ENTRY];
+    while (pending.length > 0) {
+      const name = `${pending.pop()}.py`;
+      const path = resolve(PYCORE_DIR, name);
+      if (name in files || !existsSync(path)) {
+        continue;
+      }
+      files[name] = readFileSync(path, "utf-8");
+      for (const match of files[name].matchAll(PYTHON_IMPORT)) {
+        pending.push((match[1] ?? match[2]).split(".")[0]);
+      }
+    }
+    const sorted: Record<string, string> = {};
+    for (const name of Object.keys(files).sort()) {
+      sorted[name] = files[name];
+    }
+    return JSON.stringify({ files: sorted });
+  };
+
+  return {
+    name: "bpmn2dcr-pycore-bundle",
+    configureServer(server) {
+      server.middlewares.use((req, res, next) => {
+        if (!req.url?.split("?")[0].endsWith(`/${PYCORE_BUNDLE}`)) {
+          return next();
+        }
+        res.setHeader("Content-Type", "application/json");
+        res.end(buildBundle());
+      });
+    },
+    generateBundle() {
+      this.emitFile({ type: "asset", fileName: PYCORE_BUNDLE, source: buildBundle() });
+    },
+  };
+};
+
 // https://vite.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), pycoreBundle()],
   base: base.endsWith("/") ? base : `${base}/`,
 });
@@ -6,7 +6,9 @@ import glob
 import re
 import xml.etree.ElementTree as ET
 import statistics
-import pandas as pd
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 PD_STEPS = [
     "discover",  # Wrapper
@@ -37,6 +39,18 @@ CC_STEPS = [
 
 INTERESTING_STEPS = list(set(PD_STEPS + CC_STEPS))
 
+# Steps that work on the whole log rather than on the variants kept by the
+# variant filter; sweeps fit them against the size of the whole log.
+WHOLE_LOG_STEPS = {"parse-log", "transform-log", "collect-variants",
+                   "filter-variants", "filter-log", "open-model"}
+
+# Steps whose scaling sweeps print a summary of
+SCALING_FOCUS_STEPS = ["mine-log", "replay-log", "align-log"]
+SCALING_MEASURES = ["traces", "variants", "events"]
+SCALING_METRICS = ["Duration_s", "Mem_Max_MiB"]
+# Exponents within this distance of 1 count as linear
+LINEAR_TOLERANCE = 0.1
+
 
 def parse_xml_graph(xml_path):
     """Parses DCR XML to count graph elements."""
@@ -80,61 +94,216 @@ def parse_xml_graph(xml_path):
         return {}
 
 
-def get_closest_memory(df_mem, target_ts):
-    """Finds the memory reading closest to a specific timestamp."""
-    if df_mem.empty:
-        return 0
-    idx = (df_mem['ts'] - target_ts).abs().idxmin()
-    return df_mem.loc[idx, 'mib']
+def closest_samples(ts, targets):
+    """
+    Index of the sample closest to each target in the sorted array `ts`; on
+    a tie, the earliest such sample.
+    """
+    right = np.searchsorted(ts, targets, side='left')
+    left = np.maximum(right - 1, 0)
+    right = np.minimum(right, len(ts) - 1)
+    use_left = np.abs(targets - ts[left]) <= np.abs(ts[right] - targets)
+    closest = np.where(use_left, left, right)
+    # First of the samples sharing the chosen timestamp.
+    return np.searchsorted(ts, ts[closest], side='left')
+
+
+def window_memory_stats(ts, mib, starts, ends):
+    """
+    Memory statistics of every step at once, over the samples with
+    start <= ts <= end, from the samples sorted by ts. Steps without samples
+    fall back to their start and end readings. Returns a dict of arrays.
+    """
+    lo = np.searchsorted(ts, starts, side='left')
+    hi = np.searchsorted(ts, ends, side='right')
+    counts = hi - lo
+    mem_start = mib[closest_samples(ts, starts)]
+    mem_end = mib[closest_samples(ts, ends)]
+
+    # Fallback for when there are no samples inside the memory window.
+    # This happens for very short steps (i.e., instantaneous)
+    max_mem = np.maximum(mem_start, mem_end)
+    min_mem = np.minimum(mem_start, mem_end)
+    avg_mem = (mem_start + mem_end) / 2
+    # With only start/end, median is same as average
+    median_mem = avg_mem.copy()
+
+    filled = np.flatnonzero(counts > 0)
+    if len(filled):
+        # reduceat over interleaved [lo, hi) bounds reduces every window in
+        # one call; the sentinel keeps hi a valid index.
+        padded = np.append(mib, 0.0)
+        bounds = np.column_stack((lo[filled], hi[filled])).ravel()
+        max_mem[filled] = np.maximum.reduceat(padded, bounds)[::2]
+        min_mem[filled] = np.minimum.reduceat(padded, bounds)[::2]
+        prefix = np.concatenate(([0.0], np.cumsum(mib)))
+        avg_mem[filled] = (prefix[hi[filled]] - prefix[lo[filled]]) / counts[filled]
+        for i in filled:
+            median_mem[i] = np.median(mib[lo[i]:hi[i]])
+
+    return {
+        "Mem_Start_MiB": mem_start,
+        "Mem_End_MiB": mem_end,
+        "Mem_Max_MiB": max_mem,
+        "Mem_Min_MiB": min_mem,
+        "Mem_Avg_MiB": avg_mem,
+        "Mem_Median_MiB": median_mem,
+    }
+
+
+class TraceEventReader:
+    """
+    Iterates over the events of a Chrome trace file (a JSON array of events,
+    or an object with a "traceEvents" array) one at a time, reading the file
+    in blocks so memory use does not grow with the size of the trace.
+    """
+
+    BLOCK_SIZE = 1 << 20
+    NUMBER_CHARS = "0123456789+-.eE"
+
+    def __init__(self, f):
+        self.f = f
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        # Drops the consumed part of the buffer and reads at least `size`
+        # more characters, unless the file ends first.
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        while size > 0 and not self.eof:
+            block = self.f.read(max(size, self.BLOCK_SIZE))
+            if not block:
+                self.eof = True
+                break
+            self.buffer += block
+            size -= len(block)
+
+    def _peek(self):
+        # Next non-whitespace character, or "" at the end of the file.
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill(self.BLOCK_SIZE)
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def _value(self):
+        # Decodes the next JSON value; on a value cut off by the end of the
+        # buffer, reads twice as much and tries again.
+        self._peek()
+        need = self.BLOCK_SIZE
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the file,
+                # also when it is cut after "." or "e" ("1.", "2e-"), which
+                # raw_decode leaves behind.
+                rest = self.buffer[end:]
+                if isinstance(value, (int, float)):
+                    rest = rest.strip(self.NUMBER_CHARS)
+                if rest or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(need)
+            need *= 2
+
+    def _array(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(",]") == "]":
+                return
+
+    def __iter__(self):
+        if self._peek() == "[":
+            yield from self._array()
+            return
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "traceEvents":
+                yield from self._array()
+            else:
+                self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+def pair_step_marks(marks):
+    """
+    Pairs begin/end marks into steps. Marks are (ts, order in file, phase)
+    per step name; as the marks of different steps don't interact, only each
+    step's own marks are sorted, not the whole trace.
+    """
+    step_timings = []
+    for name, name_marks in marks.items():
+        start = None
+        for ts, _, ph in sorted(name_marks):
+            if ph == 'b':  # b = Begin
+                start = ts
+            elif start is not None:  # e = End
+                step_timings.append({
+                    'name': name, 'start': start, 'end': ts, 'dur': ts - start
+                })
+                start = None
+    step_timings.sort(key=lambda step: step['end'])
+    return step_timings
 
 
 def analyze_trace_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        mem_ts = []
+        mem_mib = []
+        marks = {}
+        has_events = False
 
-        events = data.get(
-            'traceEvents', data if isinstance(data, list) else [])
-        if not events:
+        # Only memory counters and blink.user_timing marks are kept while
+        # reading; everything else is dropped as soon as it is decoded.
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for index, e in enumerate(TraceEventReader(f)):
+                has_events = True
+                if not isinstance(e, dict):
+                    continue
+                name = e.get('name')
+                if name == 'UpdateCounters':
+                    args = e.get('args', {}).get('data', e.get('args', {}))
+                    if 'jsHeapSizeUsed' in args:
+                        mem_ts.append(e['ts'])
+                        mem_mib.append(args['jsHeapSizeUsed'] / (1024**2))
+                # Strictly use blink.user_timing for high precision performance.measure() calls
+                elif (e.get('cat') == 'blink.user_timing' and name in INTERESTING_STEPS
+                        and e.get('ph') in ('b', 'e')):
+                    marks.setdefault(name, []).append((e.get('ts', 0), index, e['ph']))
+
+        if not has_events:
             return []
 
-        memory_data = []
-        for e in events:
-            if e.get('name') == 'UpdateCounters':
-                args = e.get('args', {}).get('data', e.get('args', {}))
-                if 'jsHeapSizeUsed' in args:
-                    memory_data.append({
-                        'ts': e['ts'],
-                        'mib': args['jsHeapSizeUsed'] / (1024**2)
-                    })
-
-        df_mem = pd.DataFrame(memory_data).sort_values(
-            'ts') if memory_data else pd.DataFrame(columns=['ts', 'mib'])
+        # Samples sorted by ts; ties keep their order in the file.
+        order = np.argsort(np.asarray(mem_ts, dtype=np.float64), kind='stable')
+        ts = np.asarray(mem_ts, dtype=np.float64)[order]
+        mib = np.asarray(mem_mib, dtype=np.float64)[order]
 
         # Extract step timings using blink.user_timing
-        step_timings = []
-
-        sorted_events = sorted(events, key=lambda x: x.get('ts', 0))
-        active_starts = {}
-
-        for e in sorted_events:
-            # Strictly use blink.user_timing for high precision performance.measure() calls
-            if e.get('cat') != 'blink.user_timing':
-                continue
-
-            name = e.get('name')
-            ph = e.get('ph')
-
-            if name in INTERESTING_STEPS:
-                if ph == 'b':  # b = Begin
-                    active_starts[name] = e['ts']
-                elif ph == 'e':  # e = End
-                    if name in active_starts:
-                        start = active_starts.pop(name)
-                        end = e['ts']
-                        step_timings.append({
-                            'name': name, 'start': start, 'end': end, 'dur': end - start
-                        })
+        step_timings = pair_step_marks(marks)
 
         metrics = {}
 
@@ -151,51 +320,23 @@ def analyze_trace_file(file_path):
                 "Mem_Growth_MiB": 0
             }
 
-        for step in step_timings:
-            step_name = step['name']
+        if step_timings and len(ts):
+            memory = window_memory_stats(
+                ts, mib,
+                np.array([step['start'] for step in step_timings], dtype=np.float64),
+                np.array([step['end'] for step in step_timings], dtype=np.float64))
+        else:
+            memory = None
 
+        for i, step in enumerate(step_timings):
             # Convert duration from microseconds to seconds
-            duration_s = step['dur'] / 1_000_000
-
-            if not df_mem.empty:
-                mask = (df_mem['ts'] >= step['start']) & (
-                    df_mem['ts'] <= step['end'])
-                step_mem_window = df_mem[mask]
-
-                mem_start = get_closest_memory(df_mem, step['start'])
-                mem_end = get_closest_memory(df_mem, step['end'])
-
-                if not step_mem_window.empty:
-                    max_mem = step_mem_window['mib'].max()
-                    min_mem = step_mem_window['mib'].min()
-                    avg_mem = step_mem_window['mib'].mean()
-                    median_mem = step_mem_window['mib'].median()
-                else:
-                    # This is a fallback for when there are no samples inside memory window
-                    # This happens for very short steps (i.e., instantaneous)
-                    max_mem = max(mem_start, mem_end)
-                    min_mem = min(mem_start, mem_end)
-                    avg_mem = (mem_start + mem_end) / 2
-                    # With only start/end, median is same as average
-                    median_mem = avg_mem
-            else:
-                mem_start = 0
-                mem_end = 0
-                max_mem = 0
-                min_mem = 0
-                avg_mem = 0
-                median_mem = 0
-
-            metrics[step_name] = {
-                "Duration_s": duration_s,
-                "Mem_Start_MiB": mem_start,
-                "Mem_End_MiB": mem_end,
-                "Mem_Max_MiB": max_mem,
-                "Mem_Min_MiB": min_mem,
-                "Mem_Avg_MiB": avg_mem,
-                "Mem_Median_MiB": median_mem,
-                "Mem_Growth_MiB": mem_end - mem_start
-            }
+            step_metrics = {"Duration_s": step['dur'] / 1_000_000}
+            for key in ("Mem_Start_MiB", "Mem_End_MiB", "Mem_Max_MiB",
+                        "Mem_Min_MiB", "Mem_Avg_MiB", "Mem_Median_MiB"):
+                step_metrics[key] = float(memory[key][i]) if memory else 0
+            step_metrics["Mem_Growth_MiB"] = (
+                step_metrics["Mem_End_MiB"] - step_metrics["Mem_Start_MiB"])
+            metrics[step['name']] = step_metrics
 
         return metrics
 
@@ -204,7 +345,77 @@ def analyze_trace_file(file_path):
         return None
 
 
-def process_experiment(exp_dir):
+def run_files(traces_dir, log_name, run_id, run_type):
+    """Status, DCR XML and trace paths of a run."""
+    prefix = os.path.join(traces_dir, f"{log_name}_run_{run_id}.{run_type}")
+    return (f"{prefix}.status.txt", f"{prefix}.dcrgraph.xml", f"{prefix}.trace.json")
+
+
+def file_signature(paths):
+    """Size and mtime of each file, or None for missing ones."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append([st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            signature.append(None)
+    return json.dumps(signature)
+
+
+def analyze_run(traces_dir, log_name, run_id, run_type):
+    status_file, xml_path, trace_path = run_files(
+        traces_dir, log_name, run_id, run_type)
+
+    with open(status_file, 'r') as f:
+        status = f.read().strip()
+
+    return {
+        'run_id': run_id,
+        'type': run_type,
+        'status': status,
+        'graph': parse_xml_graph(xml_path),
+        'metrics': analyze_trace_file(trace_path)
+    }
+
+
+class RunCache:
+    """
+    Per-run results of an experiment, keyed by run and invalidated when the
+    size or mtime of any of its files changes.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "log_name TEXT, run_type TEXT, run_id INTEGER, signature TEXT, data TEXT, "
+            "PRIMARY KEY (log_name, run_type, run_id))")
+
+    def get(self, key, signature):
+        row = self.conn.execute(
+            "SELECT data FROM runs WHERE log_name = ? AND run_type = ? AND run_id = ? "
+            "AND signature = ?", (*key, signature)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, signature, run_data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+            (*key, signature, json.dumps(run_data)))
+
+    def prune(self, keys):
+        """Drops the runs that are no longer in the experiment."""
+        stale = [row for row in self.conn.execute(
+            "SELECT log_name, run_type, run_id FROM runs") if row not in keys]
+        self.conn.executemany(
+            "DELETE FROM runs WHERE log_name = ? AND run_type = ? AND run_id = ?", stale)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def process_experiment(exp_dir, workers=None, use_cache=True):
     traces_dir = os.path.join(exp_dir, "traces")
     if not os.path.exists(traces_dir):
         print(f"No traces folder found in {exp_dir}")
@@ -216,42 +427,53 @@ def process_experiment(exp_dir):
     # Filename format: {log}_run_{i}.{type}.status.txt
     run_pattern = re.compile(r"(.*)_run_(\d+)\.(PD|CC)\.status\.txt")
 
-    logs_data = {}
-
     print("Scanning for runs...")
+    run_keys = []
     for status_file in glob.glob(os.path.join(traces_dir, "*.status.txt")):
         filename = os.path.basename(status_file)
         match = run_pattern.match(filename)
         if not match:
             continue
+        # (log name, PD or CC, run id)
+        run_keys.append((match.group(1), match.group(3), int(match.group(2))))
+    run_keys.sort()
+
+    cache = RunCache(os.path.join(exp_dir, "analysis_cache.sqlite")) if use_cache else None
+    results = {}
+    todo = []
+    for key in run_keys:
+        log_name, run_type, run_id = key
+        signature = file_signature(run_files(traces_dir, log_name, run_id, run_type))
+        run_data = cache.get(key, signature) if cache else None
+        if run_data is None:
+            todo.append((key, signature))
+        else:
+            results[key] = run_data
+
+    print(f"Analyzing {len(todo)} runs ({len(results)} cached)...")
+    workers = workers or os.cpu_count() or 1
+    args = [(traces_dir, log_name, run_id, run_type)
+            for (log_name, run_type, run_id), _ in todo]
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            analyzed = executor.map(analyze_run, *zip(*args))
+            for (key, signature), run_data in zip(todo, analyzed):
+                results[key] = run_data
+                if cache:
+                    cache.put(key, signature, run_data)
+    else:
+        for (key, signature), a in zip(todo, args):
+            results[key] = analyze_run(*a)
+            if cache:
+                cache.put(key, signature, results[key])
+
+    if cache:
+        cache.prune(set(run_keys))
+        cache.close()
 
-        log_name = match.group(1)
-        run_id = int(match.group(2))
-        run_type = match.group(3)  # PD or CC
-
-        if log_name not in logs_data:
-            logs_data[log_name] = []
-
-        with open(status_file, 'r') as f:
-            status = f.read().strip()
-
-        xml_path = os.path.join(
-            traces_dir, f"{log_name}_run_{run_id}.{run_type}.dcrgraph.xml")
-
-        graph_stats = parse_xml_graph(xml_path)
-
-        trace_path = os.path.join(
-            traces_dir, f"{log_name}_run_{run_id}.{run_type}.trace.json")
-        step_metrics = analyze_trace_file(trace_path)
-
-        run_data = {
-            'run_id': run_id,
-            'type': run_type,
-            'status': status,
-            'graph': graph_stats,
-            'metrics': step_metrics
-        }
-        logs_data[log_name].append(run_data)
+    logs_data = {}
+    for key in run_keys:
+        logs_data.setdefault(key[0], []).append(results[key])
 
     metric_types = ["Duration_s", "Mem_Start_MiB", "Mem_End_MiB", "Mem_Max_MiB",
                     "Mem_Min_MiB", "Mem_Avg_MiB", "Mem_Median_MiB", "Mem_Growth_MiB"]
@@ -376,12 +598,147 @@ def process_experiment(exp_dir):
                     writer.writerow(row)
 
     print(f"Completed analysis")
+    return logs_data
+
+
+def fit_exponent(groups):
+    """
+    Exponent b of y = a * x^b by least squares on log-log values, for
+    (x, y) point lists that share b but each have their own a. Returns
+    (b, R^2, number of points), or None with fewer than three usable points.
+    """
+    xs, ys = [], []
+    for points in groups:
+        points = [(x, y) for x, y in points if x > 0 and y > 0]
+        if len(points) < 2:
+            continue
+        lx = np.log([x for x, _ in points])
+        ly = np.log([y for _, y in points])
+        # Centering per group removes its own factor a
+        xs.append(lx - lx.mean())
+        ys.append(ly - ly.mean())
+    if not xs:
+        return None
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    if len(x) < 3 or not (x ** 2).sum() > 0:
+        return None
+    b = (x * y).sum() / (x ** 2).sum()
+    ss_tot = (y ** 2).sum()
+    r2 = 1 - ((y - b * x) ** 2).sum() / ss_tot if ss_tot > 0 else 1.0
+    return float(b), float(r2), len(x)
+
+
+def classify_exponent(b):
+    if b > 1 + LINEAR_TOLERANCE:
+        return "super-linear"
+    if b < 1 - LINEAR_TOLERANCE:
+        return "sub-linear"
+    return "linear"
+
+
+def process_sweep(exp_dir, workers=None, use_cache=True):
+    """
+    Analyzes every point of a sweep (see run.py --sweep-variants and
+    --sweep-traces) and fits how the median duration and peak memory of each
+    step grow with the number of traces, variants and events.
+    """
+    with open(os.path.join(exp_dir, "sweep.json")) as f:
+        manifest = json.load(f)
+
+    rows = []
+    for point in manifest["points"]:
+        print(f"\nAnalyzing sweep point {point['name']}...")
+        logs_data = process_experiment(
+            os.path.join(exp_dir, "points", point['name']), workers, use_cache)
+        for log_name, runs in (logs_data or {}).items():
+            size = point['sizes'].get(log_name)
+            if not size:
+                continue
+            for r_type, steps in (("PD", PD_STEPS), ("CC", CC_STEPS)):
+                passed = [r['metrics'] for r in runs
+                          if r['type'] == r_type and r['status'] == 'passed' and r.get('metrics')]
+                for step in steps:
+                    # Steps missing from a trace are filled with zeros
+                    step_runs = [m[step] for m in passed
+                                 if step in m and m[step]['Duration_s'] > 0]
+                    if not step_runs:
+                        continue
+                    prefix = "log_" if step in WHOLE_LOG_STEPS else ""
+                    row = {
+                        'Log Name': log_name, 'Type': r_type, 'Step': step,
+                        'Traces_pct': point['traces_percentage'],
+                        'Variants_pct': point['variants_percentage'],
+                        'Runs': len(step_runs)
+                    }
+                    for measure in SCALING_MEASURES:
+                        row[measure.capitalize()] = size[prefix + measure]
+                    for m in SCALING_METRICS:
+                        row[m] = statistics.median(r[m] for r in step_runs)
+                    rows.append(row)
+
+    out_points = os.path.join(exp_dir, "scaling.csv")
+    print(f"\nWriting sweep points to {out_points}...")
+    point_headers = ['Log Name', 'Type', 'Step', 'Traces_pct', 'Variants_pct', 'Runs'] + \
+        [m.capitalize() for m in SCALING_MEASURES] + SCALING_METRICS
+    with open(out_points, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(point_headers)
+        for row in rows:
+            writer.writerow([f"{row[h]:.4f}" if isinstance(row[h], float) else row[h]
+                             for h in point_headers])
+
+    # Per log, and over all logs with a factor per log
+    series = {}
+    for row in rows:
+        series.setdefault((row['Type'], row['Step']), {}).setdefault(
+            row['Log Name'], []).append(row)
+    fits = []
+    for (r_type, step), by_log in series.items():
+        groups = [("(all logs)", list(by_log.values()))] + \
+            [(log_name, [log_rows]) for log_name, log_rows in sorted(by_log.items())]
+        for log_name, log_groups in groups:
+            for m in SCALING_METRICS:
+                for measure in SCALING_MEASURES:
+                    fit = fit_exponent([[(r[measure.capitalize()], r[m]) for r in g]
+                                        for g in log_groups])
+                    if fit is None:
+                        continue
+                    b, r2, n = fit
+                    fits.append([log_name, r_type, step, m, measure.capitalize(),
+                                 f"{b:.4f}", f"{r2:.4f}", n, classify_exponent(b)])
+    fits.sort(key=lambda fit: (fit[1], fit[2], fit[0] != "(all logs)", fit[0], fit[3], fit[4]))
+
+    out_fits = os.path.join(exp_dir, "scaling_fits.csv")
+    print(f"Writing scaling fits to {out_fits}...")
+    with open(out_fits, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Log Name', 'Type', 'Step', 'Metric', 'Measure',
+                         'Exponent', 'R2', 'Points', 'Scaling'])
+        writer.writerows(fits)
+
+    print("\nScaling over all logs (y ~ x^exponent):")
+    for fit in fits:
+        if fit[0] == "(all logs)" and fit[2] in SCALING_FOCUS_STEPS:
+            print(f"  {fit[1]} {fit[2]:<12} {fit[3]:<12} vs {fit[4]:<9} "
+                  f"exponent {fit[5]} (R2 {fit[6]}): {fit[8]}")
+
+    print(f"Completed sweep analysis")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze benchmark results")
     parser.add_argument(
         "exp_dir", help="Path to the specific experiment folder")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Analyze runs in this many processes (default: CPU count)")
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Re-analyze every run instead of reusing analysis_cache.sqlite")
     args = parser.parse_args()
 
-    process_experiment(args.exp_dir)
+    if os.path.exists(os.path.join(args.exp_dir, "sweep.json")):
+        process_sweep(args.exp_dir, args.workers, not args.no_cache)
+    else:
+        process_experiment(args.exp_dir, args.workers, not args.no_cache)
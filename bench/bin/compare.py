@@ -0,0 +1,286 @@
+import os
+import sys
+import csv
+import html
+import math
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+
+# Compares the runs.csv of one or more candidate experiments against a
+# baseline experiment (see analyze.py), per log, type and step. For every
+# metric it reports the relative change of the median, a bootstrap confidence
+# interval for it and a one-sided Mann-Whitney U p-value, and flags a
+# regression when the median got worse by more than the threshold and the
+# test is significant. Exits with status 1 if any regression was found, so it
+# can gate a change.
+#
+# The p-value uses the normal approximation with tie and continuity
+# correction, which is close to the exact test from about eight runs per side;
+# with fewer runs, few steps can reach significance at all.
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+EXPERIMENTS_DIR = SCRIPT_DIR.parent / "experiments"
+
+DEFAULT_METRICS = ["Duration_s", "Mem_Max_MiB"]
+
+
+def resolve_experiment(name):
+    """
+    Experiment directory for a path, a directory name under
+    bench/experiments, or an experiment name given to run.py (the latest
+    experiment with that name).
+    """
+    path = Path(name)
+    if path.is_dir():
+        return path
+    if (EXPERIMENTS_DIR / name).is_dir():
+        return EXPERIMENTS_DIR / name
+    # Directories are named {timestamp}_{name}, so the last match is the latest
+    matches = sorted(p for p in EXPERIMENTS_DIR.glob(f"*_{name}") if p.is_dir())
+    if matches:
+        return matches[-1]
+    raise FileNotFoundError(f"No experiment found for '{name}'")
+
+
+def load_runs(exp_dir, metrics):
+    """
+    Values of the passed runs of an experiment, as
+    {(log, type, step): {metric: array}}. Steps missing from a run are
+    left out rather than counted as zero.
+    """
+    runs_csv = os.path.join(exp_dir, "runs.csv")
+    if not os.path.exists(runs_csv):
+        raise FileNotFoundError(
+            f"No runs.csv in {exp_dir}, run analyze.py on it first")
+
+    values = {}
+    with open(runs_csv, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['Status'] != 'passed':
+                continue
+            # analyze.py writes zeros for the steps a run did not record;
+            # like process_sweep, they are not taken as measurements.
+            if float(row.get('Duration_s') or 0) == 0:
+                continue
+            key = (row['Log Name'], row['Type'], row['Step'])
+            for m in metrics:
+                if row.get(m, ''):
+                    values.setdefault(key, {}).setdefault(m, []).append(float(row[m]))
+    return {key: {m: np.array(v) for m, v in step.items()} for key, step in values.items()}
+
+
+def mann_whitney_greater(baseline, candidate):
+    """One-sided Mann-Whitney U p-value for candidate values being larger."""
+    n1, n2 = len(candidate), len(baseline)
+    n = n1 + n2
+    values = np.concatenate((candidate, baseline))
+    # Average ranks, ties sharing the mean of their ranks
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    var = n1 * n2 / 12 * ((n + 1) - (counts ** 3 - counts).sum() / (n * (n - 1)))
+    if var <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(var)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_change_ci(baseline, candidate, rng, resamples, confidence):
+    """Bootstrap interval of the relative change of the median."""
+    base = np.median(baseline[rng.integers(0, len(baseline), (resamples, len(baseline)))], axis=1)
+    cand = np.median(candidate[rng.integers(0, len(candidate), (resamples, len(candidate)))], axis=1)
+    valid = base > 0
+    if not valid.any():
+        return (math.nan, math.nan)
+    changes = cand[valid] / base[valid] - 1
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(changes, [tail, 100 - tail])
+    return (float(low), float(high))
+
+
+def compare(baseline, candidate, metrics, threshold, alpha, min_runs,
+            resamples, confidence, seed):
+    """One row per (log, type, step, metric) present in both experiments."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        for m in metrics:
+            base = baseline[key].get(m)
+            cand = candidate[key].get(m)
+            if base is None or cand is None:
+                continue
+
+            base_median = float(np.median(base))
+            cand_median = float(np.median(cand))
+            row = {
+                "log": key[0], "type": key[1], "step": key[2], "metric": m,
+                "baseline_runs": len(base), "candidate_runs": len(cand),
+                "baseline_median": base_median, "candidate_median": cand_median,
+                "change": math.nan, "ci": (math.nan, math.nan),
+                "p_slower": math.nan, "p_faster": math.nan, "status": "n/a"
+            }
+            if base_median > 0:
+                row["change"] = cand_median / base_median - 1
+            if len(base) < min_runs or len(cand) < min_runs or math.isnan(row["change"]):
+                rows.append(row)
+                continue
+
+            row["ci"] = bootstrap_change_ci(base, cand, rng, resamples, confidence)
+            row["p_slower"] = mann_whitney_greater(base, cand)
+            row["p_faster"] = mann_whitney_greater(cand, base)
+            if row["change"] > threshold and row["p_slower"] < alpha:
+                row["status"] = "regression"
+            elif row["change"] < -threshold and row["p_faster"] < alpha:
+                row["status"] = "improvement"
+            else:
+                row["status"] = "unchanged"
+            rows.append(row)
+    return rows
+
+
+def format_cells(row):
+    low, high = row["ci"]
+    p = row["p_slower"] if row["change"] >= 0 else row["p_faster"]
+    return [
+        row["log"], row["type"], row["step"], row["metric"],
+        f"{row['baseline_median']:.4f} (n={row['baseline_runs']})",
+        f"{row['candidate_median']:.4f} (n={row['candidate_runs']})",
+        "" if math.isnan(row["change"]) else f"{row['change']:+.1%}",
+        "" if math.isnan(low) else f"[{low:+.1%}, {high:+.1%}]",
+        "" if math.isnan(p) else f"{p:.4f}",
+        row["status"],
+    ]
+
+
+REPORT_HEADERS = ["Log Name", "Type", "Step", "Metric", "Baseline median",
+                  "Candidate median", "Change", "CI", "p", "Status"]
+
+
+def reported_rows(rows, show_all):
+    return rows if show_all else [r for r in rows if r["status"] in ("regression", "improvement")]
+
+
+def count_status(rows):
+    return {s: sum(r["status"] == s for r in rows)
+            for s in ("regression", "improvement", "unchanged", "n/a")}
+
+
+def render_markdown(baseline_name, comparisons, settings, show_all):
+    lines = [f"# Performance comparison against `{baseline_name}`", "", settings, ""]
+    for name, rows in comparisons:
+        counts = count_status(rows)
+        lines.append(f"## `{name}`")
+        lines.append("")
+        lines.append(", ".join(f"{count} {status}" for status, count in counts.items()))
+        lines.append("")
+        shown = reported_rows(rows, show_all)
+        if not shown:
+            continue
+        lines.append("| " + " | ".join(REPORT_HEADERS) + " |")
+        lines.append("|" + "---|" * len(REPORT_HEADERS))
+        for row in shown:
+            lines.append("| " + " | ".join(format_cells(row)) + " |")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def render_html(baseline_name, comparisons, settings, show_all):
+    parts = ["<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\">",
+             "<title>Performance comparison</title>",
+             "<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px}"
+             ".regression{background:#fdd}.improvement{background:#dfd}</style></head><body>",
+             f"<h1>Performance comparison against {html.escape(baseline_name)}</h1>",
+             f"<p>{html.escape(settings)}</p>"]
+    for name, rows in comparisons:
+        counts = count_status(rows)
+        parts.append(f"<h2>{html.escape(name)}</h2>")
+        parts.append("<p>" + html.escape(", ".join(
+            f"{count} {status}" for status, count in counts.items())) + "</p>")
+        shown = reported_rows(rows, show_all)
+        if not shown:
+            continue
+        parts.append("<table><tr>" + "".join(
+            f"<th>{html.escape(h)}</th>" for h in REPORT_HEADERS) + "</tr>")
+        for row in shown:
+            parts.append(f"<tr class=\"{row['status']}\">" + "".join(
+                f"<td>{html.escape(str(c))}</td>" for c in format_cells(row)) + "</tr>")
+        parts.append("</table>")
+    parts.append("</body></html>")
+    return "\n".join(parts) + "\n"
+
+
+def main():
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    parser = argparse.ArgumentParser(
+        description="Compare benchmark experiments against a baseline and flag regressions.")
+    parser.add_argument(
+        "baseline", help="Baseline experiment (path, directory name or experiment name)")
+    parser.add_argument(
+        "candidates", nargs="+", help="Experiments to compare against the baseline")
+    parser.add_argument(
+        "--metrics", nargs="+", default=DEFAULT_METRICS,
+        help=f"Metrics to compare (default: {' '.join(DEFAULT_METRICS)})")
+    parser.add_argument(
+        "--threshold", type=float, default=0.05,
+        help="Relative change of the median considered a regression (default: 0.05)")
+    parser.add_argument(
+        "--alpha", type=float, default=0.05,
+        help="Significance level of the Mann-Whitney U test (default: 0.05)")
+    parser.add_argument(
+        "--min-runs", type=int, default=3,
+        help="Minimum passed runs per side to test a step (default: 3)")
+    parser.add_argument(
+        "--resamples", type=int, default=2000,
+        help="Bootstrap resamples (default: 2000)")
+    parser.add_argument(
+        "--confidence", type=float, default=0.95,
+        help="Confidence level of the bootstrap interval (default: 0.95)")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Bootstrap seed (default: 0)")
+    parser.add_argument(
+        "--all", action="store_true",
+        help="List every step in the report, not only regressions and improvements")
+    parser.add_argument(
+        "--report", help="Write the report to this file (.html for HTML, markdown otherwise)")
+    args = parser.parse_args()
+
+    try:
+        baseline_dir = resolve_experiment(args.baseline)
+        baseline = load_runs(baseline_dir, args.metrics)
+        candidates = [(d.name, load_runs(d, args.metrics))
+                      for d in map(resolve_experiment, args.candidates)]
+    except FileNotFoundError as e:
+        # Exit code 1 is reserved for regressions
+        print(e)
+        sys.exit(2)
+
+    comparisons = []
+    for name, candidate in candidates:
+        rows = compare(baseline, candidate, args.metrics, args.threshold, args.alpha,
+                       args.min_runs, args.resamples, args.confidence, args.seed)
+        comparisons.append((name, rows))
+
+    settings = (f"Threshold {args.threshold:.1%} on the median, Mann-Whitney U at alpha {args.alpha}, "
+                f"{args.confidence:.0%} bootstrap intervals, passed runs only.")
+    report = render_markdown(baseline_dir.name, comparisons, settings, args.all)
+    print(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            if args.report.endswith(".html"):
+                f.write(render_html(baseline_dir.name, comparisons, settings, args.all))
+            else:
+                f.write(report)
+
+    regressions = sum(count_status(rows)["regression"] for _, rows in comparisons)
+    if regressions:
+        print(f"{regressions} regression(s) found")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
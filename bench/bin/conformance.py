@@ -0,0 +1,349 @@
+import sys
+import json
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+from xes_reader import DEFAULT_CLASSIFIER, collect_variants
+
+
+# Replay conformance checking of XES logs against DCR XML models, following
+# replayTraceS() and quantifyViolations() in dcr-engine/src/conformance.ts
+# for graphs without guards, time constraints or subprocesses (the models in
+# datasets/models). Every variant is replayed once and weighted by its count.
+#
+# Variants are replayed in sorted order as a depth-first walk over their
+# prefix trie, keeping only the states along the current prefix, so a prefix
+# shared by many variants is replayed once. Events whose label occurs several
+# times branch like the recursion in conformance.ts; branches that reach the
+# same state are merged, keeping the one with the fewest violations. Roles
+# are ignored: neither the models nor the logs of the benchmark have any.
+
+DCR_NS = "{http://tk/schema/dcr}"
+RELATION_TYPES = ("condition", "response", "include", "exclude", "milestone")
+
+
+def mask_bits(mask):
+    """Indices of the set bits of a mask, in increasing order."""
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+
+class DCRModel:
+    """A DCR XML graph compiled to per-event relation masks."""
+
+    def __init__(self, path):
+        self.event_ids = []
+        self.labels = []
+        members = {}
+        relations = []
+        executed = included = pending = 0
+
+        def visit(container, nesting_ids):
+            nonlocal executed, included, pending
+            for elem in container:
+                tag = elem.tag
+                if tag == DCR_NS + "event":
+                    event = len(self.event_ids)
+                    self.event_ids.append(elem.get("id"))
+                    self.labels.append(elem.get("description") or "")
+                    executed |= (elem.get("executed") == "true") << event
+                    included |= (elem.get("included") == "true") << event
+                    pending |= (elem.get("pending") == "true") << event
+                    for nesting_id in nesting_ids:
+                        members[nesting_id] |= 1 << event
+                elif tag == DCR_NS + "nesting":
+                    members[elem.get("id")] = 0
+                    visit(elem, nesting_ids + [elem.get("id")])
+                elif tag == DCR_NS + "subProcess":
+                    raise ValueError("Subprocesses are not supported")
+                elif tag == DCR_NS + "relation":
+                    relations.append((elem.get("type"), elem.get("sourceRef"), elem.get("targetRef")))
+
+        graph = ET.parse(path).getroot().find(DCR_NS + "dcrGraph")
+        if graph is None:
+            raise ValueError(f"No dcr:dcrGraph element in {path}")
+        visit(graph, [])
+
+        n = len(self.event_ids)
+        self.initial_marking = (executed, included, pending)
+        for i, event_id in enumerate(self.event_ids):
+            members[event_id] = 1 << i
+        self.label_events = {}
+        for event, label in enumerate(self.labels):
+            self.label_events.setdefault(label, []).append(event)
+
+        self.conditions_for = [0] * n
+        self.milestones_for = [0] * n
+        self.responses = [0] * n
+        self.includes = [0] * n
+        self.excludes = [0] * n
+        for relation_type, source_ref, target_ref in relations:
+            if relation_type not in RELATION_TYPES:
+                raise ValueError(f"Relation type '{relation_type}' is not supported")
+            sources = members.get(source_ref, 0)
+            targets = members.get(target_ref, 0)
+            if relation_type in ("condition", "milestone"):
+                # Stored on the target: the events it waits for.
+                table = self.conditions_for if relation_type == "condition" else self.milestones_for
+                for target in mask_bits(targets):
+                    table[target] |= sources
+            else:
+                table = {"response": self.responses, "include": self.includes,
+                         "exclude": self.excludes}[relation_type]
+                for source in mask_bits(sources):
+                    table[source] |= targets
+
+    def __len__(self):
+        return len(self.event_ids)
+
+
+class Branch:
+    """
+    One way of replaying a prefix. Besides the marking it keeps, per event,
+    the sources of standing exclusions and response obligations on it, which
+    is what conformance.ts blames exclude and response violations on.
+    """
+    __slots__ = ("marking", "excluded_by", "pending_from", "valid",
+                 "parent", "violations", "total")
+
+    def __init__(self, marking, excluded_by, pending_from, valid, parent, violations, total):
+        self.marking = marking
+        self.excluded_by = excluded_by
+        self.pending_from = pending_from
+        self.valid = valid
+        self.parent = parent
+        self.violations = violations
+        self.total = total
+
+    def key(self):
+        return (self.marking, self.excluded_by, self.pending_from, self.valid)
+
+
+def execute(model, branch, event):
+    """The branch after executing `event`, with the violations it causes."""
+    executed, included, pending = branch.marking
+    bit = 1 << event
+    violations = []
+    for source in mask_bits(model.conditions_for[event] & included & ~executed):
+        violations.append(("condition", source, event))
+    for source in mask_bits(model.milestones_for[event] & included & pending):
+        violations.append(("milestone", source, event))
+    if not included & bit:
+        for source in mask_bits(branch.excluded_by[event]):
+            violations.append(("exclude", source, event))
+    enabled = bool(included & bit) and not (
+        model.conditions_for[event] & included & ~executed) and not (
+        model.milestones_for[event] & included & pending)
+
+    marking = (executed | bit,
+               (included & ~model.excludes[event]) | model.includes[event],
+               (pending & ~bit) | model.responses[event])
+    pending_from = list(branch.pending_from)
+    pending_from[event] = 0
+    for target in mask_bits(model.responses[event]):
+        pending_from[target] |= bit
+    excluded_by = list(branch.excluded_by)
+    for target in mask_bits(model.excludes[event]):
+        excluded_by[target] |= bit
+    for target in mask_bits(model.includes[event]):
+        excluded_by[target] = 0
+    return Branch(marking, tuple(excluded_by), tuple(pending_from),
+                  branch.valid and enabled, branch, violations, branch.total + len(violations))
+
+
+def end_violations(branch):
+    """Response violations of the pending included events at the end."""
+    _, included, pending = branch.marking
+    return [("response", source, target)
+            for target in mask_bits(included & pending)
+            for source in mask_bits(branch.pending_from[target])]
+
+
+class Replayer:
+
+    def __init__(self, model):
+        self.model = model
+        n = len(model)
+        self.root = [Branch(model.initial_marking, (0,) * n, (0,) * n, True, None, [], 0)]
+
+    def step(self, branches, activity):
+        events = self.model.label_events.get(activity)
+        # Open world: activities the model doesn't know are skipped.
+        if events is None:
+            return branches
+        merged = {}
+        for branch in branches:
+            for event in events:
+                successor = execute(self.model, branch, event)
+                key = successor.key()
+                best = merged.get(key)
+                if best is None or successor.total < best.total:
+                    merged[key] = successor
+        return list(merged.values())
+
+    def result(self, branches):
+        """Outcome of a variant, given the branches after its last activity."""
+        best = None
+        best_end = None
+        for branch in branches:
+            end = end_violations(branch)
+            if best is None or branch.total + len(end) < best.total + len(best_end):
+                best, best_end = branch, end
+        violations = list(best_end)
+        branch = best
+        while branch is not None:
+            violations.extend(branch.violations)
+            branch = branch.parent
+        positive = any(branch.valid and not (branch.marking[1] & branch.marking[2])
+                       for branch in branches)
+        return {
+            "positive": positive,
+            "total_violations": len(violations),
+            "final_state_accepting": not (best.marking[1] & best.marking[2]),
+            "violations": violations,
+        }
+
+    def replay_sorted(self, variants):
+        """
+        Replays variants given in sorted order, sharing the prefix with the
+        previous variant. Yields one result per variant.
+        """
+        path = []
+        stack = [self.root]
+        for variant in variants:
+            common = 0
+            limit = min(len(path), len(variant))
+            while common < limit and path[common] == variant[common]:
+                common += 1
+            del path[common:]
+            del stack[common + 1:]
+            for activity in variant[common:]:
+                stack.append(self.step(stack[-1], activity))
+                path.append(activity)
+            yield self.result(stack[-1])
+
+
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = DCRModel(model_path)
+
+
+def _replay_chunk(chunk, model=None):
+    # Worker: results of a sorted run of (variant, count) pairs, with the
+    # constraint violations already weighted by count.
+    replayer = Replayer(model or _worker_model)
+    results = []
+    constraint_counts = {}
+    for (variant, count), result in zip(chunk, replayer.replay_sorted([v for v, _ in chunk])):
+        for violation in result.pop("violations"):
+            constraint_counts[violation] = constraint_counts.get(violation, 0) + count
+        results.append(result)
+    return results, constraint_counts
+
+
+def _chunks(items, parts):
+    # Contiguous runs of about equal total trace length, so neighbouring
+    # variants (which share prefixes) stay in the same run.
+    total = sum(len(variant) + 1 for variant, _ in items)
+    target = total / parts if parts else total
+    chunks, current, size = [], [], 0
+    for item in items:
+        current.append(item)
+        size += len(item[0]) + 1
+        if size >= target and len(chunks) < parts - 1:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def check_conformance(model_path, variants, workers=1):
+    """
+    Replays (activity tuple, count) variants against a DCR XML model.
+    Returns the per-variant results, in the given order, and the summary.
+    """
+    model = DCRModel(model_path)
+    order = sorted(range(len(variants)), key=lambda i: variants[i][0])
+    items = [variants[i] for i in order]
+    chunks = _chunks(items, max(1, workers * 4))
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path,)) as executor:
+            outputs = list(executor.map(_replay_chunk, chunks))
+    else:
+        outputs = [_replay_chunk(chunk, model) for chunk in chunks]
+
+    sorted_results = [result for results, _ in outputs for result in results]
+    results = [None] * len(variants)
+    for position, index in enumerate(order):
+        results[index] = sorted_results[position]
+    constraint_counts = {}
+    for _, counts in outputs:
+        for violation, count in counts.items():
+            constraint_counts[violation] = constraint_counts.get(violation, 0) + count
+
+    traces = sum(count for _, count in variants)
+    positive = sum(count for (_, count), result in zip(variants, results) if result["positive"])
+    summary = {
+        "traces": traces,
+        "variants": len(variants),
+        "fitness": positive / traces if traces else 1.0,
+        "positive_traces": positive,
+        "total_violations": sum(count * result["total_violations"]
+                                for (_, count), result in zip(variants, results)),
+        "constraint_violations": [
+            {"type": relation_type, "source": model.labels[source], "target": model.labels[target],
+             "source_id": model.event_ids[source], "target_id": model.event_ids[target],
+             "count": count}
+            for (relation_type, source, target), count in sorted(
+                constraint_counts.items(), key=lambda item: -item[1])
+        ],
+    }
+    return results, summary
+
+
+def main():
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    parser = argparse.ArgumentParser(
+        description="Replay an XES log against a DCR XML model.")
+    parser.add_argument("model", help="Path to the DCR XML model")
+    parser.add_argument("log", help="Path to the XES log")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Parse and replay in this many processes (default: 1)")
+    parser.add_argument(
+        "--classifier", default=DEFAULT_CLASSIFIER,
+        help=f"Event classifier to use if the log defines it (default: {DEFAULT_CLASSIFIER})")
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of violated constraints to list (default: 10)")
+    parser.add_argument(
+        "--json", help="Write the summary to this JSON file")
+    args = parser.parse_args()
+
+    stats = collect_variants(args.log, args.classifier, args.workers)
+    variants = [(tuple(stats.variant_names(variant)), count) for variant, count in stats.variants]
+    _, summary = check_conformance(args.model, variants, args.workers)
+
+    print(f"Traces: {summary['traces']}, variants: {summary['variants']}, "
+          f"fitness: {summary['fitness']:.4f}, violations: {summary['total_violations']}")
+    for violation in summary["constraint_violations"][:args.top]:
+        print(f"  {violation['count']:>8}  {violation['type']}: "
+              f"{violation['source']} -> {violation['target']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,18 @@ import sys
 import shutil
 import argparse
 import subprocess
+import json
 import datetime
 from pathlib import Path
 
+from sweep import subsample_log, sweep_sizes
+
 
 SCRIPT_DIR = Path(__file__).parent.resolve()
 ROOT_DIR = SCRIPT_DIR.parent.parent.resolve()
+LOGS_DIR = SCRIPT_DIR.parent / "datasets" / "logs"
+# Where the bench folder is mounted in the benchmark container
+CONTAINER_BENCH_DIR = "/app/bench"
 
 
 def run_command(cmd, cwd=None, env=None, shell=False):
@@ -28,6 +34,74 @@ def run_command(cmd, cwd=None, env=None, shell=False):
         sys.exit(1)
 
 
+def run_benchmark(compose_file, env):
+    """Runs the Playwright benchmark in Docker with the given environment."""
+    run_command(
+        ["docker-compose", "-f",
+            str(compose_file), "up", "--abort-on-container-exit", "--build"],
+        cwd=SCRIPT_DIR.parent / "docker",
+        env=env
+    )
+
+
+def run_sweep(args, exp_path, exp_dir_name, compose_file, env):
+    """
+    Runs the benchmark once per (trace percentage, variant percentage) point,
+    each into points/<point>/, with the logs subsampled to the trace
+    percentage. sweep.json records the points and the size of every log at
+    each of them, for analyze.py to fit scaling curves.
+    """
+    trace_percentages = args.sweep_traces or [100]
+    variant_percentages = args.sweep_variants or [args.variants_percentage]
+    log_files = sorted(LOGS_DIR.glob("*.xes"))
+
+    manifest = {
+        "variants_direction": args.variants_direction,
+        "seed": args.sweep_seed,
+        "points": []
+    }
+    manifest_path = exp_path / "sweep.json"
+
+    for traces_pct in trace_percentages:
+        if traces_pct >= 100:
+            logs_dir = LOGS_DIR
+            container_logs_dir = f"{CONTAINER_BENCH_DIR}/datasets/logs"
+        else:
+            logs_subdir = f"sweep_logs/traces_{traces_pct:g}"
+            logs_dir = exp_path / logs_subdir
+            container_logs_dir = f"{CONTAINER_BENCH_DIR}/experiments/{exp_dir_name}/{logs_subdir}"
+            logs_dir.mkdir(parents=True, exist_ok=True)
+            for log_file in log_files:
+                print(f"Subsampling {log_file.name} to {traces_pct:g}% of its traces...")
+                subsample_log(log_file, logs_dir / log_file.name, traces_pct, args.sweep_seed)
+
+        print(f"Measuring logs at {traces_pct:g}% of traces...")
+        sizes = {log_file.name: sweep_sizes(logs_dir / log_file.name, variant_percentages,
+                                            args.variants_direction, os.cpu_count() or 1)
+                 for log_file in log_files}
+
+        for variants_pct in variant_percentages:
+            point = f"traces_{traces_pct:g}_variants_{variants_pct:g}"
+            print(f"\nRunning sweep point {point}...")
+            (exp_path / "points" / point / "traces").mkdir(parents=True, exist_ok=True)
+
+            point_env = env.copy()
+            point_env["EXP_OUTPUT_DIR"] = f"{CONTAINER_BENCH_DIR}/experiments/{exp_dir_name}/points/{point}"
+            point_env["BENCH_LOGS_DIR"] = container_logs_dir
+            point_env["BENCH_VARIANTS_PERCENTAGE"] = f"{variants_pct:g}"
+            run_benchmark(compose_file, point_env)
+
+            manifest["points"].append({
+                "name": point,
+                "traces_percentage": traces_pct,
+                "variants_percentage": variants_pct,
+                "sizes": {log_name: log_sizes[variants_pct] for log_name, log_sizes in sizes.items()}
+            })
+            # Written after every point so an interrupted sweep can be analyzed
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+
+
 def main():
     if sys.stdout.encoding != 'utf-8':
         sys.stdout.reconfigure(encoding='utf-8')
@@ -78,7 +152,26 @@ def main():
         default="top",
         help="Direction for variant filtering: 'top' (most frequent) or 'bottom' (least frequent) (default: top)"
     )
+    parser.add_argument(
+        "--sweep-variants",
+        type=float,
+        nargs="+",
+        help="Sweep mode: variant percentages to run the benchmark with"
+    )
+    parser.add_argument(
+        "--sweep-traces",
+        type=float,
+        nargs="+",
+        help="Sweep mode: percentages of the traces of every log to run the benchmark on"
+    )
+    parser.add_argument(
+        "--sweep-seed",
+        type=int,
+        default=0,
+        help="Seed for subsampling traces in sweep mode (default: 0)"
+    )
     args = parser.parse_args()
+    sweep = bool(args.sweep_variants or args.sweep_traces)
 
     name = args.name
     benchmark_type = args.type
@@ -141,7 +234,7 @@ def main():
     compose_file = SCRIPT_DIR.parent / "docker" / "docker-compose.yml"
 
     env = os.environ.copy()
-    env["EXP_OUTPUT_DIR"] = f"/app/bench/experiments/{exp_dir_name}"
+    env["EXP_OUTPUT_DIR"] = f"{CONTAINER_BENCH_DIR}/experiments/{exp_dir_name}"
     env["NAME"] = name
     env["BENCH_TYPE"] = benchmark_type
     env["BENCH_ITERATIONS"] = str(args.iterations)
@@ -150,17 +243,15 @@ def main():
     env["BENCH_VARIANTS_PERCENTAGE"] = str(args.variants_percentage)
     env["BENCH_VARIANTS_DIRECTION"] = args.variants_direction
 
-    run_command(
-        ["docker-compose", "-f",
-            str(compose_file), "up", "--abort-on-container-exit", "--build"],
-        cwd=SCRIPT_DIR.parent / "docker",
-        env=env
-    )
+    if sweep:
+        run_sweep(args, exp_path, exp_dir_name, compose_file, env)
+    else:
+        run_benchmark(compose_file, env)
 
     if not args.no_analyze:
         print(f"Running analysis for {exp_path}...")
         analysis_script = SCRIPT_DIR / "analyze.py"
-        run_command(["uv", "run", "--with", "pandas",
+        run_command(["uv", "run", "--with", "numpy",
                     str(analysis_script), str(exp_path)])
 
     print(f"\nExperiment Complete!")
@@ -0,0 +1,146 @@
+import sys
+import json
+import math
+import mmap
+import random
+import argparse
+
+from xes_reader import TRACE_TAG, collect_variants, split_on_traces
+
+
+# Helpers for scaling sweeps (run.py --sweep-variants/--sweep-traces):
+# subsampling XES logs to a share of their traces, and the size of the input
+# every step of a sweep point sees. Sizes after variant filtering follow
+# filterVariantByTopPercentage() and filterVariantByBottomPercentage() in
+# dcr-engine/src/utility.ts, which is what mine-log and replay-log work on.
+
+TRACE_END = b"</trace>"
+
+
+def trace_spans(mm, start, end):
+    """(start, end) byte offsets of the <trace> elements in mm[start:end]."""
+    position = mm.find(TRACE_TAG, start, end)
+    while position != -1:
+        after = mm[position + len(TRACE_TAG):position + len(TRACE_TAG) + 1]
+        if after not in (b">", b" ", b"\t", b"\r", b"\n", b"/"):
+            # Some other tag starting with "<trace"
+            position = mm.find(TRACE_TAG, position + 1, end)
+            continue
+        tag_end = mm.find(b">", position, end)
+        if tag_end == -1:
+            return
+        if mm[tag_end - 1:tag_end] == b"/":
+            close = tag_end + 1
+        else:
+            close = mm.find(TRACE_END, tag_end, end)
+            if close == -1:
+                return
+            close += len(TRACE_END)
+        yield position, close
+        position = mm.find(TRACE_TAG, close, end)
+
+
+def subsample_log(src, dst, percentage, seed=0):
+    """
+    Writes the header of an XES log and `percentage` % of its traces, in
+    their original order. With the same seed, the traces of a smaller
+    percentage are a subset of those of a larger one. Returns the number of
+    traces kept.
+    """
+    header, _, end = split_on_traces(src, 1)
+    with open(src, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        spans = list(trace_spans(mm, len(header), end))
+        order = list(range(len(spans)))
+        random.Random(seed).shuffle(order)
+        keep = sorted(order[:round(len(spans) * percentage / 100)])
+        with open(dst, "wb") as out:
+            out.write(header)
+            for i in keep:
+                start, stop = spans[i]
+                out.write(mm[start:stop])
+                out.write(b"\n")
+            out.write(mm[end:])
+    return len(keep)
+
+
+def filter_variants(variants, percentage, direction="top"):
+    """
+    The (variant, count) pairs kept by the variant filter of DCR.js, given
+    the variants ordered by decreasing count.
+    """
+    if percentage >= 100:
+        return list(variants)
+
+    target = math.ceil(percentage / 100 * sum(count for _, count in variants))
+    ordered = variants if direction == "top" else variants[::-1]
+    kept = []
+    accumulated = 0
+    threshold = None
+    for variant, count in ordered:
+        # Variants tied with the one that crossed the target are kept too
+        if threshold is not None and count != threshold:
+            break
+        kept.append((variant, count))
+        accumulated += count
+        if threshold is None and accumulated >= target:
+            threshold = count
+    return kept
+
+
+def sweep_sizes(log_path, variant_percentages, direction="top", workers=1):
+    """
+    Size of a log before and after variant filtering, for every variant
+    percentage: {percentage: {traces, variants, events, log_traces,
+    log_variants, log_events}}.
+    """
+    stats = collect_variants(log_path, workers=workers)
+    sizes = {}
+    for percentage in variant_percentages:
+        kept = filter_variants(stats.variants, percentage, direction)
+        sizes[percentage] = {
+            "traces": sum(count for _, count in kept),
+            "variants": len(kept),
+            "events": sum(count * len(variant) for variant, count in kept),
+            "log_traces": stats.traces,
+            "log_variants": len(stats.variants),
+            "log_events": stats.events,
+        }
+    return sizes
+
+
+def main():
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    parser = argparse.ArgumentParser(
+        description="Subsample an XES log and report its size at each variant percentage.")
+    parser.add_argument("log", help="Path to the XES log")
+    parser.add_argument(
+        "--traces", type=float, default=100,
+        help="Percentage of traces to keep (default: 100)")
+    parser.add_argument(
+        "--variants", type=float, nargs="+", default=[100],
+        help="Variant percentages to report the size for (default: 100)")
+    parser.add_argument(
+        "--variants-direction", choices=["top", "bottom"], default="top",
+        help="Direction for variant filtering (default: top)")
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed (default: 0)")
+    parser.add_argument("--output", help="Write the subsampled log to this file")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Parse in this many processes (default: 1)")
+    args = parser.parse_args()
+
+    log_path = args.log
+    if args.traces < 100:
+        if not args.output:
+            parser.error("--output is required with --traces below 100")
+        kept = subsample_log(args.log, args.output, args.traces, args.seed)
+        print(f"Kept {kept} traces in {args.output}")
+        log_path = args.output
+
+    sizes = sweep_sizes(log_path, args.variants, args.variants_direction, args.workers)
+    print(json.dumps(sizes, indent=2))
+
+
+if __name__ == "__main__":
+    main()
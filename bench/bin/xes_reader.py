@@ -0,0 +1,451 @@
+import os
+import re
+import sys
+import json
+import argparse
+import datetime
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Log parsing and variant collection matching the DCR.js parsers and
+# getVariants() (dcr-engine/src/utility.ts), so the numbers agree with what
+# the benchmark's "collect-variants" step measures:
+# - the activity of an event is given by the log's "Event Name" classifier,
+#   or concept:name, falling back to the global event attributes;
+# - events are grouped by their trace's concept:name (of any scalar type),
+#   so traces sharing an id are concatenated; every event of a trace without
+#   one gets a generated id 1, 2, ... of its own, which can collide with a
+#   numeric id of the log just as in DCR.js;
+# - variants are ordered by count, ties by first trace in JS key order.
+
+DEFAULT_CLASSIFIER = "Event Name"
+SCALAR_TAGS = {"string", "date", "int", "float", "boolean", "id"}
+TRACE_TAG = b"<trace"
+READ_SIZE = 1 << 20
+# Object keys that JS iterates first, in numeric order.
+ARRAY_INDEX = re.compile(r"0|[1-9][0-9]{0,9}")
+
+
+def local_name(tag):
+    return tag.rpartition('}')[2]
+
+
+def attribute_value(tag, value):
+    """An attribute value as String() of the value the DCR.js parsers store."""
+    if tag == "int":
+        return str(int(value))
+    if tag == "float":
+        number = float(value)
+        if number.is_integer() and abs(number) < 1e21:
+            return str(int(number))
+        return repr(number)
+    if tag == "boolean":
+        return "true" if value.lower() == "true" else "false"
+    if tag == "date":
+        moment = datetime.datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone.utc)
+        return str(int(moment.timestamp() * 1000))
+    return value
+
+
+def scalar_attributes(elem):
+    """The direct scalar attributes of an element, as key -> string."""
+    attributes = {}
+    for child in elem:
+        tag = local_name(child.tag)
+        if tag in SCALAR_TAGS and "key" in child.attrib:
+            try:
+                attributes[child.get("key")] = attribute_value(tag, child.get("value", ""))
+            except ValueError:
+                attributes[child.get("key")] = "NaN"
+    return attributes
+
+
+def classifier_keys(raw_keys, valid_keys):
+    """Port of getClassifierKeys() in factories.ts."""
+    candidates = []
+    for i, segment in enumerate(raw_keys.split("'")):
+        if i % 2 == 1:
+            if segment:
+                candidates.append(segment)
+        else:
+            candidates.extend(part for part in segment.split(" ") if part)
+
+    resolved = []
+    i = 0
+    while i < len(candidates):
+        if candidates[i] in valid_keys:
+            resolved.append(candidates[i])
+            i += 1
+        elif i + 1 < len(candidates) and candidates[i] + " " + candidates[i + 1] in valid_keys:
+            resolved.append(candidates[i] + " " + candidates[i + 1])
+            i += 2
+        else:
+            resolved.append(candidates[i])
+            i += 1
+    return sorted(resolved)
+
+
+class LogHeader:
+    """Global event attributes and classifiers, read before the first trace."""
+
+    def __init__(self):
+        self.global_event_attributes = {}
+        self.classifiers = {}
+
+    def add(self, elem):
+        tag = local_name(elem.tag)
+        if tag == "global" and elem.get("scope") == "event":
+            self.global_event_attributes = scalar_attributes(elem)
+        elif tag == "classifier" and elem.get("name") and elem.get("keys") is not None:
+            self.classifiers[elem.get("name")] = elem.get("keys")
+
+    def activity_keys(self, classifier=DEFAULT_CLASSIFIER):
+        raw_keys = self.classifiers.get(classifier)
+        if not raw_keys:
+            return ["concept:name"]
+        return classifier_keys(raw_keys, set(self.global_event_attributes))
+
+
+class ActivityTable:
+    """Interns activity names as consecutive ints."""
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def intern(self, name):
+        activity = self.ids.get(name)
+        if activity is None:
+            activity = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return activity
+
+    def __len__(self):
+        return len(self.names)
+
+
+class XESReader:
+    """
+    Streams the traces of an XES file as (trace id, tuple of activity ids),
+    clearing every element once read. Traces without concept:name get an id
+    of None. Header elements are collected into `header` before the first
+    trace is yielded.
+    """
+
+    def __init__(self, source, classifier=DEFAULT_CLASSIFIER, header=None, activities=None):
+        self.source = source
+        self.classifier = classifier
+        self.header = header or LogHeader()
+        self.activities = activities or ActivityTable()
+
+    def __iter__(self):
+        context = ET.iterparse(self.source, events=("start", "end"))
+        keys = None
+        in_trace = False
+        depth = 0
+        trace_id = None
+        events = []
+        root = None
+
+        for event, elem in context:
+            tag = local_name(elem.tag)
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = elem
+                elif tag == "trace" and depth == 2:
+                    in_trace = True
+                    trace_id = None
+                    events = []
+                    if keys is None:
+                        keys = self.header.activity_keys(self.classifier)
+                continue
+
+            depth -= 1
+            if in_trace:
+                # Attributes of events stay until their event ends, trace
+                # attributes until the trace ends.
+                if depth == 2 and tag == "event":
+                    events.append(self._activity(elem, keys))
+                    elem.clear()
+                elif depth == 2 and tag in SCALAR_TAGS and elem.get("key") == "concept:name":
+                    try:
+                        trace_id = attribute_value(tag, elem.get("value", ""))
+                    except ValueError:
+                        trace_id = "NaN"
+                elif depth == 1:
+                    in_trace = False
+                    yield trace_id, tuple(events)
+                    root.clear()
+                continue
+            if depth == 1:
+                self.header.add(elem)
+                root.clear()
+
+    def _activity(self, elem, keys):
+        attributes = scalar_attributes(elem)
+        globals_ = self.header.global_event_attributes
+        name = ":".join(attributes.get(key, globals_.get(key, "")) for key in keys)
+        return self.activities.intern(name)
+
+
+class _RangeReader:
+    # File-like view of bytes [start, end) of a file, between a prefix and a
+    # suffix, so a slice of <trace> elements can be parsed as a document.
+
+    def __init__(self, path, start, end, prefix, suffix):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+        self.pending = [prefix]
+        self.suffix = suffix
+
+    def read(self, size=-1):
+        if self.pending:
+            return self.pending.pop()
+        if self.remaining > 0:
+            data = self.file.read(min(READ_SIZE, self.remaining) if size < 0 else min(size, self.remaining))
+            self.remaining -= len(data)
+            if not data:
+                self.remaining = 0
+            return data
+        if self.suffix:
+            data, self.suffix = self.suffix, b""
+            return data
+        self.file.close()
+        return b""
+
+
+def _find_trace(f, position, limit):
+    # Offset of the first "<trace" tag at or after position (before limit),
+    # or limit.
+    f.seek(position)
+    carry = b""
+    base = position
+    while base < limit:
+        block = f.read(READ_SIZE)
+        if not block:
+            break
+        data = carry + block
+        start = base - len(carry)
+        i = data.find(TRACE_TAG)
+        while i != -1 and i + len(TRACE_TAG) < len(data):
+            if data[i + len(TRACE_TAG):i + len(TRACE_TAG) + 1] in (b">", b" ", b"\t", b"\r", b"\n", b"/"):
+                return min(start + i, limit)
+            i = data.find(TRACE_TAG, i + 1)
+        carry = data[-len(TRACE_TAG):]
+        base += len(block)
+    return limit
+
+
+def split_on_traces(path, parts):
+    """
+    Splits a file into up to `parts` byte ranges that start at <trace> tags.
+    Returns (header bytes before the first trace, list of ranges, end of the
+    last trace).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        first = _find_trace(f, 0, size)
+        header = b""
+        f.seek(0)
+        header = f.read(first)
+        f.seek(max(first, size - READ_SIZE))
+        tail = f.read()
+        log_end = tail.rfind(b"</log>")
+        end = size - len(tail) + log_end if log_end != -1 else size
+        end = max(end, first)
+
+        bounds = [first]
+        for i in range(1, parts):
+            target = first + (end - first) * i // parts
+            bound = _find_trace(f, max(target, bounds[-1] + 1), end)
+            if bound > bounds[-1] and bound < end:
+                bounds.append(bound)
+        bounds.append(end)
+    return header, list(zip(bounds, bounds[1:])), end
+
+
+def read_header(header_bytes):
+    """Parses the header bytes before the first trace."""
+    header = LogHeader()
+    document = header_bytes + b"</log>"
+    try:
+        for _, elem in ET.iterparse(_BytesSource(document), events=("end",)):
+            if local_name(elem.tag) in ("global", "classifier"):
+                header.add(elem)
+    except ET.ParseError:
+        pass
+    return header
+
+
+class _BytesSource:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        data, self.data = self.data, b""
+        return data
+
+
+def _declaration(header_bytes):
+    if header_bytes.startswith(b"<?xml"):
+        end = header_bytes.find(b"?>")
+        if end != -1:
+            return header_bytes[:end + 2]
+    return b""
+
+
+class VariantStats:
+    """
+    Variant counts of a log. `variants` lists (activity id tuple, count) in
+    the order getVariants() returns them.
+    """
+
+    def __init__(self, activities, variants, traces, events):
+        self.activities = activities
+        self.variants = variants
+        self.traces = traces
+        self.events = events
+
+    def variant_names(self, variant):
+        return [self.activities.names[activity] for activity in variant]
+
+    def summary(self, top=10):
+        return {
+            "traces": self.traces,
+            "events": self.events,
+            "activities": len(self.activities),
+            "variants": len(self.variants),
+            "top_variants": [
+                {"count": count, "length": len(variant), "trace": self.variant_names(variant)}
+                for variant, count in self.variants[:top]
+            ],
+        }
+
+
+def _range_reader(job):
+    path, _, start, end, prefix, classifier, header = job
+    return XESReader(_RangeReader(path, start, end, prefix, b"</log>"), classifier, header)
+
+
+def _collect_range(job):
+    # Worker: the traces of one byte range, merged by id within the range.
+    # Returns the activity names, the distinct variants and, in order of
+    # first occurrence, (trace id, variant index) for every trace.
+    reader = _range_reader(job)
+    traces = {}
+    anonymous = 0
+    for trace_id, events in reader:
+        # DCR.js only records a trace once it has an event.
+        if not events:
+            continue
+        if trace_id is None:
+            # getTraceId() gives every event of such a trace a fresh id.
+            for event in events:
+                traces[(None, anonymous)] = (event,)
+                anonymous += 1
+        else:
+            traces[trace_id] = traces.get(trace_id, ()) + events
+    variant_index = {}
+    trace_variants = []
+    for key, events in traces.items():
+        index = variant_index.setdefault(events, len(variant_index))
+        trace_variants.append((None if isinstance(key, tuple) else key, index))
+    return reader.activities.names, list(variant_index), trace_variants
+
+
+def collect_variants(path, classifier=DEFAULT_CLASSIFIER, workers=1):
+    """
+    Counts the variants of an XES file. With workers > 1 the file is split on
+    <trace> boundaries and the parts are parsed in a process pool.
+    """
+    header_bytes, ranges, _ = split_on_traces(path, max(1, workers))
+    header = read_header(header_bytes)
+    prefix = _declaration(header_bytes) + b"<log>"
+    jobs = [(path, i, start, end, prefix, classifier, header)
+            for i, (start, end) in enumerate(ranges)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(_collect_range, jobs))
+    else:
+        parts = [_collect_range(job) for job in jobs]
+
+    activities = ActivityTable()
+    named = {}
+    generated = 0
+    position = 0
+    for names, part_variants, trace_variants in parts:
+        mapping = [activities.intern(name) for name in names]
+        variants = [tuple(mapping[a] for a in variant) for variant in part_variants]
+        for trace_id, index in trace_variants:
+            if trace_id is None:
+                # getTraceId() names such an event with generateId(), a
+                # counter a fresh page starts at 1. The id then sorts and
+                # merges like a numeric trace id of the log.
+                generated += 1
+                trace_id = str(generated)
+            if trace_id in named:
+                # Same id earlier in the log: one trace in DCR.js.
+                named[trace_id][1] += variants[index]
+            else:
+                named[trace_id] = [_order_key(trace_id, position), variants[index]]
+            position += 1
+
+    counts = {}
+    first = {}
+    for order, variant in named.values():
+        counts[variant] = counts.get(variant, 0) + 1
+        if variant not in first or order < first[variant]:
+            first[variant] = order
+
+    variants = sorted(counts.items(), key=lambda item: (-item[1], first[item[0]]))
+    traces = sum(counts.values())
+    events = sum(count * len(variant) for variant, count in variants)
+    return VariantStats(activities, variants, traces, events)
+
+
+def _order_key(trace_id, position):
+    # JS key order: array-index keys ascending, then the others in
+    # insertion order.
+    if ARRAY_INDEX.fullmatch(trace_id) and int(trace_id) < 2**32 - 1:
+        return (0, int(trace_id), 0)
+    return (1, 0, position)
+
+
+def main():
+    if sys.stdout.encoding != 'utf-8':
+        sys.stdout.reconfigure(encoding='utf-8')
+
+    parser = argparse.ArgumentParser(
+        description="Collect the variants of an XES log as the benchmark does.")
+    parser.add_argument("log", help="Path to the XES file")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Parse the log in this many processes (default: 1)")
+    parser.add_argument(
+        "--classifier", default=DEFAULT_CLASSIFIER,
+        help=f"Event classifier to use if the log defines it (default: {DEFAULT_CLASSIFIER})")
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of variants to list (default: 10)")
+    parser.add_argument(
+        "--json", help="Write the summary to this JSON file")
+    args = parser.parse_args()
+
+    stats = collect_variants(args.log, args.classifier, args.workers)
+    summary = stats.summary(args.top)
+    print(f"Traces: {summary['traces']}, events: {summary['events']}, "
+          f"activities: {summary['activities']}, variants: {summary['variants']}")
+    for variant in summary["top_variants"]:
+        print(f"  {variant['count']:>8}  ({variant['length']} events) "
+              + " -> ".join(variant["trace"][:8]) + (" ..." if variant["length"] > 8 else ""))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,9 @@ if (!fs.existsSync(TRACES_DIR)) {
   fs.mkdirSync(TRACES_DIR, { recursive: true });
 }
 
-const LOGS_DIR = path.join(__dirname, "../datasets/logs");
+const LOGS_DIR = process.env.BENCH_LOGS_DIR
+  ? process.env.BENCH_LOGS_DIR
+  : path.join(__dirname, "../datasets/logs");
 const MODELS_DIR = path.join(__dirname, "../datasets/models");
 
 const logFiles = fs.readdirSync(LOGS_DIR).filter((f) => f.endsWith(".xes"));
@@ -0,0 +1,19 @@
+import XMLConverter from '/lib/XMLConverter';
+
+import { it, expect, describe } from 'vitest';
+
+import collaborationXML from '../fixtures/collaboration.xml?raw';
+
+
+describe('XMLConverter', () => {
+
+  it('should convert nested pools from the BPMN converter', async () => {
+    const result = await XMLConverter(collaborationXML);
+
+    expect(result).toBeDefined();
+    expect(result).toContain('<dcr:nesting id="Process_Customer"');
+    expect(result).toContain('<dcr:nesting id="Process_Shop"');
+    expect(result).toMatch(/boardElement="Process_Shop">\s*<dc:Bounds x="100" y="560" width="910" height="410"/);
+  });
+
+});